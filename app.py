@@ -1,56 +1,28 @@
 import streamlit as st
 import pandas as pd
 import sys
-from PIL import Image
 from pathlib import Path
 from datetime import timedelta
-import time
-import plotly.graph_objects as go
 
 # Ensure local src/ is first so deployed envs don't import stale installed packages.
 SRC_PATH = str(Path(__file__).resolve().parent / "src")
 if SRC_PATH not in sys.path:
     sys.path.insert(0, SRC_PATH)
 
-from urban_heatwave_forecaster import data_fetcher, detect_heatwaves, risk_model
+from urban_heatwave_forecaster import bundles, data_fetcher, detect_heatwaves, figures, risk_model
+from urban_heatwave_forecaster.ensemble import (
+    enrich_risk_dataframe,
+    summarize_ensemble_risk,
+)
 
-RISK_ORDER = ["None", "Mild", "Moderate", "High", "Extreme"]
-RISK_TO_SCORE = {risk: score for score, risk in enumerate(RISK_ORDER)}
-RISK_COLORS = {
-    "None": "#a8ddb5",
-    "Mild": "#fee08b",
-    "Moderate": "#fdae61",
-    "High": "#f46d43",
-    "Extreme": "#d73027",
-}
 MODEL_OPTIONS = {
     "ECMWF IFS 0.25°": "ecmwf_ifs025",
     "GFS Seamless": "gfs_seamless",
     "ICON Seamless": "icon_seamless",
 }
 MODEL_LABEL_BY_CODE = {code: label for label, code in MODEL_OPTIONS.items()}
-
-
-def base_risk_from_tmax(temp: float) -> str:
-    if temp >= 38:
-        return "Extreme"
-    if temp >= 35:
-        return "High"
-    if temp >= 32:
-        return "Moderate"
-    if temp >= 30:
-        return "Mild"
-    return "None"
-
-
-def enrich_risk_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-    out = df.copy()
-    out["date"] = pd.to_datetime(out["date"])
-    out["base_risk_level"] = out["tmax"].apply(base_risk_from_tmax)
-    out["base_risk_score"] = out["base_risk_level"].map(RISK_TO_SCORE)
-    out["adjusted_risk_score"] = out["risk_level"].map(RISK_TO_SCORE)
-    out["risk_escalated"] = out["adjusted_risk_score"] > out["base_risk_score"]
-    return out
+# Precomputed bundles (`uhf bundle`) older than this fall back to a live run
+BUNDLE_MAX_AGE = timedelta(hours=6)
 
 
 def fetch_multi_model_forecast_compat(
@@ -103,47 +75,150 @@ def detect_heatwaves_df_compat(
     min_run: int = 3,
 ) -> pd.DataFrame:
     if hasattr(detect_heatwaves, "detect_heatwaves_df"):
-        clim_df = pd.read_csv(clim_path)
-        return detect_heatwaves.detect_heatwaves_df(
+        detected_df = detect_heatwaves.detect_heatwaves_df(
             forecast_df=forecast_df,
-            climatology_df=clim_df,
+            climatology_df=load_climatology(clim_path),
+            min_run=min_run,
+        )
+    else:
+        temp_forecast_path = Path("data/raw/_temp_model_forecast.csv")
+        temp_forecast_path.parent.mkdir(parents=True, exist_ok=True)
+        forecast_df.to_csv(temp_forecast_path, index=False)
+        detected_df = detect_heatwaves.detect_heatwaves(
+            forecast_path=temp_forecast_path,
+            climatology_path=clim_path,
             min_run=min_run,
         )
 
-    temp_forecast_path = Path("data/raw/_temp_model_forecast.csv")
-    temp_forecast_path.parent.mkdir(parents=True, exist_ok=True)
-    forecast_df.to_csv(temp_forecast_path, index=False)
-    return detect_heatwaves.detect_heatwaves(
-        forecast_path=temp_forecast_path,
-        climatology_path=clim_path,
-        min_run=min_run,
-    )
+    if "is_hot" not in detected_df.columns and "exceeds_95p" in detected_df.columns:
+        detected_df["is_hot"] = detected_df["exceeds_95p"]
+    return detected_df
+
+
+# Static inputs are loaded once per server process and shared by all sessions;
+# callers must copy before mutating.
+@st.cache_resource(show_spinner=False)
+def load_climatology(clim_path: Path) -> pd.DataFrame:
+    return pd.read_csv(clim_path)
+
+
+@st.cache_resource(show_spinner=False)
+def load_vulnerability() -> pd.DataFrame:
+    return pd.read_csv("data/raw/urban_vulnerability.csv")
+
+
+def climatology_path(city_name: str) -> Path:
+    return Path(f"data/processed/{city_name.lower()}_climatology_95p.csv")
+
+
+def assess_detected(detected_df: pd.DataFrame) -> pd.DataFrame:
+    risk_df = risk_model.assess_heatwave_risk(detected_df.copy(), load_vulnerability().copy())
+    return enrich_risk_dataframe(risk_df)
 
 
 @st.cache_data(ttl=3600, show_spinner=False)
 def run_pipeline_for_city(city_name: str, lat: float, lon: float):
-    city_lower = city_name.lower()
     forecast_df = data_fetcher.fetch_ecmwf_forecast(lat, lon, city_name)
+    detected_df = detect_heatwaves_df_compat(forecast_df, climatology_path(city_name))
+    return detected_df, assess_detected(detected_df)
 
-    clim_path = Path(f"data/processed/{city_lower}_climatology_95p.csv")
-    forecast_path = Path(f"data/raw/{city_lower}_forecast.csv")
-    forecast_df.to_csv(forecast_path, index=False)
-    detected_df = detect_heatwaves.detect_heatwaves(forecast_path, clim_path)
 
-    if "is_hot" not in detected_df.columns and "exceeds_95p" in detected_df.columns:
-        detected_df["is_hot"] = detected_df["exceeds_95p"]
+@st.cache_data(ttl=3600, show_spinner=False)
+def run_ensemble_for_city(city_name: str, lat: float, lon: float, models: tuple[str, ...]):
+    """Per-model risk frames, their probability summary and the models that failed."""
+    ensemble_frames = []
+    failed_models: list[dict[str, str]] = []
+
+    if "ecmwf_ifs025" in models:
+        _, ecmwf_risk = run_pipeline_for_city(city_name, lat, lon)
+        ensemble_frames.append(ecmwf_risk.assign(model="ecmwf_ifs025"))
+
+    additional_models = [model for model in models if model != "ecmwf_ifs025"]
+    if additional_models:
+        multi_forecast_df = pd.DataFrame()
+        try:
+            multi_forecast_df, failed_models = fetch_multi_model_forecast_compat(
+                lat=lat,
+                lon=lon,
+                city_name=city_name,
+                models=additional_models,
+                forecast_days=7,
+            )
+        except (RuntimeError, AttributeError) as exc:
+            failed_models = [{"model": model, "error": str(exc)} for model in additional_models]
+
+        for model_code, model_forecast in multi_forecast_df.groupby("model"):
+            model_detected = detect_heatwaves_df_compat(
+                forecast_df=model_forecast[["date", "tmin", "tmax", "city"]],
+                clim_path=climatology_path(city_name),
+                min_run=3,
+            )
+            ensemble_frames.append(assess_detected(model_detected).assign(model=model_code))
+
+    if not ensemble_frames:
+        return None, failed_models
+    ensemble_risk_df = pd.concat(ensemble_frames, ignore_index=True)
+    models_used = list(dict.fromkeys(ensemble_risk_df["model"]))
+    return (models_used, *summarize_ensemble_risk(ensemble_risk_df)), failed_models
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_latest_bundle(city_name: str):
+    return bundles.load_latest_bundle(city_name)
+
+
+def fresh_bundle(city_name: str):
+    """Latest precomputed bundle for the city, or None when missing or stale."""
+    bundle = load_latest_bundle(city_name)
+    if bundle is None or bundle.age > BUNDLE_MAX_AGE:
+        return None
+    return bundle
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def build_city_comparison(cities: tuple[tuple[str, float, float], ...]) -> pd.DataFrame:
+    """Every city with a fresh bundle, plus live runs for listed cities without one."""
+    bundled = bundles.latest_comparisons(max_age=BUNDLE_MAX_AGE)
+    frames = []
+    if not bundled.empty:
+        frames.append(bundled.assign(city=bundled["city"].str.title()))
+    have = set(bundled["city"]) if not bundled.empty else set()
+    live_rows = []
+    for comp_city, comp_lat, comp_lon in cities:
+        if comp_city.lower() in have:
+            continue
+        comp_detected_df, comp_risk_df = run_pipeline_for_city(comp_city, comp_lat, comp_lon)
+        live_rows.append(
+            bundles.comparison_summary(comp_city, comp_lat, comp_lon, comp_detected_df, comp_risk_df)
+        )
+    if live_rows:
+        frames.append(pd.DataFrame(live_rows))
+
+    return pd.concat(frames, ignore_index=True).sort_values(
+        ["max_risk_score", "peak_tmax"],
+        ascending=[False, False]
+    ).reset_index(drop=True)
+
 
-    vulnerability_df = pd.read_csv("data/raw/urban_vulnerability.csv")
-    risk_df = risk_model.assess_heatwave_risk(detected_df.copy(), vulnerability_df)
-    risk_df = enrich_risk_dataframe(risk_df)
-    return detected_df, risk_df
+@st.cache_data(show_spinner=False, max_entries=256)
+def figure_spec(name: str, result_hash: str, _frames: tuple) -> dict:
+    """Plotly spec for chart `name`; rebuilt only when `result_hash` changes."""
+    return figures.FIGURES[name](*_frames)
+
+
+def plot(name: str, *frames: pd.DataFrame) -> None:
+    spec = figure_spec(name, figures.frame_fingerprint(*frames), frames)
+    st.plotly_chart(spec, use_container_width=True)
 
 # --- Paths & logo ---
 ROOT = Path(__file__).resolve().parent
 LOGO_PATH = ROOT / "assets" / "urban-heatwave-forecaster_new.png"
 
 # If the file path is wrong, this will raise early and be obvious
-logo_img = Image.open(LOGO_PATH)
+if not LOGO_PATH.exists():
+    raise FileNotFoundError(f"Logo not found at: {LOGO_PATH}")
+# Streamlit accepts image paths directly, so PIL is not needed just for the logo
+logo_img = str(LOGO_PATH)
 
 # Page config (icon shows in browser/tab and Streamlit menu)
 st.set_page_config(page_title="Urban Heatwave Forecaster",
@@ -239,7 +314,7 @@ with st.expander("📦 How the Data Flows"):
 city = st.sidebar.selectbox("Select a city", ["Athens", "Rome", "Stockholm", "London"])
 city_lower = city.lower()
 run_multi_city_comparison = st.sidebar.checkbox(
-    "Enable 4-city comparison",
+    "Enable multi-city comparison",
     value=False,
     help="Runs additional forecast calls for all available cities."
 )
@@ -268,42 +343,37 @@ lat, lon = latlon[city]
 # --- Button to Generate Forecast ---
 st.title(f"Heatwave Risk Assessment – {city}")
 
+# Results live in session state so later widget interactions (toggling the
+# comparison, changing models) re-render without refetching or re-detecting.
+results = st.session_state.setdefault("results", {})
+
+# A fresh precomputed bundle is shown straight away, without a click
+bundle = fresh_bundle(city)
+if city not in results and bundle is not None:
+    results[city] = (bundle.detected, bundle.risk, bundle)
+
 if st.button("Generate Heatwave Forecast", type="primary"):
-        
-    # Create a placeholder for the gear
     gear_placeholder = st.empty()
     gear_placeholder.markdown('<div class="gear"></div>', unsafe_allow_html=True)
+    try:
+        results[city] = (*run_pipeline_for_city(city, lat, lon), None)
+    except Exception as exc:
+        st.error(f"Unable to fetch forecast data from Open-Meteo: {exc}")
+        st.stop()
+    finally:
+        gear_placeholder.empty()
+
+if city in results:
+    detected_df, risk_df, result_bundle = results[city]
+    vulnerability_df = load_vulnerability()
+
+    if result_bundle is not None:
+        age_minutes = int(result_bundle.age.total_seconds() // 60)
+        st.caption(
+            f"⚡ Precomputed results from {age_minutes} min ago "
+            f"(bundle {result_bundle.version}). Press the button for a live run."
+        )
 
-
-    # Pause 2 seconds before starting computation
-    time.sleep(1)
-
-    # Clear the gear before showing results
-    gear_placeholder.empty()
-
-    # 1. Fetch forecast
-    with st.spinner("Fetching forecast..."):
-        try:
-            forecast_df = data_fetcher.fetch_ecmwf_forecast(lat, lon, city)
-        except Exception as exc:
-            st.error(f"Unable to fetch forecast data from Open-Meteo: {exc}")
-            st.stop()
-
-    # 2. Heatwave detection
-    clim_path = Path(f"data/processed/{city_lower}_climatology_95p.csv")
-    forecast_path = Path(f"data/raw/{city_lower}_forecast.csv")
-    forecast_df.to_csv(forecast_path, index=False)
-    detected_df = detect_heatwaves.detect_heatwaves(forecast_path, clim_path)
-
-    # Ensure 'is_hot' exists
-    if "is_hot" not in detected_df.columns and "exceeds_95p" in detected_df.columns:
-        detected_df["is_hot"] = detected_df["exceeds_95p"]
-
-    # 3. Risk assessment
-    vulnerability_df = pd.read_csv("data/raw/urban_vulnerability.csv")
-    risk_df = risk_model.assess_heatwave_risk(detected_df, vulnerability_df)
-    risk_df = enrich_risk_dataframe(risk_df)
-    
     # --- Summary Metrics ---
     heatwave_days = detected_df["heatwave_id"].notna().sum()
     extreme_days = (risk_df["risk_level"] == "Extreme").sum()
@@ -341,128 +411,15 @@ if st.button("Generate Heatwave Forecast", type="primary"):
     # --- Plotly Chart 1: Forecast vs Climatology ---
     st.subheader("📈 Forecast vs Climatology Thresholds")
 
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=fig_df["date"],
-        y=fig_df["tmax"],
-        mode="lines+markers",
-        name="Tmax",
-        line=dict(color="#ff6f3c", width=2.5),
-        marker=dict(size=6)
-    ))
-    fig.add_trace(go.Scatter(
-        x=fig_df["date"],
-        y=fig_df["tmax_95p"],
-        mode="lines",
-        name="Tmax 95th pct",
-        line=dict(color="#ff6f3c", width=2, dash="dash")
-    ))
-    fig.add_trace(go.Scatter(
-        x=fig_df["date"],
-        y=fig_df["tmin"],
-        mode="lines+markers",
-        name="Tmin",
-        line=dict(color="#3399ff", width=2),
-        marker=dict(size=5)
-    ))
-    fig.add_trace(go.Scatter(
-        x=fig_df["date"],
-        y=fig_df["tmin_95p"],
-        mode="lines",
-        name="Tmin 95th pct",
-        line=dict(color="#3399ff", width=2, dash="dash")
-    ))
-
-    # Add shaded heatwave periods
-    shapes = []
-    for _, group in fig_df[fig_df["heatwave_id"].notna()].groupby("heatwave_id"):
-        start = group["date"].min()
-        end = group["date"].max() + timedelta(days=1)
-        shapes.append(dict(
-            type="rect",
-            xref="x", yref="paper",
-            x0=start, x1=end,
-            y0=0, y1=1,
-            fillcolor="rgba(255,0,0,0.15)",
-            line_width=0,
-            layer="below"
-        ))
-
-    fig.update_layout(
-        title="Daily Tmin/Tmax Against 95th-Percentile Normals",
-        xaxis_title="Date",
-        yaxis_title="Temperature (°C)",
-        shapes=shapes,
-        legend=dict(title=""),
-        margin=dict(l=40, r=20, t=60, b=40)
-    )
-
-    st.plotly_chart(fig, use_container_width=True)
+    plot("forecast", fig_df)
 
     # --- Plotly Chart 2: Daily Anomalies ---
     st.subheader("🌡️ Daily Temperature Anomalies vs 95th Percentile")
-    anomaly_fig = go.Figure()
-    anomaly_fig.add_trace(go.Bar(
-        x=fig_df["date"],
-        y=fig_df["tmax_anomaly"],
-        name="Tmax anomaly",
-        marker_color="#ff6f3c"
-    ))
-    anomaly_fig.add_trace(go.Bar(
-        x=fig_df["date"],
-        y=fig_df["tmin_anomaly"],
-        name="Tmin anomaly",
-        marker_color="#3399ff"
-    ))
-    anomaly_fig.add_hline(y=0, line_dash="dot", line_color="gray")
-    anomaly_fig.update_layout(
-        barmode="group",
-        xaxis_title="Date",
-        yaxis_title="Anomaly (°C)",
-        margin=dict(l=40, r=20, t=30, b=40),
-        legend=dict(title="")
-    )
-    st.plotly_chart(anomaly_fig, use_container_width=True)
+    plot("anomaly", fig_df)
 
     # --- Plotly Chart 3: Risk decomposition ---
     st.subheader("🧮 Risk Decomposition: Base vs Vulnerability-Adjusted")
-    risk_fig = go.Figure()
-    risk_fig.add_trace(go.Scatter(
-        x=risk_df["date"],
-        y=risk_df["base_risk_score"],
-        mode="lines+markers",
-        name="Base risk (temperature only)",
-        line=dict(color="#8e8e8e", width=2, dash="dot"),
-        marker=dict(size=7)
-    ))
-    risk_fig.add_trace(go.Scatter(
-        x=risk_df["date"],
-        y=risk_df["adjusted_risk_score"],
-        mode="lines+markers",
-        name="Adjusted risk (with vulnerability)",
-        line=dict(color="#d7263d", width=3),
-        marker=dict(size=9)
-    ))
-    risk_fig.add_trace(go.Scatter(
-        x=risk_df.loc[risk_df["risk_escalated"], "date"],
-        y=risk_df.loc[risk_df["risk_escalated"], "adjusted_risk_score"],
-        mode="markers",
-        name="Escalated by vulnerability",
-        marker=dict(size=13, color="#ffa600", symbol="diamond")
-    ))
-    risk_fig.update_layout(
-        xaxis_title="Date",
-        yaxis_title="Risk Level",
-        yaxis=dict(
-            tickmode="array",
-            tickvals=list(range(len(RISK_ORDER))),
-            ticktext=RISK_ORDER,
-            range=[-0.3, len(RISK_ORDER) - 0.7]
-        ),
-        margin=dict(l=40, r=20, t=30, b=40),
-        legend=dict(title="")
-    )
-    st.plotly_chart(risk_fig, use_container_width=True)
+    plot("risk", risk_df)
 
     # --- Color-coded Risk Table ---
     emoji_map = {"Extreme": "🔥🔥", "High": "🔥", "Moderate": "🌡️", "Mild": "☀️", "None": "❄️"}
@@ -495,54 +452,23 @@ if st.button("Generate Heatwave Forecast", type="primary"):
         if not selected_prob_models:
             st.info("Select at least one model in the sidebar to compute probabilistic risk.")
         else:
-            ensemble_frames = []
-            failed_models = []
-
-            if "ecmwf_ifs025" in selected_prob_models:
-                ecmwf_frame = risk_df.copy()
-                ecmwf_frame["model"] = "ecmwf_ifs025"
-                ensemble_frames.append(ecmwf_frame)
-
-            additional_models = [
-                model for model in selected_prob_models if model != "ecmwf_ifs025"
-            ]
-
-            if additional_models:
-                multi_forecast_df = pd.DataFrame()
+            if (
+                result_bundle is not None
+                and set(result_bundle.models) == set(selected_prob_models)
+                and not result_bundle.probabilities.empty
+            ):
+                ensemble_result = (
+                    result_bundle.models,
+                    result_bundle.probabilities,
+                    result_bundle.risk_probs,
+                )
+                # Every selected model made it into the bundle, so none were excluded
+                failed_models = []
+            else:
                 with st.spinner("Fetching additional forecast models..."):
-                    try:
-                        multi_forecast_df, failed_models = fetch_multi_model_forecast_compat(
-                            lat=lat,
-                            lon=lon,
-                            city_name=city,
-                            models=additional_models,
-                            forecast_days=7,
-                        )
-                    except (RuntimeError, AttributeError) as exc:
-                        failed_models = [
-                            {"model": model, "error": str(exc)} for model in additional_models
-                        ]
-
-                if not multi_forecast_df.empty:
-                    for model_code, model_forecast in multi_forecast_df.groupby("model"):
-                        model_detected = detect_heatwaves_df_compat(
-                            forecast_df=model_forecast[["date", "tmin", "tmax", "city"]],
-                            clim_path=clim_path,
-                            min_run=3,
-                        )
-                        if (
-                            "is_hot" not in model_detected.columns
-                            and "exceeds_95p" in model_detected.columns
-                        ):
-                            model_detected["is_hot"] = model_detected["exceeds_95p"]
-
-                        model_risk = risk_model.assess_heatwave_risk(
-                            model_detected.copy(),
-                            vulnerability_df.copy(),
-                        )
-                        model_risk = enrich_risk_dataframe(model_risk)
-                        model_risk["model"] = model_code
-                        ensemble_frames.append(model_risk)
+                    ensemble_result, failed_models = run_ensemble_for_city(
+                        city, lat, lon, tuple(selected_prob_models)
+                    )
 
             if failed_models:
                 failed_names = ", ".join(
@@ -553,120 +479,17 @@ if st.button("Generate Heatwave Forecast", type="primary"):
                     f"Excluded unavailable models in this run: {failed_names}."
                 )
 
-            if ensemble_frames:
-                ensemble_risk_df = pd.concat(ensemble_frames, ignore_index=True)
-                ensemble_risk_df["date"] = pd.to_datetime(ensemble_risk_df["date"])
+            if ensemble_result is not None:
+                model_codes_used, probability_df, risk_probs = ensemble_result
 
-                models_available = (
-                    ensemble_risk_df.groupby("date")["model"].nunique().sort_index()
-                )
-                risk_counts = (
-                    ensemble_risk_df.pivot_table(
-                        index="date",
-                        columns="risk_level",
-                        values="model",
-                        aggfunc="count",
-                        fill_value=0,
-                    )
-                    .reindex(columns=RISK_ORDER, fill_value=0)
-                    .sort_index()
-                )
-                risk_probs = risk_counts.div(risk_counts.sum(axis=1), axis=0).fillna(0.0)
-
-                probability_df = pd.DataFrame(index=risk_probs.index)
-                probability_df["models_available"] = models_available
-                probability_df["p_heatwave"] = (
-                    ensemble_risk_df.groupby("date")["heatwave_id"]
-                    .apply(lambda s: s.notna().mean())
-                    .sort_index()
-                )
-                probability_df["p_high_plus"] = (
-                    ensemble_risk_df.groupby("date")["risk_level"]
-                    .apply(lambda s: s.isin(["High", "Extreme"]).mean())
-                    .sort_index()
-                )
-                probability_df["p_extreme"] = (
-                    ensemble_risk_df.groupby("date")["risk_level"]
-                    .apply(lambda s: (s == "Extreme").mean())
-                    .sort_index()
-                )
-                probability_df["expected_risk_score"] = (
-                    ensemble_risk_df.groupby("date")["adjusted_risk_score"].mean().sort_index()
-                )
-                probability_df["most_likely_risk"] = risk_probs.idxmax(axis=1)
-
-                def _consensus_from_probs(row: pd.Series) -> str:
-                    for level in reversed(RISK_ORDER):
-                        if row[level] >= 0.5:
-                            return level
-                    return "Uncertain"
-
-                probability_df["consensus_risk"] = risk_probs.apply(_consensus_from_probs, axis=1)
-
-                model_codes_used = list(dict.fromkeys(ensemble_risk_df["model"]))
                 model_labels_used = [
                     f"{MODEL_LABEL_BY_CODE.get(code, code)} ({code})"
                     for code in model_codes_used
                 ]
                 st.caption(f"Models used: {', '.join(model_labels_used)}")
 
-                prob_fig = go.Figure()
-                prob_fig.add_trace(
-                    go.Scatter(
-                        x=probability_df.index,
-                        y=probability_df["p_heatwave"] * 100,
-                        mode="lines+markers",
-                        name="P(Heatwave)",
-                        line=dict(color="#6a4c93", width=2.5),
-                    )
-                )
-                prob_fig.add_trace(
-                    go.Scatter(
-                        x=probability_df.index,
-                        y=probability_df["p_high_plus"] * 100,
-                        mode="lines+markers",
-                        name="P(High+)",
-                        line=dict(color="#f46d43", width=2.5),
-                    )
-                )
-                prob_fig.add_trace(
-                    go.Scatter(
-                        x=probability_df.index,
-                        y=probability_df["p_extreme"] * 100,
-                        mode="lines+markers",
-                        name="P(Extreme)",
-                        line=dict(color="#d73027", width=2.5),
-                    )
-                )
-                prob_fig.update_layout(
-                    xaxis_title="Date",
-                    yaxis_title="Probability (%)",
-                    yaxis=dict(range=[0, 100]),
-                    margin=dict(l=40, r=20, t=30, b=40),
-                    legend=dict(title=""),
-                )
-                st.plotly_chart(prob_fig, use_container_width=True)
-
-                dist_fig = go.Figure()
-                for level in RISK_ORDER:
-                    dist_fig.add_trace(
-                        go.Bar(
-                            x=risk_probs.index,
-                            y=risk_probs[level] * 100,
-                            name=level,
-                            marker_color=RISK_COLORS[level],
-                        )
-                    )
-                dist_fig.update_layout(
-                    barmode="stack",
-                    xaxis_title="Date",
-                    yaxis_title="Risk Probability (%)",
-                    yaxis=dict(range=[0, 100]),
-                    margin=dict(l=40, r=20, t=30, b=40),
-                    legend=dict(title=""),
-                    title="Risk-Level Probability Distribution by Day",
-                )
-                st.plotly_chart(dist_fig, use_container_width=True)
+                plot("probability", probability_df)
+                plot("distribution", risk_probs)
 
                 prob_display = probability_df.reset_index().copy()
                 prob_display["date"] = pd.to_datetime(prob_display["date"]).dt.strftime("%a, %b %d")
@@ -704,134 +527,19 @@ if st.button("Generate Heatwave Forecast", type="primary"):
                 )
 
     if run_multi_city_comparison:
-        st.subheader("🌍 4-City Comparison")
+        st.subheader("🌍 Multi-City Comparison")
         st.caption(
-            "Comparing Athens, Rome, Stockholm, and London using the same pipeline and risk rules."
+            "Athens, Rome, Stockholm and London plus every city with a fresh precomputed bundle, "
+            "using the same pipeline and risk rules."
         )
 
         with st.spinner("Building multi-city comparison..."):
-            comparison_rows = []
-            for comp_city, (comp_lat, comp_lon) in latlon.items():
-                if comp_city == city:
-                    comp_detected_df = fig_df.copy()
-                    comp_risk_df = risk_df.copy()
-                else:
-                    comp_detected_df, comp_risk_df = run_pipeline_for_city(
-                        comp_city,
-                        comp_lat,
-                        comp_lon
-                    )
-                    comp_detected_df = comp_detected_df.copy()
-                    comp_detected_df["date"] = pd.to_datetime(comp_detected_df["date"])
-                    comp_risk_df = comp_risk_df.copy()
-                    comp_risk_df["date"] = pd.to_datetime(comp_risk_df["date"])
-
-                comp_detected_df["tmax_anomaly"] = (
-                    comp_detected_df["tmax"] - comp_detected_df["tmax_95p"]
-                )
-                comp_risk_df = enrich_risk_dataframe(comp_risk_df)
-
-                max_risk_score = int(comp_risk_df["adjusted_risk_score"].max())
-                comparison_rows.append(
-                    {
-                        "city": comp_city,
-                        "lat": comp_lat,
-                        "lon": comp_lon,
-                        "heatwave_days": int(comp_detected_df["heatwave_id"].notna().sum()),
-                        "escalated_days": int(comp_risk_df["risk_escalated"].sum()),
-                        "peak_tmax": float(comp_detected_df["tmax"].max()),
-                        "peak_tmax_anomaly": float(comp_detected_df["tmax_anomaly"].max()),
-                        "max_risk_score": max_risk_score,
-                        "max_risk_level": RISK_ORDER[max_risk_score],
-                    }
-                )
-
-            compare_df = pd.DataFrame(comparison_rows).sort_values(
-                ["max_risk_score", "peak_tmax"],
-                ascending=[False, False]
+            compare_df = build_city_comparison(
+                tuple((name, *coords) for name, coords in latlon.items())
             )
 
-        map_text = compare_df.apply(
-            lambda row: (
-                f"{row['city']}<br>"
-                f"Max risk: {row['max_risk_level']}<br>"
-                f"Peak Tmax: {row['peak_tmax']:.1f}°C<br>"
-                f"Heatwave days: {row['heatwave_days']}"
-            ),
-            axis=1
-        )
-
-        map_fig = go.Figure(
-            go.Scattergeo(
-                lon=compare_df["lon"],
-                lat=compare_df["lat"],
-                mode="markers+text",
-                text=compare_df["city"],
-                textposition="top center",
-                hovertemplate=map_text + "<extra></extra>",
-                marker=dict(
-                    size=12 + (compare_df["heatwave_days"] * 2),
-                    color=compare_df["max_risk_score"],
-                    cmin=0,
-                    cmax=4,
-                    colorscale=[
-                        [0.00, "#a8ddb5"],
-                        [0.25, "#fee08b"],
-                        [0.50, "#fdae61"],
-                        [0.75, "#f46d43"],
-                        [1.00, "#d73027"],
-                    ],
-                    line=dict(color="white", width=1),
-                    colorbar=dict(
-                        title="Max Risk",
-                        tickmode="array",
-                        tickvals=list(range(len(RISK_ORDER))),
-                        ticktext=RISK_ORDER
-                    ),
-                ),
-            )
-        )
-        map_fig.update_layout(
-            margin=dict(l=10, r=10, t=30, b=10),
-            geo=dict(
-                scope="europe",
-                projection_type="natural earth",
-                showland=True,
-                landcolor="#f7f3e9",
-                showcountries=True,
-                countrycolor="#c9c0ad",
-                lataxis=dict(range=[35, 62]),
-                lonaxis=dict(range=[-12, 31]),
-            ),
-            title="City Risk Map (Marker Color = Max Risk, Marker Size = Heatwave Days)"
-        )
-        st.plotly_chart(map_fig, use_container_width=True)
-
-        compare_chart = go.Figure()
-        compare_chart.add_trace(
-            go.Bar(
-                x=compare_df["city"],
-                y=compare_df["peak_tmax"],
-                name="Peak Tmax (°C)",
-                marker_color="#ff6f3c"
-            )
-        )
-        compare_chart.add_trace(
-            go.Bar(
-                x=compare_df["city"],
-                y=compare_df["peak_tmax_anomaly"],
-                name="Peak Tmax anomaly (°C)",
-                marker_color="#6a4c93"
-            )
-        )
-        compare_chart.update_layout(
-            barmode="group",
-            xaxis_title="City",
-            yaxis_title="Temperature (°C)",
-            margin=dict(l=40, r=20, t=30, b=40),
-            legend=dict(title="")
-        )
-        st.plotly_chart(compare_chart, use_container_width=True)
+        plot("comparison_map", compare_df)
+        plot("comparison_chart", compare_df)
 
         compare_display = compare_df[
             [
@@ -0,0 +1,89 @@
+"""Guard `uhf --help` startup time and keep heavy imports out of the CLI module.
+
+Usage:
+    python benchmarks/check_startup.py [--budget 0.6] [--runs 5]
+
+Runs `python -m urban_heatwave_forecaster.cli --help` in fresh interpreters and
+fails (exit 1) when the median wall time exceeds the budget, or when importing
+the CLI module loads any of the heavy dependencies that commands are expected
+to import lazily.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_BUDGET_SECONDS = 0.6
+HEAVY_MODULES = (
+    "pandas",
+    "numpy",
+    "pyarrow",
+    "requests",
+    "requests_cache",
+    "retry_requests",
+    "openmeteo_requests",
+    "plotly",
+    "PIL",
+    "streamlit",
+)
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT / "src"), env.get("PYTHONPATH")]))
+    return env
+
+
+def time_help(runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "urban_heatwave_forecaster.cli", "--help"],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            env=_env(),
+        )
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def heavy_imports() -> list[str]:
+    probe = (
+        "import sys, urban_heatwave_forecaster.cli; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", probe], check=True, capture_output=True, text=True, env=_env()
+    )
+    return [name for name in out.stdout.strip().split(",") if name]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SECONDS)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    failures = []
+    loaded = heavy_imports()
+    if loaded:
+        failures.append(f"cli imports heavy modules at startup: {', '.join(loaded)}")
+
+    timings = time_help(args.runs)
+    median = statistics.median(timings)
+    print(f"uhf --help: median {median:.3f}s over {args.runs} runs (budget {args.budget:.3f}s)")
+    if median > args.budget:
+        failures.append(f"median startup {median:.3f}s exceeds budget {args.budget:.3f}s")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
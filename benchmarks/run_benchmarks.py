@@ -0,0 +1,367 @@
+"""Benchmark the core pipeline stages on deterministic synthetic data.
+
+Usage:
+    python benchmarks/run_benchmarks.py --scale smoke
+    python benchmarks/run_benchmarks.py --scale default --output benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --scale default --compare benchmarks/baseline.json
+
+Each benchmark is timed (best of `--repeat` runs) and then run once more under
+`tracemalloc` to record peak Python/NumPy allocations. Results are written as
+JSON; `--compare` exits non-zero when any benchmark is slower (or uses more
+memory) than the baseline by more than `--tolerance`, or has no baseline entry
+for the same parameters.
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import synthetic  # noqa: E402
+from urban_heatwave_forecaster import (  # noqa: E402
+    bootstrap,
+    climate_normals,
+    data_fetcher,
+    detect_heatwaves,
+    districts,
+    ensemble,
+    risk_model,
+    rollups,
+    streaming_climatology,
+)
+
+SCALES = {
+    "smoke": {"cities": 1, "history_days": 7, "members": 1, "forecast_days": 7, "districts": 100},
+    "default": {
+        "cities": 100, "history_days": 365 * 30, "members": 51, "forecast_days": 16,
+        "districts": 100_000,
+    },
+    "production": {
+        "cities": 10_000, "history_days": 365 * 40, "members": 51, "forecast_days": 16,
+        "districts": 1_000_000,
+    },
+}
+
+
+def bench_daily_from_hourly(p, workdir):
+    hourly = [synthetic.hourly_forecast(i, days=p["forecast_days"]) for i in range(p["cities"])]
+
+    def run():
+        for i, (times, temps) in enumerate(hourly):
+            data_fetcher._daily_temperature_from_hourly_data(times, temps, synthetic.city_name(i))
+
+    return run
+
+
+def bench_build_climatology(p, workdir):
+    paths = []
+    for i in range(p["cities"]):
+        path = workdir / f"{synthetic.city_name(i)}_historical.csv"
+        synthetic.daily_history(i, n_days=p["history_days"]).to_csv(path, index=False)
+        paths.append(path)
+
+    def run():
+        for i, path in enumerate(paths):
+            climate_normals.build_percentile_climatology(
+                synthetic.city_name(i),
+                input_path=path,
+                output_path=workdir / f"{synthetic.city_name(i)}_climatology_95p.csv",
+            )
+
+    return run
+
+
+def bench_period_climatologies(p, workdir):
+    paths = []
+    for i in range(p["cities"]):
+        path = workdir / f"{synthetic.city_name(i)}_historical.csv"
+        synthetic.daily_history(i, n_days=p["history_days"]).to_csv(path, index=False)
+        paths.append(path)
+
+    def run():
+        for i, path in enumerate(paths):
+            climate_normals.build_period_climatologies(
+                synthetic.city_name(i),
+                # fixed spans: the synthetic history ends in 2020, recent<N> ends last year
+                periods=("1991-2020", "2011-2020", "2020-2020"),
+                input_path=path,
+                output_dir=workdir,
+            )
+
+    return run
+
+
+def bench_streaming_climatology(p, workdir):
+    paths = []
+    for i in range(p["cities"]):
+        path = workdir / f"{synthetic.city_name(i)}_historical.csv"
+        synthetic.daily_history(i, n_days=p["history_days"]).to_csv(path, index=False)
+        paths.append(path)
+
+    def run():
+        for i, path in enumerate(paths):
+            streaming_climatology.build_streaming_climatology(
+                synthetic.city_name(i),
+                path,
+                periods=("1991-2020",),
+                chunksize=100_000,
+                output_dir=workdir,
+            )
+
+    return run
+
+
+def bench_bootstrap_thresholds(p, workdir):
+    paths = {}
+    for i in range(p["cities"]):
+        path = workdir / f"{synthetic.city_name(i)}_historical.csv"
+        synthetic.daily_history(i, n_days=p["history_days"]).to_csv(path, index=False)
+        paths[synthetic.city_name(i)] = path
+
+    def run():
+        bootstrap.bootstrap_climatologies(paths, output_dir=workdir)
+
+    return run
+
+
+def bench_district_risk(p, workdir):
+    index = districts.DistrictIndex.from_frame(synthetic.district_table(p["districts"], p["cities"]))
+    forecast = pd.concat(
+        [synthetic.daily_forecast(i, days=p["forecast_days"]) for i in range(p["cities"])],
+        ignore_index=True,
+    )
+
+    def run():
+        districts.assess_district_risk(forecast, index).city_summary()
+
+    return run
+
+
+def bench_regional_rollup(p, workdir):
+    cities = synthetic.city_table(p["cities"])
+    cities["country"] = [f"country{i % 5}" for i in range(p["cities"])]
+    cities["region"] = [f"region{i % 20}" for i in range(p["cities"])]
+    hierarchy = rollups.Hierarchy.from_frames(
+        cities, synthetic.district_table(p["districts"], p["cities"])
+    )
+    forecast = pd.concat(
+        [synthetic.daily_forecast(i, days=p["forecast_days"]) for i in range(p["cities"])],
+        ignore_index=True,
+    )
+
+    def run():
+        rollups.build_rollup(hierarchy, forecast)
+
+    return run
+
+
+def bench_detect(p, workdir):
+    inputs = [
+        (synthetic.daily_forecast(i, days=p["forecast_days"]), synthetic.climatology(i))
+        for i in range(p["cities"])
+    ]
+
+    def run():
+        for forecast_df, clim_df in inputs:
+            detect_heatwaves.detect_heatwaves_df(forecast_df, clim_df)
+
+    return run
+
+
+def bench_detect_sensitivity(p, workdir):
+    inputs = []
+    for i in range(p["cities"]):
+        clim = synthetic.climatology(i)
+        for pct, shift in ((90, -1.5), (99, 2.0)):
+            clim[f"tmin_{pct}p"] = clim["tmin_95p"] + shift
+            clim[f"tmax_{pct}p"] = clim["tmax_95p"] + shift
+        inputs.append((synthetic.daily_forecast(i, days=p["forecast_days"]), clim))
+
+    def run():
+        for forecast_df, clim_df in inputs:
+            detect_heatwaves.detect_heatwaves_sensitivity(forecast_df, clim_df)
+
+    return run
+
+
+def bench_assess(p, workdir):
+    vulnerability = synthetic.city_table(p["cities"]).drop(columns=["lat", "lon"])
+    detected = pd.concat(
+        [
+            detect_heatwaves.detect_heatwaves_df(
+                synthetic.daily_forecast(i, days=p["forecast_days"]), synthetic.climatology(i)
+            )
+            for i in range(p["cities"])
+        ],
+        ignore_index=True,
+    )
+    detected["is_hot"] = detected["exceeds_95p"]
+
+    def run():
+        risk_model.assess_heatwave_risk(detected.copy(), vulnerability.copy())
+
+    return run
+
+
+def bench_ensemble(p, workdir):
+    frames = [
+        synthetic.ensemble_risk(i, members=p["members"], days=p["forecast_days"])
+        for i in range(p["cities"])
+    ]
+
+    def run():
+        for frame in frames:
+            ensemble.summarize_ensemble_risk(frame)
+
+    return run
+
+
+def bench_city_pipeline(p, workdir):
+    vulnerability = synthetic.city_table(p["cities"]).drop(columns=["lat", "lon"])
+    inputs = [
+        (synthetic.hourly_forecast(i, days=p["forecast_days"]), synthetic.climatology(i))
+        for i in range(p["cities"])
+    ]
+
+    def run():
+        for i, ((times, temps), clim_df) in enumerate(inputs):
+            daily = data_fetcher._daily_temperature_from_hourly_data(
+                times, temps, synthetic.city_name(i)
+            )
+            detected = detect_heatwaves.detect_heatwaves_df(daily, clim_df)
+            detected["is_hot"] = detected["exceeds_95p"]
+            risk = risk_model.assess_heatwave_risk(detected, vulnerability.copy())
+            ensemble.enrich_risk_dataframe(risk)
+
+    return run
+
+
+BENCHMARKS = {
+    "daily_from_hourly": (bench_daily_from_hourly, ("cities", "forecast_days")),
+    "build_climatology": (bench_build_climatology, ("cities", "history_days")),
+    "period_climatologies": (bench_period_climatologies, ("cities", "history_days")),
+    "streaming_climatology": (bench_streaming_climatology, ("cities", "history_days")),
+    "bootstrap_thresholds": (bench_bootstrap_thresholds, ("cities", "history_days")),
+    "detect_heatwaves": (bench_detect, ("cities", "forecast_days")),
+    "detect_sensitivity": (bench_detect_sensitivity, ("cities", "forecast_days")),
+    "assess_risk": (bench_assess, ("cities", "forecast_days")),
+    "district_risk": (bench_district_risk, ("cities", "districts", "forecast_days")),
+    "regional_rollup": (bench_regional_rollup, ("cities", "districts", "forecast_days")),
+    "ensemble_aggregation": (bench_ensemble, ("cities", "members", "forecast_days")),
+    "city_pipeline": (bench_city_pipeline, ("cities", "forecast_days")),
+}
+
+
+def _measure(run, repeat: int) -> tuple[float, float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak / 1e6
+
+
+def run_suite(params: dict, names: list[str], repeat: int) -> dict:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        for name in names:
+            factory, used = BENCHMARKS[name]
+            run = factory(params, workdir)
+            seconds, peak_mb = _measure(run, repeat)
+            results.append({
+                "name": name,
+                "params": {key: params[key] for key in used},
+                "seconds": round(seconds, 6),
+                "peak_mb": round(peak_mb, 3),
+            })
+            print(f"{name:<22} {seconds:>10.4f} s {peak_mb:>10.1f} MB")
+
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "params": params,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return descriptions of benchmarks that regressed beyond `tolerance` or have no baseline."""
+    previous = {(r["name"], json.dumps(r["params"], sort_keys=True)): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        key = (result["name"], json.dumps(result["params"], sort_keys=True))
+        if key not in previous:
+            print(f"{result['name']:<22} missing from baseline")
+            regressions.append(f"{result['name']} (no baseline)")
+            continue
+        for metric in ("seconds", "peak_mb"):
+            before, after = previous[key][metric], result[metric]
+            ratio = after / before if before else 1.0
+            print(f"{result['name']:<22} {metric:<8} {before:>10.4f} -> {after:>10.4f} ({ratio:.2f}x)")
+            if ratio > tolerance:
+                regressions.append(f"{result['name']} {metric} {ratio:.2f}x")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="smoke")
+    parser.add_argument("--cities", type=int, help="Override number of cities (1–10,000).")
+    parser.add_argument("--history-days", type=int, help="Override history length (7 days – 40 years).")
+    parser.add_argument("--members", type=int, help="Override ensemble members (1–51).")
+    parser.add_argument("--forecast-days", type=int, help="Override forecast horizon.")
+    parser.add_argument("--districts", type=int, help="Override sub-city units for district risk.")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run a subset.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="Write results JSON here.")
+    parser.add_argument("--compare", type=Path, help="Baseline JSON to compare against.")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    params = dict(SCALES[args.scale])
+    for key in ("cities", "history_days", "members", "forecast_days", "districts"):
+        value = getattr(args, key)
+        if value is not None:
+            params[key] = value
+
+    current = run_suite(params, args.only or list(BENCHMARKS), args.repeat)
+    current["meta"]["scale"] = args.scale
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(current, indent=2) + "\n")
+        print(f"Saved: {args.output}")
+
+    if args.compare:
+        regressions = compare(current, json.loads(args.compare.read_text()), args.tolerance)
+        if regressions:
+            print("Failed against baseline: " + ", ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
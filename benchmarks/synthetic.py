@@ -0,0 +1,143 @@
+"""Deterministic synthetic inputs for the benchmark suite.
+
+Per-city generators are seeded from `(seed, city_index)`, so city N gets the
+same data whether 1 or 10,000 cities are requested.
+Temperatures follow a seasonal cycle plus a diurnal cycle and noise, tuned so
+that a few percent of days exceed the synthetic 95th-percentile climatology.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from urban_heatwave_forecaster.ensemble import RISK_ORDER
+from urban_heatwave_forecaster.risk_model import RISK_BANDS
+
+DEFAULT_SEED = 2025
+
+
+def _rng(seed: int, index: int) -> np.random.Generator:
+    return np.random.default_rng([seed, index])
+
+
+def city_name(index: int) -> str:
+    return f"city{index:05d}"
+
+
+def city_table(n_cities: int, seed: int = DEFAULT_SEED) -> pd.DataFrame:
+    """Cities with coordinates and vulnerability columns like `urban_vulnerability.csv`."""
+    rng = np.random.default_rng([seed, 2**32 - 1])  # distinct from any city stream
+    return pd.DataFrame({
+        "city": [city_name(i) for i in range(n_cities)],
+        "lat": rng.uniform(35, 62, n_cities).round(4),
+        "lon": rng.uniform(-10, 30, n_cities).round(4),
+        "elderly_percent": rng.uniform(10, 28, n_cities).round(2),
+        "green_cover_percent": rng.uniform(15, 55, n_cities).round(1),
+        "density_per_km2": rng.integers(500, 9000, n_cities),
+    })
+
+
+def district_table(n_districts: int, n_cities: int, seed: int = DEFAULT_SEED) -> pd.DataFrame:
+    """Districts spread over `n_cities` parents, like `district_vulnerability.csv`."""
+    rng = np.random.default_rng([seed, 2**32 - 2])
+    return pd.DataFrame({
+        "city": [city_name(i) for i in rng.integers(0, n_cities, n_districts)],
+        "district": [f"d{i:07d}" for i in range(n_districts)],
+        "elderly_percent": rng.uniform(8, 30, n_districts).round(2),
+        "green_cover_percent": rng.uniform(5, 60, n_districts).round(1),
+        "density_per_km2": rng.integers(100, 20000, n_districts),
+        "population": rng.integers(500, 20000, n_districts),
+    })
+
+
+def _seasonal_mean(day_of_year: np.ndarray, offset: float) -> np.ndarray:
+    return offset + 10 * np.sin(2 * np.pi * (day_of_year - 110) / 365.25)
+
+
+def climatology(index: int, seed: int = DEFAULT_SEED) -> pd.DataFrame:
+    """Synthetic 95th-percentile thresholds matching `build_percentile_climatology` output."""
+    offset = _rng(seed, index).uniform(12, 22)
+    doy = np.arange(1, 366)
+    mean = _seasonal_mean(doy, offset)
+    return pd.DataFrame({
+        "day_of_year": doy,
+        "tmin_95p": (mean - 1.0).round(2),
+        "tmax_95p": (mean + 11.0).round(2),
+    })
+
+
+def hourly_forecast(
+    index: int,
+    days: int = 7,
+    seed: int = DEFAULT_SEED,
+    start: date | None = None,
+) -> tuple[list[str], list[float]]:
+    """Open-Meteo-style hourly `time` / `temperature_2m` lists starting today."""
+    rng = _rng(seed, index)
+    offset = rng.uniform(12, 22)
+    times = pd.date_range(start or date.today(), periods=days * 24, freq="h")
+    doy = times.dayofyear.to_numpy()
+    hour = times.hour.to_numpy()
+    daily_anomaly = np.repeat(rng.normal(0, 3, days), 24)
+    temps = (
+        _seasonal_mean(doy, offset)
+        + 6 * np.sin(2 * np.pi * (hour - 9) / 24)
+        + daily_anomaly
+        + rng.normal(0, 0.5, len(times))
+    )
+    return list(times.strftime("%Y-%m-%dT%H:%M")), temps.round(1).tolist()
+
+
+def daily_forecast(index: int, days: int = 7, seed: int = DEFAULT_SEED) -> pd.DataFrame:
+    """Daily tmin/tmax in the shape produced by `data_fetcher`."""
+    rng = _rng(seed, index)
+    offset = rng.uniform(12, 22)
+    dates = pd.date_range(date.today(), periods=days, freq="D")
+    mean = _seasonal_mean(dates.dayofyear.to_numpy(), offset) + rng.normal(0, 3, days)
+    return pd.DataFrame({
+        "date": dates.date,
+        "tmin": (mean - 5 + rng.normal(0, 1, days)).round(1),
+        "tmax": (mean + 7 + rng.normal(0, 1, days)).round(1),
+        "city": city_name(index),
+    })
+
+
+def daily_history(
+    index: int,
+    n_days: int = 365 * 30,
+    end: str = "2020-12-31",
+    seed: int = DEFAULT_SEED,
+) -> pd.DataFrame:
+    """Daily observations ending at `end`, like `fetch_historical_data` output."""
+    rng = _rng(seed, index)
+    offset = rng.uniform(12, 22)
+    dates = pd.date_range(end=end, periods=n_days, freq="D")
+    mean = _seasonal_mean(dates.dayofyear.to_numpy(), offset) + rng.normal(0, 3, n_days)
+    return pd.DataFrame({
+        "date": dates,
+        "tmin": (mean - 5 + rng.normal(0, 1, n_days)).astype("float32"),
+        "tmax": (mean + 7 + rng.normal(0, 1, n_days)).astype("float32"),
+        "city": city_name(index),
+    })
+
+
+def ensemble_risk(
+    index: int,
+    members: int = 3,
+    days: int = 7,
+    seed: int = DEFAULT_SEED,
+) -> pd.DataFrame:
+    """Enriched per-member risk rows, the input of `summarize_ensemble_risk`."""
+    rng = _rng(seed, index)
+    dates = pd.date_range(date.today(), periods=days, freq="D")
+    scores = np.clip(
+        rng.integers(0, 3, days)[None, :] + rng.integers(-1, 2, (members, days)), 0, len(RISK_BANDS)
+    )
+    hot = rng.random((members, days)) < 0.2
+    return pd.DataFrame({
+        "date": np.tile(dates, members),
+        "model": np.repeat([f"member{m:02d}" for m in range(members)], days),
+        "risk_level": np.array(RISK_ORDER)[scores.ravel()],
+        "adjusted_risk_score": scores.ravel(),
+        "heatwave_id": np.where(hot.ravel(), 1.0, np.nan),
+    })
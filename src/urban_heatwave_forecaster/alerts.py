@@ -0,0 +1,204 @@
+"""Alert on what changed between consecutive forecast runs.
+
+The previous run is kept as a compact keyed state, one row per
+(city, model, date) with its risk score and heatwave id, in
+`data/alerts/state.parquet`. `diff_states` compares a new run with it on
+those keys and returns only the changes:
+
+``new_heatwave``        an event none of whose days was a heatwave day before
+``cancelled_heatwave``  an earlier event none of whose remaining days still is
+``escalation``          a day's risk level went up (days entering the horizon
+                        count as up from "None")
+``de-escalation``       a day's risk level went down
+
+Heatwave ids are numbered per run, so events are matched by the days they
+cover, not by id. Days that have slid into the past are dropped from the
+comparison, and cities or models missing from the new run keep their state.
+Changes are appended to `data/alerts/changes.jsonl` and/or POSTed as one JSON
+array to a webhook, so a quiet refresh costs nothing downstream however many
+cities and days it covers.
+"""
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .ensemble import RISK_ORDER, RISK_TO_SCORE
+from .instrumentation import stage
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+ALERTS_DIR = PROJECT_ROOT / "data" / "alerts"
+STATE_PATH = ALERTS_DIR / "state.parquet"
+CHANGES_PATH = ALERTS_DIR / "changes.jsonl"
+KEYS = ["city", "model", "date"]
+STATE_COLUMNS = [*KEYS, "risk_score", "heatwave_id"]
+LOGGER = logging.getLogger(__name__)
+
+
+def state_from_risk(risk_df: pd.DataFrame) -> pd.DataFrame:
+    """Keyed state of a run from risk rows with city, model, date, risk_level, heatwave_id."""
+    state = pd.DataFrame({
+        "city": risk_df["city"].astype(str).str.strip().str.lower().to_numpy(),
+        "model": risk_df["model"].astype(str).to_numpy(),
+        "date": pd.to_datetime(risk_df["date"]).dt.normalize().to_numpy(),
+        "risk_score": risk_df["risk_level"].map(RISK_TO_SCORE).fillna(0).astype(np.int8).to_numpy(),
+        "heatwave_id": pd.to_numeric(risk_df["heatwave_id"]).astype("Int32").to_numpy(),
+    })
+    return state.drop_duplicates(KEYS, keep="last").sort_values(KEYS).reset_index(drop=True)
+
+
+def load_state(path: str | Path | None = None) -> pd.DataFrame:
+    path = Path(path or STATE_PATH)
+    if not path.exists():
+        return pd.DataFrame({
+            "city": pd.Series(dtype=str),
+            "model": pd.Series(dtype=str),
+            "date": pd.Series(dtype="datetime64[ns]"),
+            "risk_score": pd.Series(dtype=np.int8),
+            "heatwave_id": pd.Series(dtype="Int32"),
+        })
+    state = pd.read_parquet(path)
+    state["city"] = state["city"].astype(str)
+    state["model"] = state["model"].astype(str)
+    state["date"] = pd.to_datetime(state["date"])
+    return state
+
+
+def save_state(state: pd.DataFrame, path: str | Path | None = None) -> None:
+    path = Path(path or STATE_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    compact = state[STATE_COLUMNS].astype({"city": "category", "model": "category"})
+    tmp_path = path.with_suffix(".parquet.tmp")
+    compact.to_parquet(tmp_path, index=False, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def merge_state(previous: pd.DataFrame, current: pd.DataFrame) -> pd.DataFrame:
+    """`current` replaces whole (city, model) series; the others are kept."""
+    updated = pd.MultiIndex.from_frame(current[["city", "model"]].drop_duplicates())
+    kept = previous[~pd.MultiIndex.from_frame(previous[["city", "model"]]).isin(updated)]
+    frames = [frame for frame in (kept, current) if not frame.empty]
+    if not frames:
+        return current.copy()
+    return pd.concat(frames, ignore_index=True).sort_values(KEYS).reset_index(drop=True)
+
+
+def _event_records(rows: pd.DataFrame, id_column: str, score_column: str, change: str) -> list[dict]:
+    events = rows.groupby(["city", "model", id_column]).agg(
+        start=("date", "min"), end=("date", "max"), days=("date", "size"),
+        peak=(score_column, "max"),
+    )
+    return [
+        {
+            "type": change,
+            "city": city,
+            "model": model,
+            "start": f"{start:%Y-%m-%d}",
+            "end": f"{end:%Y-%m-%d}",
+            "days": int(days),
+            "peak_risk": RISK_ORDER[int(peak)],
+        }
+        for (city, model, _), start, end, days, peak in zip(
+            events.index, events["start"], events["end"], events["days"], events["peak"]
+        )
+    ]
+
+
+def diff_states(previous: pd.DataFrame, current: pd.DataFrame) -> list[dict]:
+    """Changes from `previous` to `current`; see the module docstring for the types."""
+    with stage("alerts_diff") as info:
+        # only the series in the new run, from each series' first day on
+        first_day = current.groupby(["city", "model"], as_index=False)["date"].min()
+        prev = previous.merge(first_day, on=["city", "model"], suffixes=("", "_first"))
+        prev = prev[prev["date"] >= prev["date_first"]].drop(columns="date_first")
+
+        merged = current.merge(prev, on=KEYS, how="outer", suffixes=("", "_prev"))
+        merged["risk_score"] = merged["risk_score"].fillna(0).astype(np.int8)
+        merged["risk_score_prev"] = merged["risk_score_prev"].fillna(0).astype(np.int8)
+        hot = merged["heatwave_id"].notna()
+        hot_prev = merged["heatwave_id_prev"].notna()
+
+        changes = []
+        current_events = merged[hot].copy()
+        was_hot = current_events.assign(hit=hot_prev[hot]).groupby(
+            ["city", "model", "heatwave_id"]
+        )["hit"].transform("any")
+        changes += _event_records(current_events[~was_hot], "heatwave_id", "risk_score", "new_heatwave")
+
+        previous_events = merged[hot_prev].copy()
+        still_hot = previous_events.assign(hit=hot[hot_prev]).groupby(
+            ["city", "model", "heatwave_id_prev"]
+        )["hit"].transform("any")
+        changes += _event_records(
+            previous_events[~still_hot], "heatwave_id_prev", "risk_score_prev", "cancelled_heatwave"
+        )
+
+        moved = merged[merged["risk_score"] != merged["risk_score_prev"]]
+        for city, model, day, old, new in zip(
+            moved["city"], moved["model"], moved["date"],
+            moved["risk_score_prev"], moved["risk_score"],
+        ):
+            changes.append({
+                "type": "escalation" if new > old else "de-escalation",
+                "city": city,
+                "model": model,
+                "date": f"{day:%Y-%m-%d}",
+                "from": RISK_ORDER[old],
+                "to": RISK_ORDER[new],
+            })
+        info["rows"] = len(merged)
+    return changes
+
+
+def write_jsonl(changes: list[dict], path: str | Path | None = None) -> Path:
+    """Append one JSON object per change."""
+    path = Path(path or CHANGES_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as fh:
+        for change in changes:
+            fh.write(json.dumps(change, sort_keys=True) + "\n")
+    return path
+
+
+def post_webhook(changes: list[dict], url: str, timeout: float = 10.0) -> None:
+    """POST all changes as one JSON array."""
+    import requests
+
+    response = requests.post(url, json=changes, timeout=timeout)
+    response.raise_for_status()
+
+
+def update_alerts(
+    risk_df: pd.DataFrame,
+    state_path: str | Path | None = None,
+    jsonl_path: str | Path | None = None,
+    webhook: str | None = None,
+    issued_at: datetime | None = None,
+) -> list[dict]:
+    """Diff a run's risk rows against the stored state, emit the changes and store the run.
+
+    `risk_df` holds one row per (city, model, date), as in the per-model risk
+    frames of `bundles.compute_city_results`. The first run has no state, so every
+    heatwave and every day above "None" is reported. The state is only replaced
+    once the changes have been delivered, so a failed webhook is retried with
+    the same changes on the next run.
+    """
+    issued_at = (issued_at or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    previous = load_state(state_path)
+    current = state_from_risk(risk_df)
+    changes = diff_states(previous, current)
+    stamp = issued_at.isoformat(timespec="seconds")
+    changes = [{"issued_at": stamp, **change} for change in changes]
+
+    if changes:
+        if jsonl_path is not None or webhook is None:
+            write_jsonl(changes, jsonl_path)
+        if webhook is not None:
+            post_webhook(changes, webhook)
+    save_state(merge_state(previous, current), state_path)
+    LOGGER.info("%d alert changes over %d keyed days", len(changes), len(current))
+    return changes
@@ -0,0 +1,348 @@
+"""Asyncio fetch engine for many cities and models.
+
+The blocking fetchers in `data_fetcher` and `fetch_historical` issue one request
+at a time. This engine runs the same requests concurrently under a global
+concurrency cap and a token-bucket limiter that mirrors Open-Meteo's quotas,
+retries with jittered backoff (honouring `Retry-After`), and yields parsed
+daily frames as soon as each request completes.
+
+Requests are executed with `requests` in worker threads so the engine shares
+the HTTP stack and payload parsing of the synchronous path. Endpoints follow
+`data_fetcher.api_url`, so `UHF_OPEN_METEO_BASE_URL` (or explicit
+`forecast_url` / `archive_url`) points it at the local stub server.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections.abc import AsyncIterator, Iterable
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import climate_normals, data_fetcher, fetch_historical, forecast_archive, recorder
+from .daily_stats import DailyStats
+from .instrumentation import record_fetch
+
+LOGGER = logging.getLogger(__name__)
+
+# (requests, seconds) — Open-Meteo's published free-tier limits
+DEFAULT_QUOTAS = ((600, 60.0), (5_000, 3_600.0), (10_000, 86_400.0))
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `capacity / period` tokens per second."""
+
+    def __init__(self, capacity: int, period: float, clock=time.monotonic):
+        if capacity <= 0 or period <= 0:
+            raise ValueError("Token bucket capacity and period must be positive.")
+        self.capacity = float(capacity)
+        self.rate = capacity / period
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay_for(self, tokens: float = 1.0) -> float:
+        """Seconds until `tokens` are available (0 if they are available now)."""
+        self._refill()
+        if self._tokens >= tokens:
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def consume(self, tokens: float = 1.0) -> None:
+        self._refill()
+        self._tokens -= tokens
+
+
+class RateLimiter:
+    """Combine several token buckets; a request proceeds only when all allow it."""
+
+    def __init__(self, quotas=DEFAULT_QUOTAS, clock=time.monotonic):
+        self.buckets = [TokenBucket(limit, period, clock=clock) for limit, period in quotas]
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        async with self._lock:
+            while True:
+                delay = max((b.delay_for(tokens) for b in self.buckets), default=0.0)
+                if delay <= 0:
+                    for bucket in self.buckets:
+                        bucket.consume(tokens)
+                    return
+                await asyncio.sleep(delay)
+
+
+@dataclass(frozen=True)
+class ForecastJob:
+    city: str
+    lat: float
+    lon: float
+    model: str = "ecmwf_ifs025"
+    forecast_days: int = 7
+    hourly_variables: tuple[str, ...] = ()
+    indices: tuple[str, ...] = ()
+    daily_stats: DailyStats | None = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.city.lower()}:{self.model}"
+
+
+@dataclass(frozen=True)
+class HistoricalJob:
+    city: str
+    lat: float
+    lon: float
+    start_date: str | None = None
+    end_date: str | None = None
+    periods: tuple[str, ...] = (climate_normals.DEFAULT_PERIOD,)
+
+    @property
+    def key(self) -> str:
+        return f"{self.city.lower()}:historical"
+
+    def span(self) -> tuple[str, str]:
+        """Archive dates: explicit bounds, else the span of `periods` (as `fetch_historical_data`)."""
+        start, end = climate_normals.period_span(self.periods)
+        return self.start_date or start, self.end_date or end
+
+
+@dataclass
+class FetchResult:
+    job: ForecastJob | HistoricalJob
+    frame: pd.DataFrame | None = None
+    error: str | None = None
+    attempts: int = 0
+    elapsed: float = 0.0
+    meta: dict = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _retry_after_seconds(value: str | None) -> float | None:
+    """Parse a `Retry-After` header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class AsyncFetchEngine:
+    """Concurrent, rate-limited Open-Meteo fetcher.
+
+    Args:
+        max_concurrency: Upper bound on in-flight requests across all jobs.
+        quotas: Iterable of `(requests, seconds)` limits enforced together.
+        retries: Retries per request after the first attempt.
+        backoff_base / backoff_max: Exponential backoff bounds (seconds); each
+            wait is drawn uniformly from `[0, min(max, base * 2**attempt)]`.
+        forecast_url / archive_url: Endpoint overrides, e.g. a local stub server.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        quotas=DEFAULT_QUOTAS,
+        retries: int = 5,
+        backoff_base: float = 0.2,
+        backoff_max: float = 30.0,
+        timeout: float = 30.0,
+        forecast_url: str | None = None,
+        archive_url: str | None = None,
+        session: requests.Session | None = None,
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self.max_concurrency = max_concurrency
+        self.quotas = tuple(quotas)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.forecast_url = forecast_url or data_fetcher.api_url("forecast")
+        self.archive_url = archive_url or data_fetcher.api_url("archive")
+        self.session = (
+            session
+            or recorder.replay_session()
+            or recorder.attach(self._build_session(max_concurrency))
+        )
+
+    @staticmethod
+    def _build_session(pool_size: int) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        jittered = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        if retry_after is not None:
+            return max(retry_after, jittered)
+        return jittered
+
+    async def _get_json(self, url: str, params: dict, limiter: RateLimiter) -> tuple[dict, int]:
+        attempt = 0
+        while True:
+            await limiter.acquire()
+            retry_after = None
+            try:
+                response = await asyncio.to_thread(
+                    self.session.get, url, params=params, timeout=self.timeout
+                )
+            except requests.RequestException as exc:
+                if attempt >= self.retries:
+                    raise RuntimeError(f"Request to {url} failed: {exc}") from exc
+            else:
+                record_fetch(
+                    "archive" if url == self.archive_url else "forecast",
+                    latency=response.elapsed.total_seconds(),
+                    n_bytes=len(response.content),
+                    from_cache=False,
+                    status=response.status_code,
+                )
+                if response.status_code not in RETRY_STATUS:
+                    if response.status_code >= 400:
+                        raise RuntimeError(
+                            f"Request to {url} failed "
+                            f"(status {response.status_code}: {response.text[:300]})"
+                        )
+                    try:
+                        return response.json(), attempt + 1
+                    except ValueError as exc:
+                        raise RuntimeError(f"Response from {url} was not valid JSON.") from exc
+                if attempt >= self.retries:
+                    raise RuntimeError(
+                        f"Request to {url} failed after {attempt + 1} attempts "
+                        f"(status {response.status_code})"
+                    )
+                retry_after = _retry_after_seconds(response.headers.get("Retry-After"))
+
+            delay = self._backoff(attempt, retry_after)
+            LOGGER.debug("Retrying %s in %.2fs (attempt %d)", url, delay, attempt + 1)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _run_job(self, job, semaphore: asyncio.Semaphore, limiter: RateLimiter) -> FetchResult:
+        result = FetchResult(job=job)
+        started = time.perf_counter()
+        async with semaphore:
+            try:
+                if isinstance(job, ForecastJob):
+                    variables = data_fetcher.required_hourly_variables(
+                        job.hourly_variables, job.indices
+                    )
+                    params = data_fetcher._forecast_params(
+                        job.lat, job.lon, model=job.model, forecast_days=job.forecast_days,
+                        hourly_variables=variables,
+                    )
+                    payload, result.attempts = await self._get_json(
+                        self.forecast_url, params, limiter
+                    )
+                    hourly = data_fetcher._validate_forecast_payload(
+                        payload, model=job.model, hourly_variables=variables
+                    )["hourly"]
+                    result.meta["payload_hash"] = forecast_archive.payload_hash(payload)
+                    result.meta["utc_offset_seconds"] = payload.get("utc_offset_seconds", 0)
+                    result.frame = data_fetcher._daily_frame_from_hourly(
+                        {name: hourly[name] for name in ["time", *variables]},
+                        city_name=job.city,
+                        indices=job.indices,
+                        include_model_col=True,
+                        model=job.model,
+                        stats=job.daily_stats,
+                    )
+                else:
+                    start_date, end_date = job.span()
+                    params = fetch_historical._archive_params(
+                        job.lat, job.lon, start_date=start_date, end_date=end_date
+                    )
+                    payload, result.attempts = await self._get_json(
+                        self.archive_url, params, limiter
+                    )
+                    result.frame = fetch_historical._daily_frame_from_archive_json(payload, job.city)
+            except Exception as exc:
+                result.error = str(exc)
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    async def stream(self, jobs: Iterable[ForecastJob | HistoricalJob]) -> AsyncIterator[FetchResult]:
+        """Yield a `FetchResult` for every job in completion order."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limiter = RateLimiter(self.quotas)
+        tasks = [asyncio.create_task(self._run_job(job, semaphore, limiter)) for job in jobs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def gather(self, jobs: Iterable[ForecastJob | HistoricalJob]) -> list[FetchResult]:
+        return [result async for result in self.stream(jobs)]
+
+
+def _default_save_path(job: ForecastJob | HistoricalJob) -> Path:
+    if isinstance(job, ForecastJob):
+        return data_fetcher.DATA_DIR / f"{job.city.lower()}_{job.model}_forecast.csv"
+    return data_fetcher.DATA_DIR / f"{job.city.lower()}_historical.csv"
+
+
+async def fetch_and_save(
+    jobs: Iterable[ForecastJob | HistoricalJob],
+    engine: AsyncFetchEngine | None = None,
+    archive: bool = True,
+) -> list[FetchResult]:
+    """Fetch all jobs and write each frame to the same paths as the sync fetchers.
+
+    Forecast runs are also appended to the forecast archive unless `archive` is False.
+    """
+    engine = engine or AsyncFetchEngine()
+    results = []
+    async for result in engine.stream(jobs):
+        if result.ok:
+            save_path = data_fetcher.write_csv_atomic(result.frame, _default_save_path(result.job))
+            result.meta["save_path"] = str(save_path)
+            # a replayed payload is not a new run
+            if archive and not recorder.replaying() and isinstance(result.job, ForecastJob):
+                forecast_archive.append_run(
+                    result.frame,
+                    city=result.job.city,
+                    model=result.job.model,
+                    digest=result.meta["payload_hash"],
+                    utc_offset_seconds=result.meta["utc_offset_seconds"],
+                )
+            LOGGER.info("Saved %s to %s", result.job.key, save_path)
+        else:
+            LOGGER.warning("Fetch failed for %s: %s", result.job.key, result.error)
+        results.append(result)
+    return results
+
+
+def fetch_many(
+    jobs: Iterable[ForecastJob | HistoricalJob],
+    engine: AsyncFetchEngine | None = None,
+    archive: bool = True,
+) -> list[FetchResult]:
+    """Blocking convenience wrapper around `fetch_and_save`."""
+    return asyncio.run(fetch_and_save(list(jobs), engine=engine, archive=archive))
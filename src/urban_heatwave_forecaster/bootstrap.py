@@ -0,0 +1,196 @@
+"""Bootstrap confidence intervals for percentile climatology thresholds.
+
+A 95th-percentile threshold comes from about 30 values per day of year, so it is
+uncertain by several tenths of a degree. `bootstrap_quantiles` resamples those
+values with replacement `n_boot` times and returns the spread of the
+resampled percentile. It is vectorized over every (city, day-of-year) column
+at once:
+
+* the values of each column are sorted once, with missing years moved to the
+  end as +inf;
+* each batch draws a (resamples × columns × years) matrix of random indices.
+  Sorting the indices sorts the resample, because the source is sorted, so
+  only the two order statistics the percentile interpolates between (as
+  `np.quantile` does) are gathered;
+* batches are sized to about `BATCH_ELEMENTS` indices, so memory stays flat for
+  hundreds of cities. `bootstrap_climatologies` can also split the cities
+  over a process pool.
+
+The result is written next to the point estimates as
+`<city>_climatology_ci.csv`, with `tmin_95p_lo` / `tmin_95p_hi` (and so on)
+bounds. It is a drop-in climatology for detection, and
+`detect_heatwaves.detect_heatwaves_df` adds an `uncertain_exceedance` flag when
+the bounds are present.
+"""
+import logging
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .climate_normals import DEFAULT_PERIOD, PROCESSED_DIR, YearDoyArray, calendar_period, percentile_column
+from .instrumentation import stage
+
+N_BOOT = 1000
+CONFIDENCE = 0.9
+BATCH_ELEMENTS = 4_000_000
+DAYS = 365
+LOGGER = logging.getLogger(__name__)
+
+
+def ci_column(variable: str, percentile: float, bound: str) -> str:
+    """Column name of a threshold bound, e.g. ``tmax_95p_lo`` or ``tmax_95p_hi``."""
+    return f"{percentile_column(variable, percentile)}_{bound}"
+
+
+def bootstrap_quantiles(
+    samples: np.ndarray,
+    percentiles=(95,),
+    n_boot: int = N_BOOT,
+    confidence: float = CONFIDENCE,
+    seed: int = 0,
+) -> dict[float, tuple[np.ndarray, np.ndarray]]:
+    """Bootstrap interval of each column's percentiles.
+
+    `samples` is (years × columns) with NaN for missing values. Returns
+    `{percentile: (lower, upper)}`, each an array with one bound per column
+    (NaN for columns without data).
+    """
+    samples = np.asarray(samples, dtype=float)
+    n_years, n_cols = samples.shape
+    counts = (~np.isnan(samples)).sum(axis=0)
+    ordered = np.sort(np.where(np.isnan(samples), np.inf, samples), axis=0).T  # (columns, years)
+    has_data = counts > 0
+    size = np.maximum(counts, 1)
+    q = np.asarray(percentiles, dtype=float) / 100
+    # order statistics to interpolate between, per (percentile, column)
+    h = (size[None, :] - 1) * q[:, None]
+    lower_rank = np.floor(h).astype(np.int64)
+    upper_rank = np.minimum(lower_rank + 1, size[None, :] - 1)
+    fraction = h - lower_rank
+
+    rng = np.random.default_rng(seed)
+    padded = np.arange(n_years)[None, :] >= counts[:, None]  # (columns, years)
+    scale = size.astype(np.float32)[None, :, None]
+    col = np.arange(n_cols)
+    batch = max(1, BATCH_ELEMENTS // max(n_cols * n_years, 1))
+    resampled = np.empty((len(q), n_boot, n_cols))
+    for start in range(0, n_boot, batch):
+        b = min(batch, n_boot - start)
+        draws = rng.random((b, n_cols, n_years), dtype=np.float32)
+        draws *= scale
+        index = draws.astype(np.int32)
+        # slots beyond a column's own sample size point at its +inf padding
+        np.copyto(index, n_years - 1, where=padded[None])
+        index.sort(axis=-1)
+        for i in range(len(q)):
+            lo = ordered[col, index[:, col, lower_rank[i]]]
+            hi = ordered[col, index[:, col, upper_rank[i]]]
+            # columns without data gather +inf padding; they are set to NaN below
+            with np.errstate(invalid="ignore"):
+                resampled[i, start:start + b] = lo + fraction[i] * (hi - lo)
+
+    tail = (1 - confidence) / 2
+    bounds = np.quantile(resampled, [tail, 1 - tail], axis=1)  # (2, percentiles, columns)
+    bounds[:, :, ~has_data] = np.nan
+    return {p: (bounds[0, i], bounds[1, i]) for i, p in enumerate(percentiles)}
+
+
+def _stack_cities(arrays: list[YearDoyArray], column: str) -> np.ndarray:
+    """(years × cities·365) matrix of one column, NaN-padded to the longest history."""
+    n_years = max(len(a.years) for a in arrays)
+    stacked = np.full((n_years, len(arrays) * DAYS), np.nan)
+    for i, array in enumerate(arrays):
+        grid = array.values[column]
+        stacked[: grid.shape[0], i * DAYS:(i + 1) * DAYS] = grid
+    return stacked
+
+
+def _period_rows(array: YearDoyArray, period: str) -> YearDoyArray:
+    """The years of `array` inside the reference `period`."""
+    first, last = calendar_period(period)
+    rows = (array.years >= first) & (array.years <= last)
+    if not rows.any():
+        raise ValueError(f"Historical data has no years in {period} ({first}-{last})")
+    if rows.sum() < last - first + 1:
+        LOGGER.warning("Period %s covers only %d of %d years", period, int(rows.sum()), last - first + 1)
+    return YearDoyArray(array.years[rows], {column: grid[rows] for column, grid in array.values.items()})
+
+
+def _bootstrap_group(task) -> dict[str, pd.DataFrame]:
+    cities, paths, columns, percentiles, n_boot, confidence, seed, period = task
+    arrays = [_period_rows(YearDoyArray.from_csv(path, columns), period) for path in paths]
+    frames = {city: {"day_of_year": np.arange(1, DAYS + 1)} for city in cities}
+    q = np.asarray(percentiles, dtype=float) / 100
+    for column in columns:
+        for i, city in enumerate(cities):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)  # days without data
+                point = np.nanquantile(arrays[i].values[column], q, axis=0).round(2)
+            for p, row in zip(percentiles, point):
+                frames[city][percentile_column(column, p)] = row
+        intervals = bootstrap_quantiles(
+            _stack_cities(arrays, column), percentiles, n_boot, confidence, seed
+        )
+        for p, (lower, upper) in intervals.items():
+            for i, city in enumerate(cities):
+                block = slice(i * DAYS, (i + 1) * DAYS)
+                frames[city][ci_column(column, p, "lo")] = lower[block].round(2)
+                frames[city][ci_column(column, p, "hi")] = upper[block].round(2)
+    return {
+        city: pd.DataFrame(frame).dropna(how="all", subset=list(frame)[1:]).reset_index(drop=True)
+        for city, frame in frames.items()
+    }
+
+
+def bootstrap_climatologies(
+    input_paths: dict[str, str | Path],
+    percentiles=(95,),
+    n_boot: int = N_BOOT,
+    confidence: float = CONFIDENCE,
+    columns=("tmin", "tmax"),
+    seed: int = 0,
+    output_dir=None,
+    max_workers: int | None = 1,
+    cities_per_task: int = 50,
+    period: str = DEFAULT_PERIOD,
+) -> dict[str, pd.DataFrame]:
+    """Thresholds with bootstrap intervals for many cities.
+
+    `input_paths` maps city names to historical CSVs. Only the years of the
+    reference `period` (e.g. ``"1991-2020"`` or ``"recent30"``) are used, so the
+    point thresholds equal `YearDoyArray.climatology(period)`. Cities are processed
+    `cities_per_task` at a time as one vectorized problem, and the groups go to a
+    process pool when `max_workers` is not 1. Writes
+    `<city>_climatology_ci.csv` to `output_dir` (default `data/processed`).
+    Bounds are reproducible for a given `seed` and grouping of cities.
+    """
+    cities = sorted(input_paths)
+    tasks = [
+        (
+            group,
+            [input_paths[city] for city in group],
+            tuple(columns), tuple(percentiles), n_boot, confidence, seed, period,
+        )
+        for group in (cities[i:i + cities_per_task] for i in range(0, len(cities), cities_per_task))
+    ]
+    with stage("climatology_bootstrap") as info:
+        if max_workers == 1 or len(tasks) <= 1:
+            parts = [_bootstrap_group(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                parts = list(pool.map(_bootstrap_group, tasks))
+        info["rows"] = len(cities) * DAYS * n_boot
+
+    output_dir = Path(output_dir or PROCESSED_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    climatologies = {}
+    for part in parts:
+        for city, climatology in part.items():
+            output_path = output_dir / f"{city.lower()}_climatology_ci.csv"
+            climatology.to_csv(output_path, index=False)
+            climatologies[city] = climatology
+    print(f"✅ Saved {n_boot}-resample {confidence:.0%} intervals for {len(climatologies)} cities to: {output_dir}")
+    return climatologies
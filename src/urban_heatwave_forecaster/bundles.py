@@ -0,0 +1,275 @@
+"""Precomputed per-city result bundles for an instant dashboard cold start.
+
+`uhf bundle` runs the full pipeline for each city and writes one versioned
+directory per run:
+
+    data/bundles/<city>/<YYYYmmddTHHMMSSZ>/
+        manifest.json        # format, city, coords, models, created_at, failures
+        detected.parquet     # primary-model forecast with heatwave flags
+        risk.parquet         # primary-model enriched risk frame
+        probabilities.parquet, risk_probs.parquet   # multi-model ensemble summary
+        comparison.parquet   # one-row summary used by the multi-city view
+
+A bundle is written to a temporary directory and renamed into place, and the
+manifest is written last. Readers therefore never see a half-written version.
+`load_latest_bundle` returns the newest complete version. The dashboard
+decides whether it is fresh enough to show.
+"""
+import json
+import logging
+import shutil
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+from . import data_fetcher, detect_heatwaves, risk_model
+from .ensemble import RISK_ORDER, enrich_risk_dataframe, summarize_ensemble_risk
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+BUNDLE_DIR = PROJECT_ROOT / "data" / "bundles"
+CLIMATOLOGY_DIR = PROJECT_ROOT / "data" / "processed"
+VULNERABILITY_PATH = PROJECT_ROOT / "data" / "raw" / "urban_vulnerability.csv"
+BUNDLE_FORMAT = 1
+PRIMARY_MODEL = "ecmwf_ifs025"
+VERSION_FORMAT = "%Y%m%dT%H%M%SZ"
+FRAMES = ("detected", "risk", "probabilities", "risk_probs", "comparison")
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class Bundle:
+    city: str
+    version: str
+    created_at: datetime
+    path: Path
+    manifest: dict
+    detected: pd.DataFrame
+    risk: pd.DataFrame
+    probabilities: pd.DataFrame
+    risk_probs: pd.DataFrame
+    comparison: pd.DataFrame
+
+    @property
+    def age(self):
+        return datetime.now(timezone.utc) - self.created_at
+
+    @property
+    def models(self) -> list[str]:
+        return self.manifest["models"]
+
+
+def comparison_summary(
+    city: str, lat: float, lon: float, detected_df: pd.DataFrame, risk_df: pd.DataFrame
+) -> dict:
+    """One row of the multi-city comparison for an enriched risk frame."""
+    max_risk_score = int(risk_df["adjusted_risk_score"].max())
+    return {
+        "city": city,
+        "lat": lat,
+        "lon": lon,
+        "heatwave_days": int(detected_df["heatwave_id"].notna().sum()),
+        "escalated_days": int(risk_df["risk_escalated"].sum()),
+        "peak_tmax": float(detected_df["tmax"].max()),
+        "peak_tmax_anomaly": float((detected_df["tmax"] - detected_df["tmax_95p"]).max()),
+        "max_risk_score": max_risk_score,
+        "max_risk_level": RISK_ORDER[max_risk_score],
+    }
+
+
+def _detect_and_assess(
+    forecast_df: pd.DataFrame, climatology_df: pd.DataFrame, vulnerability_df: pd.DataFrame
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    detected_df = detect_heatwaves.detect_heatwaves_df(
+        forecast_df[["date", "tmin", "tmax", "city"]], climatology_df
+    )
+    detected_df["is_hot"] = detected_df["exceeds_95p"]
+    risk_df = risk_model.assess_heatwave_risk(detected_df.copy(), vulnerability_df.copy())
+    return detected_df, enrich_risk_dataframe(risk_df)
+
+
+def compute_city_results(
+    city: str,
+    lat: float,
+    lon: float,
+    models: list[str] | tuple[str, ...] = data_fetcher.DEFAULT_MULTI_MODELS,
+    climatology_dir: str | Path | None = None,
+    vulnerability_path: str | Path | None = None,
+) -> dict:
+    """Fetch `models` for one city and run detection, risk and the ensemble summary.
+
+    The primary model (ECMWF) provides the detected/risk frames shown on the
+    dashboard. It is always fetched, even when it is not listed in `models`.
+    `model_risk` holds the risk rows of every fetched model (not bundled).
+    """
+    city_key = city.strip().lower()
+    climatology_df = pd.read_csv(
+        Path(climatology_dir or CLIMATOLOGY_DIR) / f"{city_key}_climatology_95p.csv"
+    )
+    vulnerability_df = pd.read_csv(vulnerability_path or VULNERABILITY_PATH)
+
+    models = list(dict.fromkeys(models))
+    forecast_df, failures = data_fetcher.fetch_multi_model_forecast(
+        lat=lat,
+        lon=lon,
+        city_name=city_key,
+        models=list(dict.fromkeys([PRIMARY_MODEL, *models])),
+        forecast_days=7,
+    )
+    if PRIMARY_MODEL not in set(forecast_df["model"]):
+        raise RuntimeError(f"Primary model {PRIMARY_MODEL} could not be fetched for {city}.")
+
+    ensemble_frames, model_frames = [], []
+    detected_df = risk_df = None
+    for model, model_forecast in forecast_df.groupby("model", sort=False):
+        model_detected, model_risk = _detect_and_assess(
+            model_forecast, climatology_df, vulnerability_df
+        )
+        if model == PRIMARY_MODEL:
+            detected_df, risk_df = model_detected, model_risk
+        model_frames.append(model_risk.assign(model=model))
+        if model in models:
+            ensemble_frames.append(model_risk.assign(model=model))
+
+    if ensemble_frames:
+        probability_df, risk_probs = summarize_ensemble_risk(
+            pd.concat(ensemble_frames, ignore_index=True)
+        )
+    else:
+        probability_df, risk_probs = pd.DataFrame(), pd.DataFrame()
+
+    return {
+        "detected": detected_df,
+        "risk": risk_df,
+        "probabilities": probability_df,
+        "risk_probs": risk_probs,
+        "comparison": pd.DataFrame([comparison_summary(city_key, lat, lon, detected_df, risk_df)]),
+        "model_risk": pd.concat(model_frames, ignore_index=True),
+        "models": [model for model in models if model in set(forecast_df["model"])],
+        "failures": failures,
+    }
+
+
+def _city_dir(city: str, bundle_dir: str | Path | None) -> Path:
+    return Path(bundle_dir or BUNDLE_DIR) / city.strip().lower()
+
+
+def write_bundle(
+    city: str,
+    lat: float,
+    lon: float,
+    results: dict,
+    bundle_dir: str | Path | None = None,
+    created_at: datetime | None = None,
+) -> Path:
+    """Atomically write the output of `compute_city_results` as a new version."""
+    created_at = (created_at or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    version = created_at.strftime(VERSION_FORMAT)
+    city_dir = _city_dir(city, bundle_dir)
+    target = city_dir / version
+    tmp = city_dir / f".{version}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    for name in FRAMES:
+        results[name].to_parquet(tmp / f"{name}.parquet", compression="zstd")
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "city": city.strip().lower(),
+        "lat": lat,
+        "lon": lon,
+        "version": version,
+        "created_at": created_at.isoformat(timespec="seconds"),
+        "models": results["models"],
+        "failures": results["failures"],
+        "files": [f"{name}.parquet" for name in FRAMES],
+    }
+    (tmp / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+    if target.exists():
+        shutil.rmtree(target)
+    tmp.rename(target)
+    LOGGER.info("Wrote bundle %s", target)
+    return target
+
+
+def build_bundle(
+    city: str,
+    lat: float,
+    lon: float,
+    models: list[str] | tuple[str, ...] = data_fetcher.DEFAULT_MULTI_MODELS,
+    bundle_dir: str | Path | None = None,
+    results: dict | None = None,
+) -> Path:
+    results = results or compute_city_results(city, lat, lon, models=models)
+    return write_bundle(city, lat, lon, results, bundle_dir=bundle_dir)
+
+
+def list_versions(city: str, bundle_dir: str | Path | None = None) -> list[Path]:
+    """Complete bundle versions for `city`, oldest first."""
+    city_dir = _city_dir(city, bundle_dir)
+    if not city_dir.exists():
+        return []
+    return sorted(
+        path for path in city_dir.iterdir()
+        if not path.name.startswith(".") and (path / "manifest.json").exists()
+    )
+
+
+def read_bundle(path: str | Path) -> Bundle:
+    path = Path(path)
+    manifest = json.loads((path / "manifest.json").read_text())
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported bundle format {manifest.get('format')} in {path}")
+    frames = {name: pd.read_parquet(path / f"{name}.parquet") for name in FRAMES}
+    return Bundle(
+        city=manifest["city"],
+        version=manifest["version"],
+        created_at=datetime.fromisoformat(manifest["created_at"]),
+        path=path,
+        manifest=manifest,
+        **frames,
+    )
+
+
+def load_latest_bundle(city: str, bundle_dir: str | Path | None = None) -> Bundle | None:
+    """Newest readable bundle for `city`, or None when there is none."""
+    for path in reversed(list_versions(city, bundle_dir)):
+        try:
+            return read_bundle(path)
+        except (OSError, ValueError) as exc:
+            LOGGER.warning("Skipping unreadable bundle %s: %s", path, exc)
+    return None
+
+
+def prune_bundles(city: str, keep: int = 5, bundle_dir: str | Path | None = None) -> list[Path]:
+    """Delete all but the newest `keep` versions; returns the removed paths."""
+    versions = list_versions(city, bundle_dir)
+    removed = versions[:-keep] if keep > 0 else versions
+    for path in removed:
+        shutil.rmtree(path)
+    return removed
+
+
+def latest_comparisons(bundle_dir: str | Path | None = None, max_age=None) -> pd.DataFrame:
+    """Comparison rows of the newest bundle of every bundled city, in one frame.
+
+    Only `comparison.parquet` and the manifest are read, so hundreds of cities
+    stay cheap. Versions older than `max_age` (a timedelta) are left out.
+    """
+    root = Path(bundle_dir or BUNDLE_DIR)
+    now = datetime.now(timezone.utc)
+    frames = []
+    for city_dir in sorted(root.iterdir()) if root.exists() else []:
+        versions = list_versions(city_dir.name, root)
+        if not versions:
+            continue
+        manifest = json.loads((versions[-1] / "manifest.json").read_text())
+        created_at = datetime.fromisoformat(manifest["created_at"])
+        if max_age is not None and now - created_at > max_age:
+            continue
+        frames.append(pd.read_parquet(versions[-1] / "comparison.parquet").assign(version=manifest["version"]))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
@@ -1,8 +1,11 @@
+import sys
 from pathlib import Path
 
-import pandas as pd
 import typer
 
+# Keep module-level imports light: `uhf --help` must not pay for pandas,
+# requests or plotly. Commands import what they need when they run.
+
 app = typer.Typer(help="Urban Heatwave Forecaster CLI")
 
 COORDS = {
@@ -13,6 +16,61 @@ COORDS = {
 }
 
 
+@app.callback()
+def main(
+    ctx: typer.Context,
+    profile: Path = typer.Option(
+        None, "--profile", help="Write a cProfile report (.prof) and print the top calls."
+    ),
+    metrics_file: Path = typer.Option(
+        None, "--metrics-file", help="Write Prometheus-format stage and fetch metrics here."
+    ),
+    json_logs: bool = typer.Option(
+        False, "--json-logs", help="Emit structured JSON logs for every stage and fetch."
+    ),
+    record: Path = typer.Option(
+        None, "--record", help="Store every raw Open-Meteo response in this recording directory."
+    ),
+    replay: Path = typer.Option(
+        None, "--replay", help="Answer every request from this recording; no network access."
+    ),
+):
+    """Urban Heatwave Forecaster CLI"""
+    from . import instrumentation
+
+    if json_logs:
+        instrumentation.configure_json_logging()
+
+    if record is not None and replay is not None:
+        typer.echo("Use either --record or --replay, not both.")
+        raise typer.Exit(1)
+    if record is not None or replay is not None:
+        from . import recorder
+
+        recorder.start(record or replay, "record" if record is not None else "replay")
+        ctx.call_on_close(recorder.stop)
+
+    if profile is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def _dump_profile():
+            import pstats
+
+            profiler.disable()
+            profile.parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(profile)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(25)
+            typer.echo(f"Saved profile: {profile}", err=True)
+
+        ctx.call_on_close(_dump_profile)
+
+    if metrics_file is not None:
+        ctx.call_on_close(lambda: instrumentation.write_prometheus(metrics_file))
+
+
 def _normalize_city(city: str) -> str:
     city_key = city.strip().lower()
     if city_key not in COORDS:
@@ -24,20 +82,191 @@ def _normalize_city(city: str) -> str:
 
 @app.command()
 def fetch(
-    city: str = typer.Option(..., "--city", "-c", help="City name, e.g. Athens.")
+    city: str = typer.Option(..., "--city", "-c", help="City name, e.g. Athens."),
+    variables: list[str] = typer.Option(
+        None, "--variable", "-v",
+        help="Extra hourly variable, e.g. relative_humidity_2m (repeatable; daily mean is kept).",
+    ),
+    indices: list[str] = typer.Option(
+        None, "--index", "-i",
+        help="Heat-stress index: apparent_temperature, heat_index, humidex or wbgt (repeatable).",
+    ),
+    mean: bool = typer.Option(False, "--mean", help="Add the daily mean temperature (tmean)."),
+    night_min: bool = typer.Option(
+        False, "--night-min",
+        help="Add the 20:00-08:00 night minimum (tmin_night) and a tropical_night flag (>= 20 °C).",
+    ),
+    hours_above: list[float] = typer.Option(
+        None, "--hours-above", help="Count hours above this temperature (repeatable)."
+    ),
+    degree_hours: float = typer.Option(
+        None, "--degree-hours", help="Add degree-hours above this base temperature."
+    ),
 ):
     """Fetch forecast for CITY."""
     from . import data_fetcher
+    from .daily_stats import DEFAULT_NIGHT_WINDOW, DailyStats
 
     city_key = _normalize_city(city)
     lat, lon = COORDS[city_key]
-    data_fetcher.fetch_ecmwf_forecast(lat, lon, city_key)
+    stats = DailyStats(
+        mean=mean,
+        night_window=DEFAULT_NIGHT_WINDOW if night_min else None,
+        hours_above=tuple(hours_above or ()),
+        degree_hours_base=degree_hours,
+    )
+    data_fetcher.fetch_ecmwf_forecast(
+        lat, lon, city_key, hourly_variables=variables, indices=indices or (), daily_stats=stats
+    )
+
+
+@app.command("fetch-many")
+def fetch_many(
+    cities: list[str] = typer.Option(
+        None, "--city", "-c", help="City to fetch (repeatable). Defaults to all cities."
+    ),
+    models: list[str] = typer.Option(
+        None, "--model", "-m", help="Forecast model (repeatable)."
+    ),
+    concurrency: int = typer.Option(16, help="Maximum number of in-flight requests."),
+):
+    """Fetch forecasts for many cities and models concurrently."""
+    from . import async_fetcher, data_fetcher
+
+    city_keys = [_normalize_city(city) for city in cities] if cities else sorted(COORDS)
+    jobs = [
+        async_fetcher.ForecastJob(city_key, *COORDS[city_key], model=model)
+        for city_key in city_keys
+        for model in (models or data_fetcher.DEFAULT_MULTI_MODELS)
+    ]
+    engine = async_fetcher.AsyncFetchEngine(max_concurrency=concurrency)
+    results = async_fetcher.fetch_many(jobs, engine=engine)
+    for result in results:
+        if result.ok:
+            typer.echo(f"Saved: {result.meta['save_path']}")
+        else:
+            typer.echo(f"Failed {result.job.key}: {result.error}")
+    if not any(result.ok for result in results):
+        raise typer.Exit(1)
+
+
+@app.command()
+def climatology(
+    city: str = typer.Option(..., "--city", "-c", help="City name, e.g. Athens."),
+    periods: list[str] = typer.Option(
+        None, "--period",
+        help="Reference period, e.g. 1961-1990 or recent30 (repeatable). Default: both normals + recent30.",
+    ),
+    percentiles: list[float] = typer.Option(
+        None, "--percentile", "-p", help="Threshold percentile (repeatable). Default: 95."
+    ),
+    stream: bool = typer.Option(
+        False, "--stream", help="Read the history in chunks instead of loading it whole."
+    ),
+    inputs: list[Path] = typer.Option(
+        None, "--input", "-i",
+        help="History file or partition (repeatable) for --stream; partitions are merged.",
+    ),
+    sketch: str = typer.Option("exact", help="With --stream: exact or histogram (±0.025 °C)."),
+    chunksize: int = typer.Option(250_000, help="Rows per chunk with --stream."),
+    hourly_column: str = typer.Option(
+        None, help="With --stream: inputs are hourly `time` rows of this column, e.g. temperature_2m."
+    ),
+):
+    """Build percentile thresholds for several reference periods from one historical load."""
+    from . import climate_normals
+
+    city_key = _normalize_city(city)
+    periods = periods or climate_normals.STANDARD_PERIODS
+    try:
+        climate_normals.resolve_periods(periods)
+    except ValueError as exc:
+        typer.echo(str(exc))
+        raise typer.Exit(1)
+    paths = inputs or [Path(f"data/raw/{city_key}_historical.csv")]
+    missing = [path for path in paths if not path.exists()]
+    if missing:
+        typer.echo(f"Missing {', '.join(map(str, missing))}. Fetch history covering the periods first.")
+        raise typer.Exit(1)
+    if not stream and len(paths) > 1:
+        typer.echo("Several --input files need --stream.")
+        raise typer.Exit(1)
+    try:
+        if stream:
+            from . import streaming_climatology
+
+            climatologies = streaming_climatology.build_streaming_climatology(
+                city_key,
+                paths,
+                periods=periods,
+                percentiles=percentiles or (95,),
+                sketch=sketch,
+                chunksize=chunksize,
+                hourly_column=hourly_column,
+            )
+        else:
+            climatologies = climate_normals.build_period_climatologies(
+                city_key,
+                periods=periods,
+                percentiles=percentiles or (95,),
+                input_path=paths[0],
+            )
+    except ValueError as exc:
+        typer.echo(f"{exc}. Fetch history covering the periods first.")
+        raise typer.Exit(1)
+    typer.echo(f"Periods: {', '.join(climatologies)}")
+
+
+@app.command("bootstrap-thresholds")
+def bootstrap_thresholds(
+    cities: list[str] = typer.Option(
+        None, "--city", "-c", help="City (repeatable). Defaults to every city with a history file."
+    ),
+    resamples: int = typer.Option(1000, help="Bootstrap resamples per threshold."),
+    confidence: float = typer.Option(0.9, help="Interval coverage, e.g. 0.9 for 5th–95th."),
+    workers: int = typer.Option(1, help="Worker processes; each takes a group of cities."),
+    seed: int = typer.Option(0, help="Random seed."),
+    period: str = typer.Option("1991-2020", help="Reference period, e.g. 1991-2020 or recent30."),
+):
+    """Add bootstrap confidence intervals to the 95th-percentile thresholds."""
+    from . import bootstrap
+
+    city_keys = [_normalize_city(city) for city in cities] if cities else sorted(COORDS)
+    paths = {city_key: Path(f"data/raw/{city_key}_historical.csv") for city_key in city_keys}
+    missing = [str(path) for path in paths.values() if not path.exists()]
+    if cities and missing:
+        typer.echo(f"Missing {', '.join(missing)}. Fetch the history first.")
+        raise typer.Exit(1)
+    paths = {city_key: path for city_key, path in paths.items() if path.exists()}
+    if not paths:
+        typer.echo("No historical data found. Fetch the history first.")
+        raise typer.Exit(1)
+    try:
+        bootstrap.bootstrap_climatologies(
+            paths, n_boot=resamples, confidence=confidence, seed=seed, max_workers=workers,
+            period=period,
+        )
+    except ValueError as exc:
+        typer.echo(f"{exc}. Fetch history covering the period first.")
+        raise typer.Exit(1)
 
 
 @app.command()
 def detect(
     city: str = typer.Option(..., "--city", "-c", help="City name, e.g. Athens."),
     min_run: int = 3,
+    period: str = typer.Option(
+        None, help="Reference period label from `uhf climatology`, e.g. 1961-1990."
+    ),
+    stitch: bool = typer.Option(
+        False, "--stitch",
+        help="Prepend recent observed days (rolling local store) so ongoing events keep their length.",
+    ),
+    keep_days: int = typer.Option(30, help="Observed days kept in the rolling store with --stitch."),
+    uncertainty: bool = typer.Option(
+        False, "--uncertainty",
+        help="Use the thresholds from `uhf bootstrap-thresholds` and flag uncertain exceedances.",
+    ),
 ):
     """Detect heatwaves in CITY."""
     from . import detect_heatwaves
@@ -45,23 +274,156 @@ def detect(
     city_key = _normalize_city(city)
     forecast_path = Path(f"data/raw/{city_key}_forecast.csv")
     climatology_path = Path(f"data/processed/{city_key}_climatology_95p.csv")
+    if uncertainty:
+        if period:
+            typer.echo("--uncertainty uses the period given to `uhf bootstrap-thresholds`; drop --period.")
+            raise typer.Exit(1)
+        climatology_path = Path(f"data/processed/{city_key}_climatology_ci.csv")
+        if not climatology_path.exists():
+            typer.echo(f"Missing {climatology_path}. Run `uhf bootstrap-thresholds -c {city}` first.")
+            raise typer.Exit(1)
+    if period:
+        from . import climate_normals
 
-    df = detect_heatwaves.detect_heatwaves(
-        forecast_path=forecast_path,
-        climatology_path=climatology_path,
-        min_run=min_run,
-    )
+        try:
+            label = climate_normals.period_label(period)
+        except ValueError as exc:
+            typer.echo(str(exc))
+            raise typer.Exit(1)
+        climatology_path = climate_normals.period_climatology_path(city_key, label)
+        if not climatology_path.exists():
+            typer.echo(f"Missing {climatology_path}. Run `uhf climatology -c {city} --period {period}` first.")
+            raise typer.Exit(1)
+
+    if stitch:
+        import pandas as pd
+
+        from . import observed_store
+
+        observed = observed_store.update_store(city_key, *COORDS[city_key], keep_days=keep_days)
+        df = detect_heatwaves.detect_heatwaves_stitched(
+            pd.read_csv(forecast_path), observed, pd.read_csv(climatology_path), min_run=min_run
+        )
+        # past days stay out of the file that assess, bundles and alerts read
+        df = df[df["source"] == "forecast"].reset_index(drop=True)
+    else:
+        df = detect_heatwaves.detect_heatwaves(
+            forecast_path=forecast_path,
+            climatology_path=climatology_path,
+            min_run=min_run,
+        )
 
     output_path = Path(f"data/processed/{city_key}_forecast_with_heatwaves.csv")
     df.to_csv(output_path, index=False)
     typer.echo(f"Saved: {output_path}")
+    if uncertainty:
+        typer.echo(f"Uncertain exceedance days: {int(df['uncertain_exceedance'].sum())}")
+
+
+@app.command()
+def sensitivity(
+    city: str = typer.Option(..., "--city", "-c", help="City name, e.g. Athens."),
+    percentiles: list[float] = typer.Option(
+        None, "--percentile", "-p", help="Threshold percentile (repeatable). Default: 90, 95, 99."
+    ),
+    min_runs: list[int] = typer.Option(
+        None, "--min-run", help="Minimum run length in days (repeatable). Default: 2, 3, 5."
+    ),
+    rules: list[str] = typer.Option(
+        None, "--rule", help="Exceedance rule: both, either, tmax or tmin (repeatable)."
+    ),
+    variable: str = typer.Option(
+        "temperature", help="Threshold variable: temperature or a heat-stress index."
+    ),
+    periods: list[str] = typer.Option(
+        None, "--period",
+        help="Compare reference periods, e.g. 1961-1990, 1991-2020, recent30 (repeatable).",
+    ),
+):
+    """Sweep heatwave detection over percentiles, run lengths and rules in one pass."""
+    import pandas as pd
+
+    from . import climate_normals, detect_heatwaves, heat_indices
+
+    city_key = _normalize_city(city)
+    percentiles = percentiles or [90, 95, 99]
+    forecast_path = Path(f"data/raw/{city_key}_forecast.csv")
+    climatology_path = Path(f"data/processed/{city_key}_climatology_multi.csv")
+    historical_path = Path(f"data/raw/{city_key}_historical.csv")
+    if not forecast_path.exists():
+        typer.echo(f"Missing forecast: {forecast_path}. Run `uhf fetch --city {city}` first.")
+        raise typer.Exit(1)
+    daily = list(heat_indices.daily_columns(variable))
+    if not set(daily) <= set(pd.read_csv(forecast_path, nrows=0).columns):
+        typer.echo(
+            f"{forecast_path} has no {', '.join(daily)} columns. "
+            f"Run `uhf fetch --city {city} --index {variable}` first."
+        )
+        raise typer.Exit(1)
+    if historical_path.exists() and not set(daily) <= set(pd.read_csv(historical_path, nrows=0).columns):
+        typer.echo(
+            f"{historical_path} has no {', '.join(daily)} columns. Re-fetch the history with the index: "
+            f"fetch_historical.fetch_historical_data(lat, lon, {city_key!r}, indices=[{variable!r}])."
+        )
+        raise typer.Exit(1)
+
+    options = {
+        "percentiles": percentiles,
+        "min_runs": min_runs or (2, 3, 5),
+        "rules": rules or ("both", "tmax"),
+        "variable": variable,
+    }
+    if periods:
+        # every period is a slice of one loaded history, so this is one read
+        if not historical_path.exists():
+            typer.echo(f"Missing {historical_path} to build period thresholds.")
+            raise typer.Exit(1)
+        try:
+            climatologies = climate_normals.build_period_climatologies(
+                city_key, periods=periods, percentiles=percentiles,
+                input_path=historical_path, variables=("temperature", variable),
+            )
+        except ValueError as exc:
+            typer.echo(f"{exc}. Fetch history covering the periods first.")
+            raise typer.Exit(1)
+        cube = detect_heatwaves.detect_heatwaves_by_period(
+            pd.read_csv(forecast_path), climatologies, **options
+        )
+    else:
+        needed = {
+            climate_normals.percentile_column(column, p)
+            for column in heat_indices.daily_columns(variable)
+            for p in percentiles
+        }
+        climatology_df = pd.read_csv(climatology_path) if climatology_path.exists() else None
+        if climatology_df is None or not needed <= set(climatology_df.columns):
+            if not historical_path.exists():
+                typer.echo(f"Missing {historical_path} to build percentile thresholds.")
+                raise typer.Exit(1)
+            climatology_df = climate_normals.build_multi_percentile_climatology(
+                city_key, percentiles=percentiles, input_path=historical_path,
+                output_path=climatology_path, variables=("temperature", variable),
+            )
+        cube = detect_heatwaves.detect_heatwaves_sensitivity(
+            pd.read_csv(forecast_path), climatology_df, **options
+        )
+    output_path = Path(f"data/processed/{city_key}_heatwave_sensitivity.csv")
+    cube.to_csv(output_path, index=False)
+    typer.echo(detect_heatwaves.sensitivity_summary(cube).to_string(index=False))
+    typer.echo(f"Saved: {output_path}")
 
 
 @app.command()
 def assess(
-    city: str = typer.Option(..., "--city", "-c", help="City name, e.g. Athens.")
+    city: str = typer.Option(..., "--city", "-c", help="City name, e.g. Athens."),
+    districts_path: Path = typer.Option(
+        None, "--districts",
+        help="District vulnerability CSV; also writes per-district risk and a city roll-up.",
+    ),
 ):
     """Assess risk based on detected heatwaves."""
+    import pandas as pd
+
     from . import risk_model
 
     city_key = _normalize_city(city)
@@ -89,6 +451,329 @@ def assess(
     df_risk.to_csv(output_path, index=False)
     typer.echo(f"Saved: {output_path}")
 
+    if districts_path is not None:
+        from . import districts
+
+        index = districts.DistrictIndex.from_csv(districts_path)
+        district_risk = districts.assess_district_risk(df_forecast, index)
+        if not len(district_risk.index):
+            typer.echo(f"No districts of {city_key} in {districts_path}.")
+            raise typer.Exit(1)
+        district_output = Path(f"data/processed/{city_key}_district_risk.parquet")
+        summary_output = Path(f"data/processed/{city_key}_district_summary.csv")
+        district_risk.to_frame().to_parquet(district_output, index=False, compression="zstd")
+        district_risk.city_summary().to_csv(summary_output, index=False)
+        typer.echo(f"Saved: {district_output}")
+        typer.echo(f"Saved: {summary_output}")
+
+
+@app.command()
+def rollup(
+    districts_path: Path = typer.Option(
+        None, "--districts", help="District vulnerability CSV; districts become the leaves."
+    ),
+    output: Path = typer.Option(None, help="Output CSV. Default: data/rollups/rollups.csv."),
+    rebuild: bool = typer.Option(False, "--rebuild", help="Ignore the saved state and start over."),
+):
+    """Population-weighted risk per total, country, region, city and district."""
+    import pandas as pd
+
+    from . import rollups
+    from .pipeline import file_hash
+
+    vuln_path = Path("data/raw/urban_vulnerability.csv")
+    try:
+        hierarchy = rollups.Hierarchy.from_csv(vuln_path, districts_path)
+    except ValueError as exc:
+        typer.echo(str(exc))
+        raise typer.Exit(1)
+    state = rollups.Rollup.empty(hierarchy) if rebuild else rollups.Rollup.load(hierarchy)
+
+    risk_paths = {
+        city: Path(f"data/processed/{city}_heatwave_risk.csv") for city in hierarchy.cities
+    }
+    hashes = {city: file_hash(path) for city, path in risk_paths.items() if path.exists()}
+    if not hashes:
+        typer.echo("No risk files found. Run `uhf assess` or `uhf pipeline` first.")
+        raise typer.Exit(1)
+    changed = [city for city, digest in hashes.items() if state.sources.get(city) != digest]
+    if changed:
+        frames = [pd.read_csv(risk_paths[city]) for city in changed]
+        columns = ["city", "date", "tmax", "heatwave_id"]
+        state.update(
+            pd.concat([frame[[c for c in columns if c in frame]] for frame in frames], ignore_index=True),
+            sources={city: hashes[city] for city in changed},
+        )
+        state.save()
+
+    output_path = Path(output or rollups.OUTPUT_PATH)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    table = state.to_frame()
+    table.to_csv(output_path, index=False)
+    total = table[table["level"] == "total"]
+    if not total.empty:
+        peak = total.loc[total["extreme_share"].idxmax()]
+        people = f"{peak['population_extreme']:,.0f} people, " if hierarchy.head_count else ""
+        typer.echo(
+            f"Peak under Extreme risk: {people}{peak['extreme_share']:.1%} on {peak['date']:%Y-%m-%d}"
+        )
+    typer.echo(f"✅ Updated {len(changed)} of {len(hashes)} cities. Saved: {output_path}")
+
+
+@app.command()
+def pipeline(
+    stages: list[str] = typer.Option(
+        None, "--stages", "-s",
+        help="Comma-separated stages: history, fetch, climatology, detect, assess. "
+             "Default: fetch,climatology,detect,assess.",
+    ),
+    cities: list[str] = typer.Option(
+        None, "--cities", "--city", "-c",
+        help="Comma-separated or repeated cities. Defaults to all cities.",
+    ),
+    min_run: int = 3,
+    period: str = typer.Option(
+        None, help="Reference period for climatology and detect, e.g. 1961-1990."
+    ),
+    force: bool = typer.Option(False, "--force", help="Rebuild even up-to-date outputs."),
+):
+    """Run the stages as a dependency graph, rebuilding only stale outputs."""
+    from . import pipeline as stage_graph
+
+    names = [name for item in (cities or []) for name in item.split(",") if name.strip()]
+    city_keys = [_normalize_city(name) for name in names] if names else sorted(COORDS)
+    try:
+        selected = stage_graph.parse_stages(stages or stage_graph.DEFAULT_STAGES)
+    except ValueError as exc:
+        typer.echo(str(exc))
+        raise typer.Exit(1)
+
+    try:
+        options = stage_graph.Options(min_run=min_run, period=period, force=force)
+    except ValueError as exc:
+        typer.echo(str(exc))
+        raise typer.Exit(1)
+
+    outcomes = stage_graph.Pipeline(COORDS, options).run(selected, city_keys)
+    for outcome in outcomes:
+        detail = f" ({outcome.reason})" if outcome.reason else ""
+        typer.echo(f"{outcome.city:<10} {outcome.stage:<12} {outcome.status}{detail}")
+    counts = {status: sum(o.status == status for o in outcomes) for status in ("built", "up-to-date", "kept", "failed")}
+    summary = ", ".join(f"{n} {status}" for status, n in counts.items() if n)
+    failed = [f"{o.city}/{o.stage}" for o in outcomes if o.status == "failed"]
+    if failed:
+        typer.echo(f"{summary}. Failed stages: {', '.join(failed)}")
+        raise typer.Exit(1)
+    typer.echo(f"✅ {summary}")
+
+
+@app.command()
+def verify(
+    cities: list[str] = typer.Option(
+        None, "--city", "-c", help="City to verify (repeatable). Defaults to all cities."
+    ),
+    min_run: int = 3,
+    workers: int = typer.Option(None, help="Process-pool size (default: CPU count)."),
+    fetch_observed: bool = typer.Option(
+        False, "--fetch-observed",
+        help="First fetch observed days covering each city's archived runs (data/raw/<city>_observed.csv).",
+    ),
+):
+    """Score archived forecasts against observed heatwave days."""
+    from . import verification
+
+    city_keys = [_normalize_city(city) for city in cities] if cities else sorted(COORDS)
+    if fetch_observed:
+        for city_key in city_keys:
+            try:
+                verification.fetch_observed(city_key, *COORDS[city_key])
+            except ValueError as exc:
+                typer.echo(str(exc))
+    missing = [
+        city_key for city_key in city_keys
+        if not verification.observed_path(city_key).exists()
+    ]
+    if missing:
+        typer.echo(f"Missing observed data for: {', '.join(missing)}. Run `uhf verify --fetch-observed`.")
+        raise typer.Exit(1)
+
+    scores = verification.run_backtest(city_keys, min_run=min_run, max_workers=workers)
+    output_path = Path("data/processed/verification_skill.csv")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    scores.to_csv(output_path, index=False)
+    typer.echo(scores.to_string(index=False))
+    typer.echo(f"Saved: {output_path}")
+
+
+@app.command()
+def bundle(
+    cities: list[str] = typer.Option(
+        None, "--city", "-c", help="City to bundle (repeatable). Defaults to all cities."
+    ),
+    models: list[str] = typer.Option(
+        None, "--model", "-m", help="Ensemble model (repeatable)."
+    ),
+    keep: int = typer.Option(5, help="Versions to keep per city; older ones are deleted."),
+    with_alerts: bool = typer.Option(
+        False, "--alerts", help="Also diff the run against the alert state (see `uhf alerts`)."
+    ),
+):
+    """Precompute versioned per-city result bundles for the dashboard."""
+    import pandas as pd
+
+    from . import bundles, data_fetcher
+
+    city_keys = [_normalize_city(city) for city in cities] if cities else sorted(COORDS)
+    failed, model_risk = [], []
+    for city_key in city_keys:
+        try:
+            results = bundles.compute_city_results(
+                city_key, *COORDS[city_key], models=models or data_fetcher.DEFAULT_MULTI_MODELS
+            )
+            path = bundles.build_bundle(city_key, *COORDS[city_key], results=results)
+        except Exception as exc:
+            failed.append(city_key)
+            typer.echo(f"Failed {city_key}: {exc}")
+            continue
+        bundles.prune_bundles(city_key, keep=keep)
+        model_risk.append(results["model_risk"])
+        typer.echo(f"Saved: {path}")
+    if with_alerts and model_risk:
+        _emit_alerts(pd.concat(model_risk, ignore_index=True), None, None)
+    if failed:
+        raise typer.Exit(1)
+
+
+def _emit_alerts(risk_df, jsonl: Path | None, webhook: str | None) -> None:
+    from . import alerts
+
+    changes = alerts.update_alerts(risk_df, jsonl_path=jsonl, webhook=webhook)
+    for change in changes:
+        when = change.get("date") or f"{change['start']}..{change['end']}"
+        detail = f"{change['from']} -> {change['to']}" if "from" in change else change["peak_risk"]
+        typer.echo(f"{change['type']:<18} {change['city']:<10} {change['model']:<14} {when}  {detail}")
+    typer.echo(f"✅ {len(changes)} alert change(s)")
+
+
+@app.command()
+def alerts(
+    cities: list[str] = typer.Option(
+        None, "--city", "-c", help="City to check (repeatable). Defaults to all cities."
+    ),
+    models: list[str] = typer.Option(
+        None, "--model", "-m", help="Forecast model (repeatable)."
+    ),
+    jsonl: Path = typer.Option(
+        None, help="Append changes to this JSONL file (default data/alerts/changes.jsonl)."
+    ),
+    webhook: str = typer.Option(
+        None, help="POST changes as a JSON array to this URL, e.g. http://127.0.0.1:9000/alerts."
+    ),
+):
+    """Fetch a new run and emit only what changed since the previous one."""
+    import pandas as pd
+
+    from . import bundles, data_fetcher
+
+    city_keys = [_normalize_city(city) for city in cities] if cities else sorted(COORDS)
+    frames = [
+        bundles.compute_city_results(
+            city_key, *COORDS[city_key], models=models or data_fetcher.DEFAULT_MULTI_MODELS
+        )["model_risk"]
+        for city_key in city_keys
+    ]
+    _emit_alerts(pd.concat(frames, ignore_index=True), jsonl, webhook)
+
+
+@app.command()
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    cities: list[str] = typer.Option(
+        None, "--city", "-c", help="City to serve (repeatable). Defaults to every bundled city."
+    ),
+    refresh: float = typer.Option(60.0, help="Seconds between checks for newer bundles."),
+):
+    """Serve risk, probabilities and events from precomputed bundles over HTTP."""
+    from . import risk_api
+
+    city_keys = [_normalize_city(city) for city in cities] if cities else None
+    risk_api.serve(host=host, port=port, cities=city_keys, refresh_interval=refresh)
+
+
+@app.command()
+def query(
+    sql: str = typer.Argument(None, help="SQL over the output views, e.g. 'SELECT * FROM events'."),
+    output_format: str = typer.Option("table", "--format", "-f", help="table, csv or json."),
+    list_views: bool = typer.Option(False, "--views", help="List the views that have data."),
+):
+    """Query processed outputs, bundles and the forecast archive with SQL (DuckDB)."""
+    from . import query as sql_query
+
+    try:
+        con = sql_query.connect()
+    except RuntimeError as exc:
+        typer.echo(str(exc))
+        raise typer.Exit(1)
+    try:
+        if list_views or not sql:
+            for name in sql_query.available_views(con):
+                typer.echo(f"{name:<15} {sql_query.VIEWS[name]}")
+            return
+        try:
+            result = con.execute(sql).df()
+        except Exception as exc:
+            typer.echo(f"Query failed: {exc}")
+            raise typer.Exit(1)
+    finally:
+        con.close()
+
+    if output_format == "csv":
+        typer.echo(result.to_csv(index=False), nl=False)
+    elif output_format == "json":
+        typer.echo(result.to_json(orient="records", date_format="iso"))
+    else:
+        typer.echo(result.to_string(index=False))
+
+
+@app.command("compact-archive")
+def compact_archive():
+    """Merge each closed month of the forecast archive into one file per partition."""
+    from . import forecast_archive
+
+    partitions = forecast_archive.compact()
+    typer.echo(f"Compacted {len(partitions)} partitions")
+
+
+@app.command("stub-server")
+def stub_server(
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    latency: float = typer.Option(0.0, help="Mean added latency per request (seconds)."),
+    error_rate: float = typer.Option(0.0, help="Fraction of requests answered with 500."),
+    rate_limit: int = typer.Option(None, help="Requests per minute before answering 429."),
+    verbose: bool = False,
+):
+    """Serve synthetic Open-Meteo forecast, archive and ensemble endpoints."""
+    from .stub_server import StubServer
+
+    server = StubServer(
+        host=host,
+        port=port,
+        latency=latency,
+        error_rate=error_rate,
+        rate_limit_per_minute=rate_limit,
+        verbose=verbose,
+    )
+    typer.echo(f"Serving Open-Meteo stub on {server.base_url}")
+    typer.echo(f"Use it with: UHF_OPEN_METEO_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
 
 if __name__ == "__main__":
     app()
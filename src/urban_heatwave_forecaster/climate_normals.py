@@ -1,6 +1,22 @@
-import pandas as pd
+import logging
+import re
+import warnings
+from dataclasses import dataclass
+from datetime import date
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+
+from .heat_indices import daily_columns
+from .instrumentation import stage
+
+DEFAULT_PERIOD = "1991-2020"
+# WMO standard normals plus a rolling baseline; any "YYYY-YYYY" or "recent<N>" works
+STANDARD_PERIODS = ("1961-1990", "1991-2020", "recent30")
+PROCESSED_DIR = Path("data/processed")
+LOGGER = logging.getLogger(__name__)
+
 def build_percentile_climatology(city_name, input_path=None, output_path=None):
     city_name = city_name.lower()
 
@@ -11,18 +27,20 @@ def build_percentile_climatology(city_name, input_path=None, output_path=None):
         output_path = Path(f"data/processed/{city_name}_climatology_95p.csv")
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Load historical data
-    df = pd.read_csv(input_path, parse_dates=["date"])
-    df["day_of_year"] = df["date"].dt.dayofyear
+    with stage("climatology", city=city_name) as info:
+        # Load historical data
+        df = pd.read_csv(input_path, parse_dates=["date"])
+        df["day_of_year"] = df["date"].dt.dayofyear
+        info["rows"] = len(df)
 
-    # Drop leap day to keep it simple (optional)
-    df = df[df["day_of_year"] != 366]
+        # Drop leap day to keep it simple (optional)
+        df = df[df["day_of_year"] != 366]
 
-    # Group by day of year and compute 95th percentiles
-    climatology = df.groupby("day_of_year").agg({
-        "tmin": lambda x: round(x.quantile(0.95), 2),
-        "tmax": lambda x: round(x.quantile(0.95), 2)
-    }).reset_index()
+        # Group by day of year and compute 95th percentiles
+        climatology = df.groupby("day_of_year").agg({
+            "tmin": lambda x: round(x.quantile(0.95), 2),
+            "tmax": lambda x: round(x.quantile(0.95), 2)
+        }).reset_index()
 
     climatology.rename(columns={
         "tmin": "tmin_95p",
@@ -34,6 +52,191 @@ def build_percentile_climatology(city_name, input_path=None, output_path=None):
 
     return climatology
 
+def percentile_column(variable: str, percentile: float) -> str:
+    """Column name for a percentile threshold, e.g. ``tmax_95p`` or ``tmax_97.5p``."""
+    return f"{variable}_{percentile:g}p"
+
+
+def build_multi_percentile_climatology(
+    city_name, percentiles=(90, 95, 99), input_path=None, output_path=None,
+    variables=("temperature",),
+):
+    """Per-day-of-year thresholds for several percentiles in one grouped pass.
+
+    Columns are `day_of_year` plus `tmin_<p>p` / `tmax_<p>p` for every
+    percentile, so the 95th-percentile columns match `build_percentile_climatology`.
+    Heat-stress indices in `variables` (e.g. ``"heat_index"``) add
+    `heat_index_min_<p>p` / `heat_index_max_<p>p`; the historical file must then
+    carry their daily extremes (`fetch_historical_data(..., indices=...)`).
+    """
+    columns = list(dict.fromkeys(col for variable in variables for col in daily_columns(variable)))
+    city_name = city_name.lower()
+    if input_path is None:
+        input_path = Path(f"data/raw/{city_name}_historical.csv")
+    if output_path is None:
+        output_path = Path(f"data/processed/{city_name}_climatology_multi.csv")
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with stage("climatology", city=city_name) as info:
+        df = pd.read_csv(input_path, parse_dates=["date"])
+        df["day_of_year"] = df["date"].dt.dayofyear
+        info["rows"] = len(df)
+        df = df[df["day_of_year"] != 366]
+
+        quantiles = (
+            df.groupby("day_of_year")[columns]
+            .quantile([p / 100 for p in percentiles])
+            .round(2)
+            .unstack()
+        )
+        quantiles.columns = [
+            percentile_column(variable, q * 100) for variable, q in quantiles.columns
+        ]
+        climatology = quantiles.reset_index()
+
+    climatology.to_csv(output_path, index=False)
+    print(f"✅ Saved {', '.join(f'{p:g}' for p in percentiles)} percentile climatology to: {output_path}")
+
+    return climatology
+
+@dataclass
+class YearDoyArray:
+    """Historical daily columns as (year × day-of-year) arrays.
+
+    Loaded once, any reference period is a row slice, so several baselines
+    cost one read and one quantile pass each. Day 366 is dropped, as in
+    `build_percentile_climatology`; gaps are NaN.
+    """
+    years: np.ndarray
+    values: dict[str, np.ndarray]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns) -> "YearDoyArray":
+        dates = pd.to_datetime(df["date"])
+        doy = dates.dt.dayofyear.to_numpy()
+        keep = doy != 366
+        year = dates.dt.year.to_numpy()[keep]
+        doy = doy[keep]
+        years = np.unique(year)
+        rows = np.searchsorted(years, year)
+        values = {}
+        for column in columns:
+            grid = np.full((len(years), 365), np.nan)
+            grid[rows, doy - 1] = df[column].to_numpy(dtype=float)[keep]
+            values[column] = grid
+        return cls(years=years, values=values)
+
+    @classmethod
+    def from_csv(cls, input_path, columns=("tmin", "tmax")) -> "YearDoyArray":
+        df = pd.read_csv(input_path, usecols=["date", *columns])
+        return cls.from_frame(df, columns)
+
+    def climatology(self, period: str, percentiles=(95,)) -> tuple[str, pd.DataFrame]:
+        """Percentile thresholds for `period`, labelled by the years actually used."""
+        first, last = calendar_period(period)
+        rows = (self.years >= first) & (self.years <= last)
+        if not rows.any():
+            raise ValueError(f"Historical data has no years in {period} ({first}-{last})")
+        covered = int(rows.sum())
+        if covered < last - first + 1:
+            LOGGER.warning("Period %s covers only %d of %d years", period, covered, last - first + 1)
+
+        out = {"day_of_year": np.arange(1, 366)}
+        q = np.asarray(percentiles, dtype=float) / 100
+        for column, grid in self.values.items():
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN days stay NaN
+                thresholds = np.nanquantile(grid[rows], q, axis=0).round(2)
+            for p, row in zip(percentiles, thresholds):
+                out[percentile_column(column, p)] = row
+        climatology = pd.DataFrame(out).dropna(how="all", subset=list(out)[1:])
+        return f"{first}-{last}", climatology.reset_index(drop=True)
+
+
+def parse_period(period: str) -> tuple[int, int]:
+    match = re.fullmatch(r"(\d{4})-(\d{4})", period)
+    if not match or int(match.group(1)) > int(match.group(2)):
+        raise ValueError(f"Reference period must look like 1991-2020 or recent30, got {period!r}")
+    return int(match.group(1)), int(match.group(2))
+
+
+def calendar_period(period: str) -> tuple[int, int]:
+    """`(first_year, last_year)` of `period`; ``recent<N>`` ends last year.
+
+    Every builder, reader and fetcher resolves periods here, so one period has
+    one label whatever history is at hand; data not covering it is reported
+    where the thresholds are computed.
+    """
+    match = re.fullmatch(r"recent(\d+)", period)
+    if match:
+        last = date.today().year - 1
+        return last - int(match.group(1)) + 1, last
+    return parse_period(period)
+
+
+def period_label(period: str) -> str:
+    """The ``"first-last"`` label `uhf climatology` writes for `period`."""
+    first, last = calendar_period(period)
+    return f"{first}-{last}"
+
+
+def resolve_periods(periods) -> dict[str, tuple[int, int]]:
+    """`{label: (first_year, last_year)}`, rejecting periods that resolve to the same years."""
+    spans = {}
+    for period in periods:
+        label = period_label(period)
+        if label in spans:
+            raise ValueError(f"Periods {spans[label][0]} and {period} both resolve to {label}")
+        spans[label] = (period, calendar_period(period))
+    return {label: span for label, (_, span) in spans.items()}
+
+
+def period_span(periods) -> tuple[str, str]:
+    """Archive `start_date` / `end_date` covering every period, for one fetch."""
+    spans = [calendar_period(period) for period in periods]
+    return f"{min(s[0] for s in spans)}-01-01", f"{max(s[1] for s in spans)}-12-31"
+
+
+def period_climatology_path(city_name: str, label: str) -> Path:
+    return PROCESSED_DIR / f"{city_name.lower()}_climatology_{label}.csv"
+
+
+def build_period_climatologies(
+    city_name, periods=STANDARD_PERIODS, percentiles=(95,), input_path=None,
+    output_dir=None, variables=("temperature",),
+) -> dict[str, pd.DataFrame]:
+    """Thresholds for several reference periods from one loaded historical array.
+
+    Returns `{label: climatology}` where the label is the resolved year range
+    (``recent30`` becomes e.g. ``1996-2025`` during 2026), and saves each one to
+    `data/processed/<city>_climatology_<label>.csv`, so thresholds are
+    versioned by period. Columns match `build_multi_percentile_climatology`.
+    """
+    columns = list(dict.fromkeys(col for variable in variables for col in daily_columns(variable)))
+    city_name = city_name.lower()
+    if input_path is None:
+        input_path = Path(f"data/raw/{city_name}_historical.csv")
+    output_dir = Path(output_dir or PROCESSED_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    resolve_periods(periods)
+    climatologies = {}
+    with stage("climatology", city=city_name) as info:
+        cube = YearDoyArray.from_csv(input_path, columns)
+        info["rows"] = int(cube.years.size * 365)
+        for period in periods:
+            label, climatology = cube.climatology(period, percentiles)
+            climatologies[label] = climatology
+
+    for label, climatology in climatologies.items():
+        output_path = output_dir / f"{city_name}_climatology_{label}.csv"
+        climatology.to_csv(output_path, index=False)
+        print(f"✅ Saved {label} climatology to: {output_path}")
+
+    return climatologies
+
+
 if __name__ == "__main__":
     for city in ["Athens", "Rome", "Stockholm", "London"]:
         build_percentile_climatology(city)
@@ -0,0 +1,137 @@
+"""One-pass reduction of hourly series to daily statistics.
+
+`DayGroups` finds the day boundaries of a sorted hourly time axis once. Every
+statistic is then a single vectorized `np.ufunc.reduceat` over those
+boundaries, so adding a statistic costs one array operation, not another
+groupby. Thresholds are broadcast, so any number of "hours above" counts come
+from one comparison.
+
+`DailyStats` configures what `daily_statistics` (and therefore
+`data_fetcher.fetch_forecast_for_model(..., daily_stats=...)`) produces
+beyond `tmin` / `tmax`:
+
+* ``tmean`` – daily mean temperature
+* ``tmin_night`` – minimum over a local-time night window (default 20:00–08:00).
+  The night is attributed to the evening's date and is NaN when the window is
+  incomplete, e.g. the last forecast day.
+* ``tropical_night`` – ``tmin_night`` ≥ the tropical-night threshold (20 °C);
+  missing where ``tmin_night`` is
+* ``hours_above_<t>`` – hours with temperature above each threshold
+* ``degree_hours_above_<b>`` – Σ max(T − b, 0) over the day's hours
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class DailyStats:
+    mean: bool = False
+    night_window: tuple[int, int] | None = None
+    tropical_night: float | None = 20.0
+    hours_above: tuple[float, ...] = ()
+    degree_hours_base: float | None = None
+
+    def __post_init__(self):
+        if self.night_window is not None and not self.night_window[0] > self.night_window[1]:
+            raise ValueError(f"Night window {self.night_window} must span midnight, e.g. (20, 8)")
+
+
+DEFAULT_NIGHT_WINDOW = (20, 8)
+
+
+class DayGroups:
+    """Day boundaries of an ascending hourly time axis, computed once."""
+
+    def __init__(self, timestamps):
+        timestamps = pd.DatetimeIndex(timestamps)
+        self.order = None
+        if not timestamps.is_monotonic_increasing:
+            self.order = np.argsort(timestamps.asi8, kind="stable")
+            timestamps = timestamps[self.order]
+        days = timestamps.normalize()
+        self.hours = timestamps.hour.to_numpy()
+        self.day_numbers = (days.asi8 // 86_400_000_000_000).astype(np.int64)
+        self.starts = np.flatnonzero(np.r_[True, self.day_numbers[1:] != self.day_numbers[:-1]])
+        self.dates = days[self.starts].date
+
+    def values(self, values) -> np.ndarray:
+        arr = np.asarray(values, dtype=float)
+        return arr if self.order is None else arr[self.order]
+
+    def min(self, values) -> np.ndarray:
+        return np.fmin.reduceat(self.values(values), self.starts)
+
+    def max(self, values) -> np.ndarray:
+        return np.fmax.reduceat(self.values(values), self.starts)
+
+    def mean(self, values) -> np.ndarray:
+        arr = self.values(values)
+        valid = ~np.isnan(arr)
+        totals = np.add.reduceat(np.where(valid, arr, 0.0), self.starts)
+        counts = np.add.reduceat(valid.astype(int), self.starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return totals / counts
+
+    def hours_above(self, values, thresholds) -> np.ndarray:
+        """(days, thresholds) counts of hours strictly above each threshold."""
+        arr = self.values(values)
+        above = arr[:, None] > np.asarray(thresholds, dtype=float)[None, :]
+        return np.add.reduceat(above.astype(int), self.starts, axis=0)
+
+    def degree_hours(self, values, base: float) -> np.ndarray:
+        excess = np.clip(self.values(values) - base, 0, None)
+        return np.add.reduceat(np.nan_to_num(excess), self.starts)
+
+    def night_min(self, values, window: tuple[int, int] = DEFAULT_NIGHT_WINDOW) -> np.ndarray:
+        """Minimum from `start` h on each date to `end` h the next morning."""
+        start, end = window
+        arr = self.values(values)
+        evening = self.hours >= start
+        morning = self.hours < end
+        mask = evening | morning
+        out = np.full(len(self.starts), np.nan)
+        if not mask.any():
+            return out
+
+        # morning hours belong to the previous evening's night
+        night_day = self.day_numbers[mask] - morning[mask]
+        night_vals = arr[mask]
+        night_starts = np.flatnonzero(np.r_[True, night_day[1:] != night_day[:-1]])
+        night_mins = np.fmin.reduceat(night_vals, night_starts)
+        night_counts = np.diff(np.r_[night_starts, len(night_day)])
+        # one hour of slack so the spring DST night still counts as complete
+        expected = (24 - start) + end
+        night_mins[night_counts < expected - 1] = np.nan
+
+        rows = np.searchsorted(self.day_numbers[self.starts], night_day[night_starts])
+        found = (rows < len(self.starts)) & (
+            self.day_numbers[self.starts][np.minimum(rows, len(self.starts) - 1)]
+            == night_day[night_starts]
+        )
+        out[rows[found]] = night_mins[found]
+        return out
+
+
+def daily_statistics(groups: DayGroups, temperature, stats: DailyStats) -> dict[str, np.ndarray]:
+    """Configured temperature statistics per day of `groups`, keyed by column name."""
+    out = {}
+    if stats.mean:
+        out["tmean"] = groups.mean(temperature).round(2)
+    if stats.night_window is not None:
+        out["tmin_night"] = groups.night_min(temperature, stats.night_window)
+        if stats.tropical_night is not None:
+            night = out["tmin_night"]
+            out["tropical_night"] = pd.array(
+                np.where(np.isnan(night), None, night >= stats.tropical_night), dtype="boolean"
+            )
+    if stats.hours_above:
+        counts = groups.hours_above(temperature, stats.hours_above)
+        for i, threshold in enumerate(stats.hours_above):
+            out[f"hours_above_{threshold:g}"] = counts[:, i]
+    if stats.degree_hours_base is not None:
+        out[f"degree_hours_above_{stats.degree_hours_base:g}"] = groups.degree_hours(
+            temperature, stats.degree_hours_base
+        ).round(2)
+    return out
@@ -1,24 +1,122 @@
 import logging
+import os
+import threading
+from concurrent.futures import Future
 from pathlib import Path
-from datetime import date
 
+import numpy as np
 import pandas as pd
 import requests
-import requests_cache
-from retry_requests import retry
+
+from . import forecast_archive, heat_indices, recorder
+from .daily_stats import DailyStats, DayGroups, daily_statistics
+from .instrumentation import response_hook, stage
 
 # Always resolve paths from the repo root
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 DATA_DIR = PROJECT_ROOT / "data" / "raw"
+OPEN_METEO_URLS = {
+    "forecast": "https://api.open-meteo.com/v1/forecast",
+    "archive": "https://archive-api.open-meteo.com/v1/archive",
+    "ensemble": "https://ensemble-api.open-meteo.com/v1/ensemble",
+}
+# Point every endpoint at one host (e.g. the local stub server) when set
+API_BASE_URL = os.environ.get("UHF_OPEN_METEO_BASE_URL")
 DEFAULT_MULTI_MODELS = ("ecmwf_ifs025", "gfs_seamless", "icon_seamless")
+DEFAULT_HOURLY_VARIABLES = ("temperature_2m",)
 LOGGER = logging.getLogger(__name__)
 
 
+def api_url(endpoint: str) -> str:
+    """Resolve an Open-Meteo endpoint, honouring `API_BASE_URL` if configured."""
+    if API_BASE_URL:
+        return f"{API_BASE_URL.rstrip('/')}/v1/{endpoint}"
+    return OPEN_METEO_URLS[endpoint]
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one.
+
+    The first caller for a key runs the function. Callers that arrive while it
+    is in flight wait for it and get the same result (or exception). Nothing is
+    kept once the call finishes, so this is not a cache: the next call after
+    that runs again. Dashboard sessions are threads of one process, so a heat
+    event with many viewers of a city costs one request per city and model.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict = {}
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` unless a call for `key` is already in flight.
+
+        Returns ``(result, shared)``; `shared` is True for callers that waited.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return call.result(), True
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as exc:
+            call.set_exception(exc)
+            raise
+        else:
+            call.set_result(result)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return result, False
+
+
+FORECAST_FLIGHTS = SingleFlight()
+
+
+def write_csv_atomic(df: pd.DataFrame, path: str | Path) -> Path:
+    """Write `df` to a temporary file next to `path` and rename it into place.
+
+    Readers never see a half-written file, and the last of several concurrent
+    writers wins whole.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return path
+
+
 def _build_retry_session():
+    replay = recorder.replay_session()
+    if replay is not None:
+        return replay
+
+    # Imported lazily: requests_cache pulls in sqlite/cattrs and is only needed to fetch
+    import requests_cache
+    from retry_requests import retry
+
     cache = requests_cache.CachedSession(".cache", expire_after=3600)
+    cache.hooks["response"].append(response_hook("forecast"))
+    recorder.attach(cache)
     return retry(cache, retries=5, backoff_factor=0.2)
 
 
+def required_hourly_variables(variables=None, indices=()) -> list[str]:
+    """Hourly variables to request so `variables` and `indices` can be built."""
+    requested = [*DEFAULT_HOURLY_VARIABLES, *(variables or ()), *heat_indices.required_inputs(indices)]
+    return list(dict.fromkeys(requested))
+
+
 def _daily_temperature_from_hourly_data(
     times,
     temps,
@@ -26,38 +124,81 @@ def _daily_temperature_from_hourly_data(
     include_model_col: bool = False,
     model: str | None = None,
 ) -> pd.DataFrame:
-    if len(times) != len(temps):
+    return _daily_frame_from_hourly(
+        {"time": times, "temperature_2m": temps},
+        city_name,
+        include_model_col=include_model_col,
+        model=model,
+    )
+
+
+def _daily_frame_from_hourly(
+    hourly: dict,
+    city_name: str,
+    indices=(),
+    include_model_col: bool = False,
+    model: str | None = None,
+    stats: DailyStats | None = None,
+    keep_past: bool = False,
+) -> pd.DataFrame:
+    """Aggregate every hourly variable (and derived index) to days in one pass.
+
+    Temperature gives `tmin`/`tmax`, each extra variable its daily mean
+    (`<variable>_mean`), and each heat-stress index its daily `_min`/`_max`.
+    `stats` adds the configured `DailyStats` columns (daily mean,
+    night-time minimum, tropical nights, hours and degree-hours above thresholds).
+    Days before today are dropped unless `keep_past` (used for `past_days` data).
+    """
+    times = hourly["time"]
+    if len(times) != len(hourly["temperature_2m"]):
         raise ValueError(
             "Open-Meteo returned mismatched hourly timestamps and temperatures."
         )
+    extra = [name for name in hourly if name not in ("time", "temperature_2m")]
+    for name in extra:
+        if len(hourly[name]) != len(times):
+            raise ValueError(f"Open-Meteo returned mismatched hourly timestamps and {name}.")
 
     # JSON responses already respect the requested timezone and are easier to parse
     # than FlatBuffers in constrained environments like Streamlit Cloud.
-    timestamps = pd.to_datetime(times)
-    if pd.isna(timestamps).any():
-        raise ValueError("Open-Meteo returned unparsable hourly timestamps.")
-
-    df = pd.DataFrame({"datetime": timestamps, "temperature": temps})
-    df["date"] = df["datetime"].dt.date
-
-    # --- aggregate to daily min & max ---
-    df_daily = df.groupby("date").agg(
-        tmin=("temperature", "min"),
-        tmax=("temperature", "max"),
-    ).reset_index()
-    df_daily["city"] = city_name.lower()
-    if include_model_col and model:
-        df_daily["model"] = model
-
-    # Drop the first row if it's earlier than today
-    today = date.today()
-    if not df_daily.empty and df_daily.loc[0, "date"] < today:
-        df_daily = df_daily[df_daily["date"] >= today].reset_index(drop=True)
+    with stage("aggregate", city=city_name.lower(), model=model) as info:
+        timestamps = pd.to_datetime(times)
+        if pd.isna(timestamps).any():
+            raise ValueError("Open-Meteo returned unparsable hourly timestamps.")
+
+        # --- day boundaries once, then one reduceat per statistic ---
+        groups = DayGroups(timestamps)
+        temperature = np.asarray(hourly["temperature_2m"], dtype=float)
+        columns = {
+            "date": groups.dates,
+            "tmin": groups.min(temperature),
+            "tmax": groups.max(temperature),
+        }
+        for name in extra:
+            columns[f"{name}_mean"] = groups.mean(hourly[name]).round(2)
+        for name, values in heat_indices.compute(hourly, indices).items():
+            min_col, max_col = heat_indices.daily_columns(name)
+            columns[min_col] = groups.min(values).round(2)
+            columns[max_col] = groups.max(values).round(2)
+        if stats is not None:
+            columns.update(daily_statistics(groups, temperature, stats))
+        df_daily = pd.DataFrame(columns)
+        df_daily["city"] = city_name.lower()
+        if include_model_col and model:
+            df_daily["model"] = model
+
+        # Drop the first row if it's earlier than today
+        today = recorder.today()
+        if not keep_past and not df_daily.empty and df_daily.loc[0, "date"] < today:
+            df_daily = df_daily[df_daily["date"] >= today].reset_index(drop=True)
+        info["rows"] = len(timestamps)
 
     return df_daily
 
 
-def _fetch_forecast_payload(url: str, params: dict, model: str) -> dict:
+def _fetch_forecast_payload(
+    url: str, params: dict, model: str, hourly_variables=DEFAULT_HOURLY_VARIABLES
+) -> dict:
     session = _build_retry_session()
     try:
         response = session.get(url, params=params, timeout=30)
@@ -76,6 +217,12 @@ def _fetch_forecast_payload(url: str, params: dict, model: str) -> dict:
     except ValueError as exc:
         raise RuntimeError("Open-Meteo forecast response was not valid JSON.") from exc
 
+    return _validate_forecast_payload(payload, model=model, hourly_variables=hourly_variables)
+
+
+def _validate_forecast_payload(
+    payload: dict, model: str, hourly_variables=DEFAULT_HOURLY_VARIABLES
+) -> dict:
     if payload.get("error"):
         reason = payload.get("reason", "Unknown error")
         raise RuntimeError(
@@ -87,45 +234,108 @@ def _fetch_forecast_payload(url: str, params: dict, model: str) -> dict:
         raise RuntimeError(
             f"Open-Meteo forecast response for model '{model}' was missing hourly temperature data."
         )
+    missing = [name for name in hourly_variables if name not in hourly]
+    if missing:
+        raise RuntimeError(
+            f"Open-Meteo forecast response for model '{model}' was missing hourly {missing}."
+        )
 
     return payload
 
 
-def fetch_forecast_for_model(
+def _forecast_params(
     lat: float,
     lon: float,
-    city_name: str,
-    model: str = "ecmwf_ifs025",
-    forecast_days: int = 7,
-    save_path: str | Path | None = None,
-    include_model_col: bool = True,
-) -> pd.DataFrame:
-    url = "https://api.open-meteo.com/v1/forecast"
+    model: str,
+    forecast_days: int,
+    hourly_variables=DEFAULT_HOURLY_VARIABLES,
+    past_days: int = 0,
+) -> dict:
     params = {
         "latitude": lat,
         "longitude": lon,
-        "hourly": "temperature_2m",
+        "hourly": ",".join(hourly_variables),
         "models": model,
         "forecast_days": forecast_days,
         "timezone": "auto",
     }
-    payload = _fetch_forecast_payload(url, params, model=model)
-    hourly = payload["hourly"]
-    df_daily = _daily_temperature_from_hourly_data(
-        times=hourly["time"],
-        temps=hourly["temperature_2m"],
+    if past_days:
+        params["past_days"] = past_days
+    return params
+
+
+def fetch_forecast_for_model(
+    lat: float,
+    lon: float,
+    city_name: str,
+    model: str = "ecmwf_ifs025",
+    forecast_days: int = 7,
+    save_path: str | Path | None = None,
+    include_model_col: bool = True,
+    archive: bool = True,
+    hourly_variables: list[str] | tuple[str, ...] | None = None,
+    indices: list[str] | tuple[str, ...] = (),
+    daily_stats: DailyStats | None = None,
+) -> pd.DataFrame:
+    """Fetch one model and aggregate it to daily values.
+
+    All `hourly_variables`, plus whatever the heat-stress `indices` need, are
+    requested in the same call. See `_daily_frame_from_hourly` for the columns.
+
+    Identical calls made while one is in flight (e.g. several dashboard sessions
+    opening the same city) share its request, file write and result. Every
+    caller gets its own copy of the frame.
+    """
+    key = (
+        round(lat, 4), round(lon, 4), city_name.lower(), model, forecast_days,
+        str(save_path), include_model_col, archive,
+        tuple(hourly_variables or ()), tuple(indices), daily_stats,
+    )
+    df_daily, shared = FORECAST_FLIGHTS.do(
+        key, _fetch_forecast_for_model, lat, lon, city_name, model, forecast_days,
+        save_path, include_model_col, archive, hourly_variables, indices, daily_stats,
+    )
+    if shared:
+        LOGGER.info("Shared in-flight %s fetch for %s", model, city_name)
+    return df_daily.copy()
+
+
+def _fetch_forecast_for_model(
+    lat, lon, city_name, model, forecast_days, save_path, include_model_col, archive,
+    hourly_variables, indices, daily_stats,
+) -> pd.DataFrame:
+    variables = required_hourly_variables(hourly_variables, indices)
+    params = _forecast_params(
+        lat, lon, model=model, forecast_days=forecast_days, hourly_variables=variables
+    )
+    with stage("fetch", city=city_name.lower(), model=model):
+        payload = _fetch_forecast_payload(
+            api_url("forecast"), params, model=model, hourly_variables=variables
+        )
+    hourly = {name: payload["hourly"][name] for name in ["time", *variables]}
+    df_daily = _daily_frame_from_hourly(
+        hourly,
         city_name=city_name,
+        indices=indices,
         include_model_col=include_model_col,
         model=model,
+        stats=daily_stats,
     )
 
     # --- save ---
     if save_path is None:
         suffix = f"_{model}" if include_model_col else ""
         save_path = DATA_DIR / f"{city_name.lower()}{suffix}_forecast.csv"
-    save_path = Path(save_path)
-    save_path.parent.mkdir(parents=True, exist_ok=True)
-    df_daily.to_csv(save_path, index=False)
+    save_path = write_csv_atomic(df_daily, save_path)
+
+    # --- keep every run in the append-only archive ---
+    # a replayed payload is not a new run
+    if archive and not recorder.replaying():
+        archived = forecast_archive.append_run(
+            df_daily, city=city_name, model=model, payload=payload
+        )
+        if archived is not None:
+            LOGGER.info("Archived %s run to %s", model, archived)
 
     LOGGER.info("Saved %s forecast to %s", model, save_path)
     print(f"✅ Saved {model}: {save_path}")
@@ -137,6 +347,9 @@ def fetch_ecmwf_forecast(
     lon: float,
     city_name: str,
     save_path: str | Path | None = None,
+    hourly_variables: list[str] | tuple[str, ...] | None = None,
+    indices: list[str] | tuple[str, ...] = (),
+    daily_stats: DailyStats | None = None,
 ) -> pd.DataFrame:
     if save_path is None:
         save_path = DATA_DIR / f"{city_name.lower()}_forecast.csv"
@@ -148,6 +361,9 @@ def fetch_ecmwf_forecast(
         forecast_days=7,
         save_path=save_path,
         include_model_col=False,
+        hourly_variables=hourly_variables,
+        indices=indices,
+        daily_stats=daily_stats,
     )
 
 
@@ -157,6 +373,9 @@ def fetch_multi_model_forecast(
     city_name: str,
     models: list[str] | tuple[str, ...] | None = None,
     forecast_days: int = 7,
+    hourly_variables: list[str] | tuple[str, ...] | None = None,
+    indices: list[str] | tuple[str, ...] = (),
+    daily_stats: DailyStats | None = None,
 ) -> tuple[pd.DataFrame, list[dict[str, str]]]:
     requested_models = list(models or DEFAULT_MULTI_MODELS)
     # de-duplicate while preserving order
@@ -175,6 +394,9 @@ def fetch_multi_model_forecast(
                 forecast_days=forecast_days,
                 save_path=DATA_DIR / f"{city_name.lower()}_{model}_forecast.csv",
                 include_model_col=True,
+                hourly_variables=hourly_variables,
+                indices=indices,
+                daily_stats=daily_stats,
             )
             frames.append(df_model)
         except Exception as exc:
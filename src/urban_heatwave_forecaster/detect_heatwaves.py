@@ -1,28 +1,234 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
-def detect_heatwaves_df(forecast_df: pd.DataFrame, climatology_df: pd.DataFrame, min_run: int = 3):
-    """Return forecast df with heatwave flags using in-memory DataFrames."""
+from .climate_normals import percentile_column
+from .heat_indices import daily_columns
+from .instrumentation import stage
+
+# Which daily temperatures must exceed their thresholds for a day to count
+RULES = {
+    "both": lambda exc_min, exc_max: exc_min & exc_max,
+    "either": lambda exc_min, exc_max: exc_min | exc_max,
+    "tmax": lambda exc_min, exc_max: exc_max,
+    "tmin": lambda exc_min, exc_max: exc_min,
+}
+
+def detect_heatwaves_df(
+    forecast_df: pd.DataFrame,
+    climatology_df: pd.DataFrame,
+    min_run: int = 3,
+    variable: str = "temperature",
+):
+    """Return forecast df with heatwave flags using in-memory DataFrames.
+
+    `variable` picks the threshold variable: ``"temperature"`` compares
+    tmin/tmax with tmin_95p/tmax_95p, a heat-stress index such as
+    ``"heat_index"`` compares heat_index_min/_max with heat_index_min_95p/_max_95p.
+
+    When the climatology carries bootstrap bounds (``tmin_95p_lo`` / ``_hi`` and
+    so on, see `bootstrap.bootstrap_climatologies`), `uncertain_exceedance` marks
+    days that exceed the lower bounds but not the upper ones: whether they are
+    hot depends on sampling noise in the thresholds.
+    """
+    min_col, max_col = daily_columns(variable)
+    with stage("detect") as info:
+        info["rows"] = len(forecast_df)
+        fc = forecast_df.copy()
+        clim = climatology_df.copy()
+        fc["date"] = pd.to_datetime(fc["date"])
+
+        # ── join thresholds ────────────────────────────────────────────────
+        fc["day_of_year"] = fc["date"].dt.dayofyear
+        fc = fc.merge(clim, on="day_of_year", how="left")
+
+        # ── flag exceedance ────────────────────────────────────────────────
+        fc["exceeds_95p"] = (
+            (fc[min_col] > fc[percentile_column(min_col, 95)]) &
+            (fc[max_col] > fc[percentile_column(max_col, 95)])
+        )
+        bounds = {
+            bound: [f"{percentile_column(col, 95)}_{bound}" for col in (min_col, max_col)]
+            for bound in ("lo", "hi")
+        }
+        if all(col in fc.columns for cols in bounds.values() for col in cols):
+            possible = (fc[min_col] > fc[bounds["lo"][0]]) & (fc[max_col] > fc[bounds["lo"][1]])
+            certain = (fc[min_col] > fc[bounds["hi"][0]]) & (fc[max_col] > fc[bounds["hi"][1]])
+            fc["uncertain_exceedance"] = possible & ~certain
+
+        # ── identify consecutive runs ≥ min_run ────────────────────────────
+        grp = (fc["exceeds_95p"] != fc["exceeds_95p"].shift()).cumsum()
+        run_lengths = fc.groupby(grp)["exceeds_95p"].transform("sum")
+        fc["heatwave_id"] = grp.where((fc["exceeds_95p"]) & (run_lengths >= min_run))
+
+    return fc.drop(columns=["day_of_year"])
+
+
+def stitch_observed(observed_df: pd.DataFrame, forecast_df: pd.DataFrame) -> pd.DataFrame:
+    """Observed days before the forecast's first date, then the forecast.
+
+    Adds `source` ("observed" / "forecast"); the forecast wins where both have a day.
+    """
     fc = forecast_df.copy()
-    clim = climatology_df.copy()
     fc["date"] = pd.to_datetime(fc["date"])
+    obs = observed_df.copy()
+    obs["date"] = pd.to_datetime(obs["date"])
+    if not fc.empty:
+        obs = obs[obs["date"] < fc["date"].min()]
+    stitched = pd.concat(
+        [obs.assign(source="observed"), fc.assign(source="forecast")], ignore_index=True
+    )
+    return stitched.sort_values("date", kind="stable").reset_index(drop=True)
 
-    # ── join thresholds ────────────────────────────────────────────────────
-    fc["day_of_year"] = fc["date"].dt.dayofyear
-    fc = fc.merge(clim, on="day_of_year", how="left")
 
-    # ── flag exceedance ────────────────────────────────────────────────────
-    fc["exceeds_95p"] = (
-        (fc["tmin"] > fc["tmin_95p"]) &
-        (fc["tmax"] > fc["tmax_95p"])
-    )
+def detect_heatwaves_stitched(
+    forecast_df: pd.DataFrame,
+    observed_df: pd.DataFrame,
+    climatology_df: pd.DataFrame,
+    min_run: int = 3,
+    variable: str = "temperature",
+) -> pd.DataFrame:
+    """`detect_heatwaves_df` over recent observed days + forecast as one series.
 
-    # ── identify consecutive runs ≥ min_run ────────────────────────────────
-    grp = (fc["exceeds_95p"] != fc["exceeds_95p"].shift()).cumsum()
-    run_lengths = fc.groupby(grp)["exceeds_95p"].transform("sum")
-    fc["heatwave_id"] = grp.where((fc["exceeds_95p"]) & (run_lengths >= min_run))
+    Runs that started before today keep their full length, so an ongoing event
+    with fewer than `min_run` forecast days left is still detected. Adds
+    `heatwave_start` and `heatwave_days` (whole-event length) on heatwave rows.
+    `heatwave_id` is counted from the first forecast day, as without stitching,
+    so it does not move as the observed store slides; events that ended before
+    the forecast get ids below 1. Observed rows are returned too; filter on
+    `source == "forecast"` to drop them.
+    """
+    if observed_df is None or observed_df.empty:
+        out = detect_heatwaves_df(forecast_df, climatology_df, min_run=min_run, variable=variable)
+        out["source"] = "forecast"
+    else:
+        out = detect_heatwaves_df(
+            stitch_observed(observed_df, forecast_df), climatology_df,
+            min_run=min_run, variable=variable,
+        )
+        first_forecast = (out["source"] == "forecast").to_numpy().argmax()
+        grp = (out["exceeds_95p"] != out["exceeds_95p"].shift()).cumsum()
+        out["heatwave_id"] -= grp.iloc[first_forecast] - 1
+    events = out.dropna(subset=["heatwave_id"]).groupby("heatwave_id")["date"]
+    out["heatwave_start"] = out["heatwave_id"].map(events.min())
+    out["heatwave_days"] = out["heatwave_id"].map(events.size())
+    return out
 
-    return fc.drop(columns=["day_of_year"])
+
+def _run_lengths(exceeds: np.ndarray) -> np.ndarray:
+    """Length of the exceedance run each cell belongs to, along the last axis."""
+    flat = exceeds.reshape(-1, exceeds.shape[-1])
+    changed = np.ones(flat.shape, dtype=bool)
+    changed[:, 1:] = flat[:, 1:] != flat[:, :-1]
+    run_id = np.cumsum(changed.ravel())
+    run_len = np.bincount(run_id, weights=flat.ravel())[run_id]
+    return run_len.reshape(exceeds.shape)
+
+
+def detect_heatwaves_sensitivity(
+    forecast_df: pd.DataFrame,
+    climatology_df: pd.DataFrame,
+    percentiles=(90, 95, 99),
+    min_runs=(2, 3, 5),
+    rules=("both", "tmax"),
+    variable: str = "temperature",
+) -> pd.DataFrame:
+    """Detect heatwaves for every (percentile × min_run × rule) combination at once.
+
+    `climatology_df` needs `tmin_<p>p` / `tmax_<p>p` columns for each percentile
+    (see `climate_normals.build_multi_percentile_climatology`), or the matching
+    index columns when `variable` is a heat-stress index. Exceedances are
+    broadcast to a (rule, percentile, day) array and run lengths are computed
+    once, so each extra `min_run` only costs one comparison.
+
+    Returns a tidy cube with one row per (percentile, rule, min_run, date).
+    `heatwave_id` numbers events within each combination and is NaN on other days.
+    With ``95 / 3 / "both"`` it flags the same days as `detect_heatwaves_df`.
+    """
+    unknown = [rule for rule in rules if rule not in RULES]
+    if unknown:
+        raise ValueError(f"Unknown rule(s) {unknown}; choose from {sorted(RULES)}")
+    min_col, max_col = daily_columns(variable)
+    tmin_cols = [percentile_column(min_col, p) for p in percentiles]
+    tmax_cols = [percentile_column(max_col, p) for p in percentiles]
+    missing = [col for col in tmin_cols + tmax_cols if col not in climatology_df.columns]
+    if missing:
+        raise ValueError(f"Climatology is missing threshold columns: {missing}")
+
+    with stage("detect_sensitivity") as info:
+        fc = forecast_df.copy()
+        fc["date"] = pd.to_datetime(fc["date"])
+        fc = fc.sort_values("date").reset_index(drop=True)
+        fc["day_of_year"] = fc["date"].dt.dayofyear
+        thresholds = fc[["day_of_year"]].merge(
+            climatology_df[["day_of_year", *tmin_cols, *tmax_cols]], on="day_of_year", how="left"
+        )
+
+        # (percentile, day) exceedances, then (rule, percentile, day)
+        tmin = fc[min_col].to_numpy()
+        tmax = fc[max_col].to_numpy()
+        exc_min = tmin[None, :] > thresholds[tmin_cols].to_numpy().T
+        exc_max = tmax[None, :] > thresholds[tmax_cols].to_numpy().T
+        exceeds = np.stack([RULES[rule](exc_min, exc_max) for rule in rules])
+        run_len = _run_lengths(exceeds)
+
+        # (min_run, rule, percentile, day)
+        min_run_arr = np.asarray(min_runs)[:, None, None, None]
+        heatwave = exceeds[None] & (run_len[None] >= min_run_arr)
+        starts = heatwave.copy()
+        starts[..., 1:] &= ~heatwave[..., :-1]
+        event_no = np.cumsum(starts, axis=-1)
+
+        n_min_runs, n_rules, n_pct, n_days = heatwave.shape
+        cube = pd.DataFrame({
+            "min_run": np.repeat(np.asarray(min_runs), n_rules * n_pct * n_days),
+            "rule": np.tile(np.repeat(np.asarray(rules, dtype=object), n_pct * n_days), n_min_runs),
+            "percentile": np.tile(np.repeat(np.asarray(percentiles), n_days), n_min_runs * n_rules),
+            "date": np.tile(fc["date"].to_numpy(), n_min_runs * n_rules * n_pct),
+            "tmin": np.tile(tmin, n_min_runs * n_rules * n_pct),
+            "tmax": np.tile(tmax, n_min_runs * n_rules * n_pct),
+            "tmin_threshold": np.tile(thresholds[tmin_cols].to_numpy().T.ravel(), n_min_runs * n_rules),
+            "tmax_threshold": np.tile(thresholds[tmax_cols].to_numpy().T.ravel(), n_min_runs * n_rules),
+            "exceeds": np.broadcast_to(exceeds, heatwave.shape).ravel(),
+            "run_length": np.broadcast_to(run_len, heatwave.shape).ravel().astype(int),
+            "heatwave": heatwave.ravel(),
+            "heatwave_id": np.where(heatwave, event_no, np.nan).ravel(),
+        })
+        if "city" in fc.columns:
+            cube.insert(0, "city", np.tile(fc["city"].to_numpy(), n_min_runs * n_rules * n_pct))
+        info["rows"] = len(cube)
+
+    return cube
+
+
+def detect_heatwaves_by_period(
+    forecast_df: pd.DataFrame, climatologies: dict[str, pd.DataFrame], **kwargs
+) -> pd.DataFrame:
+    """Sensitivity cubes for several reference periods, stacked with a `period` column.
+
+    `climatologies` maps period labels to thresholds, as returned by
+    `climate_normals.build_period_climatologies`; `kwargs` go to
+    `detect_heatwaves_sensitivity`.
+    """
+    cubes = []
+    for label, climatology_df in climatologies.items():
+        cube = detect_heatwaves_sensitivity(forecast_df, climatology_df, **kwargs)
+        cube.insert(0, "period", label)
+        cubes.append(cube)
+    return pd.concat(cubes, ignore_index=True)
+
+
+def sensitivity_summary(cube: pd.DataFrame) -> pd.DataFrame:
+    """Heatwave days and events per (period, percentile, rule, min_run)."""
+    keys = ["percentile", "rule", "min_run"]
+    if "period" in cube.columns:
+        keys.insert(0, "period")
+    hot = cube[cube["heatwave"]].groupby(keys)
+    summary = cube.groupby(keys)["heatwave"].sum().rename("heatwave_days").to_frame()
+    summary["events"] = hot["heatwave_id"].nunique()
+    summary["first_heatwave_day"] = hot["date"].min()
+    summary["events"] = summary["events"].fillna(0).astype(int)
+    return summary.reset_index()
 
 
 def detect_heatwaves(forecast_path, climatology_path, min_run=3):
@@ -0,0 +1,157 @@
+"""Sub-city (district or census-tract) vulnerability and heatwave risk.
+
+`district_vulnerability.csv` has one row per unit: its parent `city`, a
+`district` id, the vulnerability columns of `urban_vulnerability.csv`
+(`elderly_percent`, `green_cover_percent`, `density_per_km2`) and optionally
+`population`.
+
+`DistrictIndex` is built once per vulnerability table and holds, per unit, the
+position of its parent city and its escalation flag. Forecasts stay at city
+level: `assess_district_risk` lays them out as a (city × day) array of risk
+bands and broadcasts them to (unit × day) with one fancy-index, so 100k units ×
+16 days is a few int8 array operations rather than a merged frame.
+`DistrictRisk.city_summary` aggregates the units back to one row per city and
+day with a single bincount.
+
+Bands and escalation are the same as `risk_model.assess_heatwave_risk`.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .ensemble import RISK_ORDER
+from .instrumentation import stage
+from .risk_model import high_vulnerability, risk_scores
+
+DISTRICT_VULNERABILITY_PATH = Path("data/raw/district_vulnerability.csv")
+EXTREME = len(RISK_ORDER) - 1
+
+
+@dataclass
+class DistrictIndex:
+    cities: np.ndarray
+    parent: np.ndarray
+    districts: np.ndarray
+    escalate: np.ndarray
+    population: np.ndarray | None = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "DistrictIndex":
+        city = df["city"].astype(str).str.strip().str.lower()
+        parent, cities = pd.factorize(city, sort=True)
+        escalate = high_vulnerability(
+            df["elderly_percent"].to_numpy(),
+            df["density_per_km2"].to_numpy(),
+            df["green_cover_percent"].to_numpy(),
+        )
+        population = df["population"].to_numpy(dtype=float) if "population" in df else None
+        return cls(
+            cities=np.asarray(cities),
+            parent=parent.astype(np.int32),
+            districts=df["district"].astype(str).to_numpy(),
+            escalate=escalate.astype(np.int8),
+            population=population,
+        )
+
+    @classmethod
+    def from_csv(cls, path=DISTRICT_VULNERABILITY_PATH) -> "DistrictIndex":
+        return cls.from_frame(pd.read_csv(path, encoding="utf-8-sig"))
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def subset(self, cities) -> "DistrictIndex":
+        """Units whose parent is one of `cities`, with parents renumbered."""
+        keep_city = np.isin(self.cities, [c.strip().lower() for c in cities])
+        keep = keep_city[self.parent]
+        renumber = np.cumsum(keep_city) - 1
+        return DistrictIndex(
+            cities=self.cities[keep_city],
+            parent=renumber[self.parent[keep]].astype(np.int32),
+            districts=self.districts[keep],
+            escalate=self.escalate[keep],
+            population=None if self.population is None else self.population[keep],
+        )
+
+
+@dataclass
+class DistrictRisk:
+    index: DistrictIndex
+    dates: np.ndarray
+    scores: np.ndarray
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per (district, date); `risk_level` is categorical."""
+        n_units, n_days = self.scores.shape
+        frame = pd.DataFrame({
+            "city": np.repeat(self.index.cities[self.index.parent], n_days),
+            "district": np.repeat(self.index.districts, n_days),
+            "date": np.tile(self.dates, n_units),
+            "risk_score": self.scores.ravel(),
+            "risk_level": pd.Categorical.from_codes(self.scores.ravel(), RISK_ORDER, ordered=True),
+        })
+        if self.index.population is not None:
+            frame["population"] = np.repeat(self.index.population, n_days)
+        return frame
+
+    def city_summary(self) -> pd.DataFrame:
+        """Districts (and people, with `population`) per risk level for each city and day."""
+        n_cities, n_days, n_levels = len(self.index.cities), len(self.dates), len(RISK_ORDER)
+        cell = (self.index.parent[:, None] * n_days + np.arange(n_days)[None, :]) * n_levels
+        keys = (cell + self.scores).ravel()
+        size = n_cities * n_days * n_levels
+        counts = np.bincount(keys, minlength=size).reshape(n_cities * n_days, n_levels)
+
+        summary = pd.DataFrame({
+            "city": np.repeat(self.index.cities, n_days),
+            "date": np.tile(self.dates, n_cities),
+            "districts": counts.sum(axis=1),
+        })
+        for level, column in zip(RISK_ORDER, counts.T):
+            summary[f"districts_{level.lower()}"] = column
+        weights = counts
+        if self.index.population is not None:
+            people = np.bincount(
+                keys, weights=np.repeat(self.index.population, n_days), minlength=size
+            ).reshape(n_cities * n_days, n_levels)
+            for level, column in zip(RISK_ORDER, people.T):
+                summary[f"population_{level.lower()}"] = column
+            weights = people
+
+        total = weights.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            summary["high_plus_share"] = (weights[:, RISK_ORDER.index("High"):].sum(axis=1) / total).round(4)
+        present = counts > 0
+        highest = n_levels - 1 - np.argmax(present[:, ::-1], axis=1)
+        summary["max_risk_level"] = np.asarray(RISK_ORDER, dtype=object)[highest]
+        return summary[summary["districts"] > 0].reset_index(drop=True)
+
+
+def assess_district_risk(
+    forecast_df: pd.DataFrame, index: DistrictIndex, temperature_column: str = "tmax"
+) -> DistrictRisk:
+    """Broadcast city forecasts to every district of `index` and score them.
+
+    `forecast_df` needs `city`, `date` and `temperature_column`, one row per
+    city and day. Districts of cities without a forecast are left out.
+    """
+    with stage("assess_districts") as info:
+        city = forecast_df["city"].astype(str).str.strip().str.lower().to_numpy()
+        index = index.subset(np.unique(city))
+        dates = np.sort(pd.to_datetime(forecast_df["date"]).unique())
+
+        city_pos = pd.Index(index.cities).get_indexer(city)
+        date_pos = pd.DatetimeIndex(dates).get_indexer(pd.to_datetime(forecast_df["date"]))
+        known = city_pos >= 0
+        temperature = np.full((len(index.cities), len(dates)), np.nan)
+        temperature[city_pos[known], date_pos[known]] = (
+            forecast_df[temperature_column].to_numpy(dtype=float)[known]
+        )
+
+        scores = risk_scores(temperature)[index.parent] + index.escalate[:, None]
+        np.minimum(scores, EXTREME, out=scores)
+        info["rows"] = scores.size
+
+    return DistrictRisk(index=index, dates=dates, scores=scores)
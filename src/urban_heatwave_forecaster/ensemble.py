@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from .risk_model import risk_scores
+
+RISK_ORDER = ["None", "Mild", "Moderate", "High", "Extreme"]
+RISK_TO_SCORE = {risk: score for score, risk in enumerate(RISK_ORDER)}
+
+
+def base_risk_from_tmax(temp: float) -> str:
+    return RISK_ORDER[int(risk_scores(temp))]
+
+
+def enrich_risk_dataframe(df: pd.DataFrame, temperature_column: str = "tmax") -> pd.DataFrame:
+    out = df.copy()
+    out["date"] = pd.to_datetime(out["date"])
+    out["base_risk_level"] = np.asarray(RISK_ORDER, dtype=object)[risk_scores(out[temperature_column])]
+    out["base_risk_score"] = out["base_risk_level"].map(RISK_TO_SCORE)
+    out["adjusted_risk_score"] = out["risk_level"].map(RISK_TO_SCORE)
+    out["risk_escalated"] = out["adjusted_risk_score"] > out["base_risk_score"]
+    return out
+
+
+def _consensus_from_probs(row: pd.Series) -> str:
+    for level in reversed(RISK_ORDER):
+        if row[level] >= 0.5:
+            return level
+    return "Uncertain"
+
+
+def summarize_ensemble_risk(
+    ensemble_risk_df: pd.DataFrame,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Turn per-model risk rows into daily probabilities.
+
+    Args:
+        ensemble_risk_df (pd.DataFrame): Enriched risk rows for one city with a
+        'model' column, one row per (model, date).
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: (probability_df, risk_probs) indexed by
+        date. probability_df holds models_available, p_heatwave, p_high_plus,
+        p_extreme, expected_risk_score, most_likely_risk and consensus_risk;
+        risk_probs holds the probability of each level in RISK_ORDER.
+    """
+    ensemble_risk_df = ensemble_risk_df.copy()
+    ensemble_risk_df["date"] = pd.to_datetime(ensemble_risk_df["date"])
+
+    models_available = ensemble_risk_df.groupby("date")["model"].nunique().sort_index()
+    risk_counts = (
+        ensemble_risk_df.pivot_table(
+            index="date",
+            columns="risk_level",
+            values="model",
+            aggfunc="count",
+            fill_value=0,
+        )
+        .reindex(columns=RISK_ORDER, fill_value=0)
+        .sort_index()
+    )
+    risk_probs = risk_counts.div(risk_counts.sum(axis=1), axis=0).fillna(0.0)
+
+    probability_df = pd.DataFrame(index=risk_probs.index)
+    probability_df["models_available"] = models_available
+    probability_df["p_heatwave"] = (
+        ensemble_risk_df.groupby("date")["heatwave_id"]
+        .apply(lambda s: s.notna().mean())
+        .sort_index()
+    )
+    probability_df["p_high_plus"] = (
+        ensemble_risk_df.groupby("date")["risk_level"]
+        .apply(lambda s: s.isin(["High", "Extreme"]).mean())
+        .sort_index()
+    )
+    probability_df["p_extreme"] = (
+        ensemble_risk_df.groupby("date")["risk_level"]
+        .apply(lambda s: (s == "Extreme").mean())
+        .sort_index()
+    )
+    probability_df["expected_risk_score"] = (
+        ensemble_risk_df.groupby("date")["adjusted_risk_score"].mean().sort_index()
+    )
+    probability_df["most_likely_risk"] = risk_probs.idxmax(axis=1)
+    probability_df["consensus_risk"] = risk_probs.apply(_consensus_from_probs, axis=1)
+    return probability_df, risk_probs
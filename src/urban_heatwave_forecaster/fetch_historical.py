@@ -1,23 +1,84 @@
-import openmeteo_requests, pandas as pd, requests_cache
-from retry_requests import retry
+import pandas as pd
 from pathlib import Path
 
-def fetch_historical_data(lat, lon, city, save_path=None):
-    client = openmeteo_requests.Client(
-        session=retry(requests_cache.CachedSession(".cache", expire_after=-1), retries=5)
-    )
+from . import climate_normals, heat_indices, recorder
+from .data_fetcher import api_url, write_csv_atomic
+from .instrumentation import response_hook, stage
 
-    url = "https://archive-api.open-meteo.com/v1/archive"
+
+def _archive_params(lat, lon, start_date="1991-01-01", end_date="2020-12-31", indices=()):
     params = {
         "latitude":  lat,
         "longitude": lon,
-        "start_date": "1991-01-01",
-        "end_date":   "2020-12-31",
+        "start_date": start_date,
+        "end_date":   end_date,
         "daily": ["temperature_2m_min", "temperature_2m_max"],
         "timezone": "auto",                       # let API tell us the offset
     }
+    if indices:
+        # heat-stress indices need hourly inputs; daily extremes are derived locally
+        params["hourly"] = heat_indices.required_inputs(indices)
+    return params
+
+
+def _daily_indices(local_times, hourly, indices):
+    """Daily min/max of each heat-stress index from local hourly arrays."""
+    df = pd.DataFrame(heat_indices.compute(hourly, indices))
+    df["date"] = pd.DatetimeIndex(local_times).normalize()
+    daily = df.groupby("date").agg(**heat_indices.daily_aggregations(indices))
+    return daily.round(2).reset_index()
+
+
+def _daily_frame_from_archive_json(payload, city, indices=()):
+    """Build the same daily frame as `fetch_historical_data` from a JSON payload."""
+    if payload.get("error"):
+        raise RuntimeError(
+            f"Open-Meteo archive request failed: {payload.get('reason', 'Unknown error')}"
+        )
+    daily = payload.get("daily") or {}
+    missing = {"time", "temperature_2m_min", "temperature_2m_max"} - set(daily)
+    if missing:
+        raise RuntimeError(
+            f"Open-Meteo archive response was missing daily fields: {sorted(missing)}"
+        )
+
+    # JSON dates are already local because we request timezone=auto
+    df = pd.DataFrame({
+        "date": pd.to_datetime(daily["time"]),
+        "tmin": pd.to_numeric(daily["temperature_2m_min"], errors="coerce"),
+        "tmax": pd.to_numeric(daily["temperature_2m_max"], errors="coerce"),
+    })
+    if indices:
+        hourly = payload.get("hourly") or {}
+        df = df.merge(
+            _daily_indices(pd.to_datetime(hourly["time"]), hourly, indices), on="date", how="left"
+        )
+    df["city"] = city.lower()
+    return df
+
+
+def fetch_historical_data(lat, lon, city, save_path=None,
+                          start_date=None, end_date=None, indices=(), periods=None):
+    """Fetch daily history; by default the span of `periods` (1991-2020)."""
+    import openmeteo_requests, requests_cache
+    from retry_requests import retry
+
+    # one fetch covering every reference period; climatologies slice it later
+    span_start, span_end = climate_normals.period_span(periods or (climate_normals.DEFAULT_PERIOD,))
+    start_date = start_date or span_start
+    end_date = end_date or span_end
 
-    res    = client.weather_api(url, params=params)[0]
+    session = recorder.replay_session()
+    if session is None:
+        cache = requests_cache.CachedSession(".cache", expire_after=-1)
+        cache.hooks["response"].append(response_hook("archive"))
+        session = retry(recorder.attach(cache), retries=5)
+    client = openmeteo_requests.Client(session=session)
+
+    params = _archive_params(lat, lon, start_date=start_date, end_date=end_date, indices=indices)
+
+    with stage("fetch", city=city.lower(), model="archive"):
+        res    = client.weather_api(api_url("archive"), params=params)[0]
     daily  = res.Daily()
 
     # --- build local-date index -------------------------------------------
@@ -27,22 +88,39 @@ def fetch_historical_data(lat, lon, city, save_path=None):
     utc_dates = pd.date_range(start=start_utc, end=end_utc,
                               freq=step, inclusive="left")
 
-    # shift from UTC to local time then drop the time-of-day part
+    # shift from UTC to local time, then drop the zone and the time-of-day part;
+    # naive local dates, like the JSON path and the forecast files
     offset = pd.to_timedelta(res.UtcOffsetSeconds(), unit="s")
-    local_dates = (utc_dates + offset).normalize()
+    local_dates = (utc_dates + offset).tz_localize(None).normalize()
 
     # --- data --------------------------------------------------------------
     tmin = daily.Variables(0).ValuesAsNumpy()
     tmax = daily.Variables(1).ValuesAsNumpy()
 
     df = pd.DataFrame({"date": local_dates, "tmin": tmin, "tmax": tmax})
+
+    # --- optional heat-stress indices from the hourly block ---------------
+    if indices:
+        hourly = res.Hourly()
+        hourly_utc = pd.date_range(
+            start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
+            end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
+            freq=pd.Timedelta(seconds=hourly.Interval()),
+            inclusive="left",
+        )
+        arrays = {
+            name: hourly.Variables(i).ValuesAsNumpy()
+            for i, name in enumerate(params["hourly"])
+        }
+        # same naive local convention as `local_dates` so the dates line up
+        local_times = (hourly_utc + offset).tz_localize(None)
+        df = df.merge(_daily_indices(local_times, arrays, indices), on="date", how="left")
     df["city"] = city.lower()
 
     # --- save --------------------------------------------------------------
     if save_path is None:
         save_path = Path(f"data/raw/{city.lower()}_historical.csv")
-    save_path.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(save_path, index=False)
+    save_path = write_csv_atomic(df, save_path)
     print(f"✅  Saved {len(df):,} rows ➜ {save_path}")
     return df
 
@@ -55,4 +133,6 @@ if __name__ == "__main__":
 
     ]
     for c in cities:
-        fetch_historical_data(c["lat"], c["lon"], c["name"])
+        fetch_historical_data(
+            c["lat"], c["lon"], c["name"], periods=climate_normals.STANDARD_PERIODS
+        )
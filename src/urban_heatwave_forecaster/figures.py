@@ -0,0 +1,286 @@
+"""Plotly figure specs for the dashboard, as plain dicts.
+
+Every chart in `app.py` is built here from its input frame, with no plotly
+import and no per-row Python: heatwave shading comes from one groupby, and
+map hover text is a `hovertemplate` over `customdata` columns that the
+browser formats. Specs are pure functions of their frames. The dashboard caches
+them under `frame_fingerprint(...)`, so a rerun with unchanged results reuses
+the spec instead of rebuilding it.
+
+The comparison view scales to hundreds of cities. Beyond `LABEL_LIMIT` cities
+the map drops its text labels and the bar chart becomes a WebGL (`scattergl`)
+scatter of peak Tmax against its anomaly, one marker per city. The map stays
+on `scattergeo`, which has no WebGL variant, and renders 500 markers without
+labels quickly.
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from .ensemble import RISK_ORDER
+
+RISK_COLORS = {
+    "None": "#a8ddb5",
+    "Mild": "#fee08b",
+    "Moderate": "#fdae61",
+    "High": "#f46d43",
+    "Extreme": "#d73027",
+}
+RISK_COLORSCALE = [[i / (len(RISK_ORDER) - 1), RISK_COLORS[level]] for i, level in enumerate(RISK_ORDER)]
+LABEL_LIMIT = 30
+# map extent of the pilot cities; wider sets of cities fit the map to their markers
+EUROPE_LAT = (35, 62)
+EUROPE_LON = (-12, 31)
+MARGIN = dict(l=40, r=20, t=30, b=40)
+
+
+def frame_fingerprint(*frames: pd.DataFrame) -> str:
+    """Content hash of one or more frames (values, index and column names)."""
+    digest = hashlib.sha1()
+    for frame in frames:
+        digest.update(",".join(map(str, frame.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _figure(data: list[dict], **layout) -> dict:
+    return {"data": data, "layout": layout}
+
+
+def heatwave_shapes(detected_df: pd.DataFrame) -> list[dict]:
+    """One shaded rectangle per heatwave event."""
+    hot = detected_df[detected_df["heatwave_id"].notna()]
+    events = hot.groupby("heatwave_id")["date"].agg(["min", "max"])
+    return [
+        dict(
+            type="rect", xref="x", yref="paper", x0=start, x1=end + pd.Timedelta(days=1),
+            y0=0, y1=1, fillcolor="rgba(255,0,0,0.15)", line_width=0, layer="below",
+        )
+        for start, end in zip(events["min"], events["max"])
+    ]
+
+
+def forecast_figure(fig_df: pd.DataFrame) -> dict:
+    """Daily Tmin/Tmax against their 95th-percentile thresholds, heatwaves shaded."""
+    dates = fig_df["date"]
+    return _figure(
+        [
+            dict(type="scatter", x=dates, y=fig_df["tmax"], mode="lines+markers", name="Tmax",
+                 line=dict(color="#ff6f3c", width=2.5), marker=dict(size=6)),
+            dict(type="scatter", x=dates, y=fig_df["tmax_95p"], mode="lines", name="Tmax 95th pct",
+                 line=dict(color="#ff6f3c", width=2, dash="dash")),
+            dict(type="scatter", x=dates, y=fig_df["tmin"], mode="lines+markers", name="Tmin",
+                 line=dict(color="#3399ff", width=2), marker=dict(size=5)),
+            dict(type="scatter", x=dates, y=fig_df["tmin_95p"], mode="lines", name="Tmin 95th pct",
+                 line=dict(color="#3399ff", width=2, dash="dash")),
+        ],
+        title="Daily Tmin/Tmax Against 95th-Percentile Normals",
+        xaxis_title="Date",
+        yaxis_title="Temperature (°C)",
+        shapes=heatwave_shapes(fig_df),
+        legend=dict(title=""),
+        margin=dict(l=40, r=20, t=60, b=40),
+    )
+
+
+def anomaly_figure(fig_df: pd.DataFrame) -> dict:
+    fig = _figure(
+        [
+            dict(type="bar", x=fig_df["date"], y=fig_df["tmax_anomaly"], name="Tmax anomaly",
+                 marker_color="#ff6f3c"),
+            dict(type="bar", x=fig_df["date"], y=fig_df["tmin_anomaly"], name="Tmin anomaly",
+                 marker_color="#3399ff"),
+        ],
+        barmode="group",
+        xaxis_title="Date",
+        yaxis_title="Anomaly (°C)",
+        margin=MARGIN,
+        legend=dict(title=""),
+    )
+    fig["layout"]["shapes"] = [dict(
+        type="line", xref="paper", x0=0, x1=1, yref="y", y0=0, y1=0,
+        line=dict(dash="dot", color="gray"),
+    )]
+    return fig
+
+
+def risk_figure(risk_df: pd.DataFrame) -> dict:
+    """Base vs vulnerability-adjusted risk score per day."""
+    escalated = risk_df[risk_df["risk_escalated"].astype(bool)]
+    return _figure(
+        [
+            dict(type="scatter", x=risk_df["date"], y=risk_df["base_risk_score"],
+                 mode="lines+markers", name="Base risk (temperature only)",
+                 line=dict(color="#8e8e8e", width=2, dash="dot"), marker=dict(size=7)),
+            dict(type="scatter", x=risk_df["date"], y=risk_df["adjusted_risk_score"],
+                 mode="lines+markers", name="Adjusted risk (with vulnerability)",
+                 line=dict(color="#d7263d", width=3), marker=dict(size=9)),
+            dict(type="scatter", x=escalated["date"], y=escalated["adjusted_risk_score"],
+                 mode="markers", name="Escalated by vulnerability",
+                 marker=dict(size=13, color="#ffa600", symbol="diamond")),
+        ],
+        xaxis_title="Date",
+        yaxis_title="Risk Level",
+        yaxis=dict(
+            tickmode="array",
+            tickvals=list(range(len(RISK_ORDER))),
+            ticktext=RISK_ORDER,
+            range=[-0.3, len(RISK_ORDER) - 0.7],
+        ),
+        margin=MARGIN,
+        legend=dict(title=""),
+    )
+
+
+def probability_figure(probability_df: pd.DataFrame) -> dict:
+    """P(heatwave), P(High+) and P(Extreme) per day, in percent."""
+    traces = [("p_heatwave", "P(Heatwave)", "#6a4c93"), ("p_high_plus", "P(High+)", "#f46d43"),
+              ("p_extreme", "P(Extreme)", "#d73027")]
+    return _figure(
+        [
+            dict(type="scatter", x=probability_df.index, y=probability_df[column] * 100,
+                 mode="lines+markers", name=name, line=dict(color=color, width=2.5))
+            for column, name, color in traces
+        ],
+        xaxis_title="Date",
+        yaxis_title="Probability (%)",
+        yaxis=dict(range=[0, 100]),
+        margin=MARGIN,
+        legend=dict(title=""),
+    )
+
+
+def distribution_figure(risk_probs: pd.DataFrame) -> dict:
+    """Stacked probability of each risk level per day."""
+    return _figure(
+        [
+            dict(type="bar", x=risk_probs.index, y=risk_probs[level] * 100, name=level,
+                 marker_color=RISK_COLORS[level])
+            for level in RISK_ORDER
+        ],
+        barmode="stack",
+        xaxis_title="Date",
+        yaxis_title="Risk Probability (%)",
+        yaxis=dict(range=[0, 100]),
+        margin=MARGIN,
+        legend=dict(title=""),
+        title="Risk-Level Probability Distribution by Day",
+    )
+
+
+def comparison_map(compare_df: pd.DataFrame) -> dict:
+    """Cities on a map: colour = max risk, size = heatwave days."""
+    labelled = len(compare_df) <= LABEL_LIMIT
+    lat, lon = compare_df["lat"].to_numpy(), compare_df["lon"].to_numpy()
+    in_europe = (
+        len(compare_df) > 0
+        and lat.min() >= EUROPE_LAT[0] and lat.max() <= EUROPE_LAT[1]
+        and lon.min() >= EUROPE_LON[0] and lon.max() <= EUROPE_LON[1]
+    )
+    geo = dict(
+        projection_type="natural earth",
+        showland=True,
+        landcolor="#f7f3e9",
+        showcountries=True,
+        countrycolor="#c9c0ad",
+    )
+    if in_europe:
+        geo.update(scope="europe", lataxis=dict(range=list(EUROPE_LAT)), lonaxis=dict(range=list(EUROPE_LON)))
+    else:
+        geo.update(fitbounds="locations")
+    customdata = np.column_stack([
+        compare_df["city"].to_numpy(dtype=object),
+        compare_df["max_risk_level"].to_numpy(dtype=object),
+        compare_df["peak_tmax"].to_numpy(dtype=float),
+        compare_df["heatwave_days"].to_numpy(dtype=int),
+    ])
+    return _figure(
+        [dict(
+            type="scattergeo",
+            lon=lon,
+            lat=lat,
+            mode="markers+text" if labelled else "markers",
+            text=compare_df["city"].to_numpy(dtype=object) if labelled else None,
+            textposition="top center",
+            customdata=customdata,
+            hovertemplate=(
+                "%{customdata[0]}<br>Max risk: %{customdata[1]}<br>"
+                "Peak Tmax: %{customdata[2]:.1f}°C<br>Heatwave days: %{customdata[3]}<extra></extra>"
+            ),
+            marker=dict(
+                size=(12 + compare_df["heatwave_days"].to_numpy() * 2) if labelled
+                else (6 + compare_df["heatwave_days"].to_numpy()),
+                color=compare_df["max_risk_score"].to_numpy(),
+                cmin=0,
+                cmax=len(RISK_ORDER) - 1,
+                colorscale=RISK_COLORSCALE,
+                line=dict(color="white", width=1 if labelled else 0.5),
+                colorbar=dict(
+                    title="Max Risk",
+                    tickmode="array",
+                    tickvals=list(range(len(RISK_ORDER))),
+                    ticktext=RISK_ORDER,
+                ),
+            ),
+        )],
+        margin=dict(l=10, r=10, t=30, b=10),
+        geo=geo,
+        title="City Risk Map (Marker Color = Max Risk, Marker Size = Heatwave Days)",
+    )
+
+
+def comparison_chart(compare_df: pd.DataFrame) -> dict:
+    """Peak Tmax and its anomaly per city: grouped bars, or a WebGL scatter for many cities."""
+    if len(compare_df) <= LABEL_LIMIT:
+        return _figure(
+            [
+                dict(type="bar", x=compare_df["city"], y=compare_df["peak_tmax"],
+                     name="Peak Tmax (°C)", marker_color="#ff6f3c"),
+                dict(type="bar", x=compare_df["city"], y=compare_df["peak_tmax_anomaly"],
+                     name="Peak Tmax anomaly (°C)", marker_color="#6a4c93"),
+            ],
+            barmode="group",
+            xaxis_title="City",
+            yaxis_title="Temperature (°C)",
+            margin=MARGIN,
+            legend=dict(title=""),
+        )
+    return _figure(
+        [dict(
+            type="scattergl",
+            x=compare_df["peak_tmax"].to_numpy(),
+            y=compare_df["peak_tmax_anomaly"].to_numpy(),
+            mode="markers",
+            customdata=np.column_stack([
+                compare_df["city"].to_numpy(dtype=object),
+                compare_df["max_risk_level"].to_numpy(dtype=object),
+            ]),
+            hovertemplate=(
+                "%{customdata[0]}<br>Peak Tmax: %{x:.1f}°C<br>Anomaly: %{y:+.1f}°C<br>"
+                "Max risk: %{customdata[1]}<extra></extra>"
+            ),
+            marker=dict(
+                size=8,
+                color=compare_df["max_risk_score"].to_numpy(),
+                cmin=0,
+                cmax=len(RISK_ORDER) - 1,
+                colorscale=RISK_COLORSCALE,
+            ),
+        )],
+        xaxis_title="Peak Tmax (°C)",
+        yaxis_title="Peak Tmax anomaly (°C)",
+        margin=MARGIN,
+        showlegend=False,
+    )
+
+
+FIGURES = {
+    "forecast": forecast_figure,
+    "anomaly": anomaly_figure,
+    "risk": risk_figure,
+    "probability": probability_figure,
+    "distribution": distribution_figure,
+    "comparison_map": comparison_map,
+    "comparison_chart": comparison_chart,
+}
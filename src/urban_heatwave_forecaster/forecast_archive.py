@@ -0,0 +1,222 @@
+"""Append-only archive of fetched forecast runs.
+
+Every run is written once as a zstd-compressed Parquet file under a Hive-style
+partition tree::
+
+    data/archive/forecasts/city=athens/model=ecmwf_ifs025/issue_month=2025-07/
+        20250714T0600Z_3f9a1c2b7d4e.parquet
+
+The file name carries the issue time and a content hash of the raw payload, so
+re-fetching an unchanged model run is a no-op, and slicing by city, model and
+month only touches the matching directories. Deduplication looks only inside
+the run's own `issue_month` partition: the same payload fetched again in the
+next month is archived again. `issue_time` is the hour the run was fetched, not
+the model's initialisation time, which Open-Meteo does not report.
+
+`compact` merges the run files of each closed month into a single
+`compacted.parquet`, sorted by issue time, so scans over years of runs open a
+few hundred files rather than one per run. Its `payload_hash` column keeps
+deduplication working.
+"""
+import hashlib
+import json
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+ARCHIVE_DIR = PROJECT_ROOT / "data" / "archive" / "forecasts"
+HASH_LENGTH = 12
+COMPACTED_NAME = "compacted.parquet"
+
+
+def payload_hash(payload) -> str:
+    """Stable content hash of a forecast payload (dict) or daily frame."""
+    if isinstance(payload, pd.DataFrame):
+        data = payload.to_csv(index=False).encode()
+    else:
+        # Ignore fields that change between identical runs (e.g. server timing)
+        stable = {k: v for k, v in payload.items() if k != "generationtime_ms"}
+        data = json.dumps(stable, sort_keys=True, default=str).encode()
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def _to_utc(value) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def _end_bound(end) -> tuple[pd.Timestamp, bool]:
+    """Upper issue-time bound and whether it is exclusive.
+
+    A bare date (``"2026-10-18"`` or a `date`) covers that whole day, so the bound
+    becomes the next midnight, exclusive.
+    """
+    bare = (isinstance(end, str) and len(end.strip()) == 10) or (
+        isinstance(end, date) and not isinstance(end, datetime)
+    )
+    if bare:
+        return _to_utc(pd.Timestamp(end) + timedelta(days=1)), True
+    return _to_utc(end), False
+
+
+def _issue_time(issue_time=None) -> pd.Timestamp:
+    return _to_utc(issue_time if issue_time is not None else datetime.now(timezone.utc)).floor("h")
+
+
+def _partition_dir(archive_dir: Path, city: str, model: str, issue: pd.Timestamp) -> Path:
+    return (
+        Path(archive_dir)
+        / f"city={city.lower()}"
+        / f"model={model}"
+        / f"issue_month={issue:%Y-%m}"
+    )
+
+
+def append_run(
+    df_daily: pd.DataFrame,
+    city: str,
+    model: str,
+    payload=None,
+    issue_time=None,
+    archive_dir: str | Path | None = None,
+    digest: str | None = None,
+    utc_offset_seconds: int | None = None,
+) -> Path | None:
+    """Archive one forecast run. Returns the written path, or None for a duplicate.
+
+    The run is deduplicated on `digest`, which defaults to the hash of `payload`
+    (or of the frame itself when no raw payload is given). `lead_day` counts from
+    the issue day on the forecast's local calendar, shifted by
+    `utc_offset_seconds` (default: the payload's own, else 0).
+    """
+    archive_dir = Path(archive_dir or ARCHIVE_DIR)
+    issue = _issue_time(issue_time)
+    if digest is None:
+        digest = payload_hash(payload if payload is not None else df_daily)
+
+    partition = _partition_dir(archive_dir, city, model, issue)
+    if any(partition.glob(f"*_{digest}.parquet")) or digest in _compacted_hashes(partition):
+        return None
+
+    run = df_daily.copy()
+    run["date"] = pd.to_datetime(run["date"])
+    run["city"] = city.lower()
+    run["model"] = model
+    run["issue_time"] = issue
+    if utc_offset_seconds is None:
+        utc_offset_seconds = payload.get("utc_offset_seconds", 0) if isinstance(payload, dict) else 0
+    local_issue_day = (issue + pd.Timedelta(seconds=utc_offset_seconds)).tz_localize(None).normalize()
+    run["lead_day"] = (run["date"] - local_issue_day).dt.days
+    run["payload_hash"] = digest
+
+    partition.mkdir(parents=True, exist_ok=True)
+    path = partition / f"{issue:%Y%m%dT%H%MZ}_{digest}.parquet"
+    tmp_path = path.with_suffix(".parquet.tmp")
+    run.to_parquet(tmp_path, index=False, compression="zstd")
+    tmp_path.replace(path)
+    return path
+
+
+def _compacted_hashes(partition: Path) -> set[str]:
+    path = partition / COMPACTED_NAME
+    if not path.exists():
+        return set()
+    return set(pd.read_parquet(path, columns=["payload_hash"])["payload_hash"])
+
+
+def compact(archive_dir: str | Path | None = None, before_month: str | None = None) -> list[Path]:
+    """Merge each closed month partition's runs into one `compacted.parquet`.
+
+    Months before `before_month` (default: the current UTC month) with more
+    than one file are rewritten; returns the compacted partitions.
+    """
+    archive_dir = Path(archive_dir or ARCHIVE_DIR)
+    before_month = before_month or f"{_issue_time():%Y-%m}"
+    compacted = []
+    for partition in sorted(archive_dir.glob("city=*/model=*/issue_month=*")):
+        if partition.name.split("=", 1)[1] >= before_month:
+            continue
+        files = sorted(partition.glob("*.parquet"))
+        if len(files) < 2:
+            continue
+        runs = pd.concat((pd.read_parquet(path) for path in files), ignore_index=True)
+        runs = runs.sort_values(["issue_time", "date"], kind="stable").reset_index(drop=True)
+        tmp_path = partition / f".{COMPACTED_NAME}.tmp"
+        runs.to_parquet(tmp_path, index=False, compression="zstd")
+        tmp_path.replace(partition / COMPACTED_NAME)
+        for path in files:
+            if path.name != COMPACTED_NAME:
+                path.unlink()
+        compacted.append(partition)
+    return compacted
+
+
+def _matching_files(
+    archive_dir: Path,
+    cities=None,
+    models=None,
+    start=None,
+    end=None,
+    months=None,
+) -> list[Path]:
+    city_dirs = (
+        [archive_dir / f"city={c.lower()}" for c in cities]
+        if cities
+        else sorted(archive_dir.glob("city=*"))
+    )
+    start_month = pd.Timestamp(start).strftime("%Y-%m") if start is not None else None
+    end_month = pd.Timestamp(end).strftime("%Y-%m") if end is not None else None
+
+    files = []
+    for city_dir in city_dirs:
+        model_dirs = (
+            [city_dir / f"model={m}" for m in models]
+            if models
+            else sorted(city_dir.glob("model=*"))
+        )
+        for model_dir in model_dirs:
+            for month_dir in sorted(model_dir.glob("issue_month=*")):
+                month = month_dir.name.split("=", 1)[1]
+                if start_month and month < start_month:
+                    continue
+                if end_month and month > end_month:
+                    continue
+                if months and int(month[5:7]) not in months:
+                    continue
+                files.extend(sorted(month_dir.glob("*.parquet")))
+    return files
+
+
+def load_runs(
+    city: str | list[str] | None = None,
+    model: str | list[str] | None = None,
+    start=None,
+    end=None,
+    months: list[int] | None = None,
+    archive_dir: str | Path | None = None,
+) -> pd.DataFrame:
+    """Load archived runs, reading only partitions that match the filters.
+
+    `start`/`end` bound the issue time (inclusive; a date-only `end` includes
+    that whole day). `issue_time` is the fetch hour in UTC. `months` selects calendar
+    months across all years, e.g. ``load_runs("athens", months=[7])`` for every
+    July run.
+    """
+    archive_dir = Path(archive_dir or ARCHIVE_DIR)
+    cities = [city] if isinstance(city, str) else city
+    models = [model] if isinstance(model, str) else model
+    files = _matching_files(archive_dir, cities, models, start, end, months)
+    if not files:
+        return pd.DataFrame(
+            columns=["date", "tmin", "tmax", "city", "model", "issue_time", "lead_day", "payload_hash"]
+        )
+
+    runs = pd.concat((pd.read_parquet(path) for path in files), ignore_index=True)
+    if start is not None:
+        runs = runs[runs["issue_time"] >= _issue_time(start)]
+    if end is not None:
+        bound, exclusive = _end_bound(end)
+        runs = runs[runs["issue_time"] < bound] if exclusive else runs[runs["issue_time"] <= bound]
+    return runs.reset_index(drop=True)
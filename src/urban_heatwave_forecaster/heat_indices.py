@@ -0,0 +1,126 @@
+"""Vectorized heat-stress indices from hourly Open-Meteo variables.
+
+Every function takes NumPy arrays (or anything `np.asarray` accepts) in the
+units Open-Meteo returns: °C, % relative humidity and km/h wind at 10 m. The
+result is in °C-equivalent, so it can replace temperature as the threshold
+variable in detection and risk scoring.
+
+* ``apparent_temperature`` – Steadman (1994) non-radiative formula as used by
+  the Australian Bureau of Meteorology (temperature, humidity, wind)
+* ``heat_index`` – US NWS Rothfusz regression with its low-humidity and
+  high-humidity adjustments and the simple formula below 80 °F
+* ``humidex`` – Environment Canada humidex
+* ``wbgt`` – approximate shaded wet-bulb globe temperature (BoM formula; no
+  radiation or wind term, so it underestimates WBGT in full sun)
+
+`compute` evaluates any subset in one pass and derives the vapour pressure only
+once. `daily_columns` defines how daily extremes of each variable are named.
+"""
+import numpy as np
+
+TEMPERATURE = "temperature_2m"
+HUMIDITY = "relative_humidity_2m"
+WIND = "wind_speed_10m"
+
+INDEX_INPUTS = {
+    "apparent_temperature": (TEMPERATURE, HUMIDITY, WIND),
+    "heat_index": (TEMPERATURE, HUMIDITY),
+    "humidex": (TEMPERATURE, HUMIDITY),
+    "wbgt": (TEMPERATURE, HUMIDITY),
+}
+INDICES = tuple(INDEX_INPUTS)
+
+
+def daily_columns(variable: str = "temperature") -> tuple[str, str]:
+    """Daily min/max column names for a threshold variable."""
+    if variable == "temperature":
+        return "tmin", "tmax"
+    return f"{variable}_min", f"{variable}_max"
+
+
+def required_inputs(indices) -> list[str]:
+    unknown = [name for name in indices if name not in INDEX_INPUTS]
+    if unknown:
+        raise ValueError(f"Unknown heat-stress index {unknown}; choose from {list(INDICES)}")
+    return list(dict.fromkeys(var for name in indices for var in INDEX_INPUTS[name]))
+
+
+def vapour_pressure(temperature, relative_humidity) -> np.ndarray:
+    """Water vapour pressure in hPa."""
+    t = np.asarray(temperature, dtype=float)
+    rh = np.asarray(relative_humidity, dtype=float)
+    return rh / 100 * 6.105 * np.exp(17.27 * t / (237.7 + t))
+
+
+def apparent_temperature(temperature, relative_humidity, wind_speed_kmh, e=None) -> np.ndarray:
+    t = np.asarray(temperature, dtype=float)
+    e = vapour_pressure(t, relative_humidity) if e is None else e
+    wind_ms = np.asarray(wind_speed_kmh, dtype=float) / 3.6
+    return t + 0.33 * e - 0.70 * wind_ms - 4.00
+
+
+def heat_index(temperature, relative_humidity) -> np.ndarray:
+    t_f = np.asarray(temperature, dtype=float) * 9 / 5 + 32
+    rh = np.asarray(relative_humidity, dtype=float)
+
+    simple = 0.5 * (t_f + 61.0 + (t_f - 68.0) * 1.2 + rh * 0.094)
+    full = (
+        -42.379 + 2.04901523 * t_f + 10.14333127 * rh
+        - 0.22475541 * t_f * rh - 6.83783e-3 * t_f**2 - 5.481717e-2 * rh**2
+        + 1.22874e-3 * t_f**2 * rh + 8.5282e-4 * t_f * rh**2 - 1.99e-6 * t_f**2 * rh**2
+    )
+    with np.errstate(invalid="ignore"):
+        dry = (rh < 13) & (t_f >= 80) & (t_f <= 112)
+        full = np.where(dry, full - (13 - rh) / 4 * np.sqrt((17 - np.abs(t_f - 95)) / 17), full)
+    humid = (rh > 85) & (t_f >= 80) & (t_f <= 87)
+    full = np.where(humid, full + (rh - 85) / 10 * (87 - t_f) / 5, full)
+
+    hi_f = np.where((simple + t_f) / 2 >= 80, full, simple)
+    return (hi_f - 32) * 5 / 9
+
+
+def humidex(temperature, relative_humidity, e=None) -> np.ndarray:
+    t = np.asarray(temperature, dtype=float)
+    e = vapour_pressure(t, relative_humidity) if e is None else e
+    return t + 0.5555 * (e - 10.0)
+
+
+def wbgt(temperature, relative_humidity, e=None) -> np.ndarray:
+    t = np.asarray(temperature, dtype=float)
+    e = vapour_pressure(t, relative_humidity) if e is None else e
+    return 0.567 * t + 0.393 * e + 3.94
+
+
+def compute(hourly: dict, indices) -> dict[str, np.ndarray]:
+    """Evaluate `indices` over hourly arrays keyed by Open-Meteo variable name."""
+    indices = list(dict.fromkeys(indices))
+    missing = [var for var in required_inputs(indices) if var not in hourly]
+    if missing:
+        raise ValueError(f"Hourly data is missing {missing} needed for {indices}")
+    if not indices:
+        return {}
+
+    t = np.asarray(hourly[TEMPERATURE], dtype=float)
+    rh = np.asarray(hourly[HUMIDITY], dtype=float)
+    e = vapour_pressure(t, rh)
+    out = {}
+    for name in indices:
+        if name == "apparent_temperature":
+            out[name] = apparent_temperature(t, rh, hourly[WIND], e=e)
+        elif name == "heat_index":
+            out[name] = heat_index(t, rh)
+        elif name == "humidex":
+            out[name] = humidex(t, rh, e=e)
+        elif name == "wbgt":
+            out[name] = wbgt(t, rh, e=e)
+    return out
+
+
+def daily_aggregations(indices) -> dict[str, tuple[str, str]]:
+    """Named aggregations giving the daily min/max of each index."""
+    aggregations = {}
+    for name in indices:
+        min_col, max_col = daily_columns(name)
+        aggregations[min_col] = (name, "min")
+        aggregations[max_col] = (name, "max")
+    return aggregations
@@ -0,0 +1,258 @@
+"""Per-stage timing, fetch statistics and metric export.
+
+Pipeline functions wrap their work in ``with stage("detect", city=...) as info``
+and may set ``info["rows"]``. Each stage records wall and CPU time, fetches
+record latency, payload size and whether `requests_cache` served them.
+
+Everything lands in the process-wide `METRICS` registry and, when JSON logging
+is enabled, as one structured log line per event. `render_prometheus()` /
+`write_prometheus()` export the registry in the Prometheus text format and
+`serve_metrics()` exposes it over HTTP.
+
+Only the standard library is imported here so the CLI can load it cheaply.
+"""
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+LOGGER = logging.getLogger("urban_heatwave_forecaster.metrics")
+
+_HELP = {
+    "uhf_stage_wall_seconds": ("summary", "Wall-clock time spent per pipeline stage."),
+    "uhf_stage_cpu_seconds": ("summary", "CPU time spent per pipeline stage."),
+    "uhf_rows_processed_total": ("counter", "Rows processed per pipeline stage."),
+    "uhf_fetch_latency_seconds": ("summary", "Latency of Open-Meteo requests."),
+    "uhf_fetch_requests_total": ("counter", "Open-Meteo requests by cache outcome."),
+    "uhf_fetch_bytes_total": ("counter", "Bytes received from Open-Meteo (including cache hits)."),
+    "uhf_fetch_cache_hit_ratio": ("gauge", "Share of Open-Meteo requests served from cache."),
+}
+
+
+class Metrics:
+    """Thread-safe registry of counters and summaries keyed by (name, labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: dict[tuple, float] = defaultdict(float)
+        self.summaries: dict[tuple, list[float]] = defaultdict(lambda: [0, 0.0])
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted(labels.items())))
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        with self._lock:
+            self.counters[self._key(name, labels)] += value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            summary = self.summaries[self._key(name, labels)]
+            summary[0] += 1
+            summary[1] += value
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.summaries.clear()
+
+    def cache_hit_ratio(self) -> float | None:
+        hits = misses = 0.0
+        for (name, labels), value in self.counters.items():
+            if name == "uhf_fetch_requests_total":
+                if dict(labels).get("cache") == "hit":
+                    hits += value
+                else:
+                    misses += value
+        return hits / (hits + misses) if hits + misses else None
+
+    def snapshot(self) -> dict:
+        """Plain-dict view, convenient for JSON reports."""
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "summaries": [
+                    {"name": name, "labels": dict(labels), "count": count, "sum": total}
+                    for (name, labels), (count, total) in sorted(self.summaries.items())
+                ],
+                "cache_hit_ratio": self.cache_hit_ratio(),
+            }
+
+
+METRICS = Metrics()
+
+
+def _emit(event: str, **fields) -> None:
+    LOGGER.info(event, extra={"event": {"event": event, **fields}})
+
+
+@contextmanager
+def stage(name: str, **context):
+    """Time a pipeline stage; set ``info["rows"]`` inside the block to count rows."""
+    info: dict = {}
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    status = "ok"
+    try:
+        yield info
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        METRICS.observe("uhf_stage_wall_seconds", wall, stage=name)
+        METRICS.observe("uhf_stage_cpu_seconds", cpu, stage=name)
+        rows = info.get("rows")
+        if rows is not None:
+            METRICS.inc("uhf_rows_processed_total", rows, stage=name)
+        _emit(
+            "stage",
+            stage=name,
+            status=status,
+            wall_seconds=round(wall, 6),
+            cpu_seconds=round(cpu, 6),
+            **context,
+            **info,
+        )
+
+
+def response_hook(endpoint: str):
+    """`requests` response hook that records every response, cached or not."""
+
+    def hook(response, *args, **kwargs):
+        # requests_cache dispatches hooks again after storing a fresh response
+        if getattr(response, "_uhf_recorded", False):
+            return response
+        response._uhf_recorded = True
+        record_fetch(
+            endpoint,
+            latency=response.elapsed.total_seconds(),
+            n_bytes=len(response.content or b""),
+            from_cache=getattr(response, "from_cache", False),
+            status=response.status_code,
+        )
+        return response
+
+    return hook
+
+
+def record_fetch(endpoint: str, latency: float, n_bytes: int, from_cache: bool, **context) -> None:
+    cache = "hit" if from_cache else "miss"
+    METRICS.observe("uhf_fetch_latency_seconds", latency, endpoint=endpoint, cache=cache)
+    METRICS.inc("uhf_fetch_requests_total", endpoint=endpoint, cache=cache)
+    METRICS.inc("uhf_fetch_bytes_total", n_bytes, endpoint=endpoint)
+    _emit(
+        "fetch",
+        endpoint=endpoint,
+        latency_seconds=round(latency, 6),
+        bytes=n_bytes,
+        cache=cache,
+        **context,
+    )
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; structured `event` payloads are merged in."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        event = getattr(record, "event", None)
+        if event is not None:
+            entry.update(event)
+        else:
+            entry["message"] = record.getMessage()
+        return json.dumps(entry, default=str)
+
+
+def configure_json_logging(level: int = logging.INFO, stream=None) -> logging.Handler:
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    root = logging.getLogger("urban_heatwave_forecaster")
+    root.addHandler(handler)
+    root.setLevel(level)
+    return handler
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def render_prometheus(metrics: Metrics = METRICS) -> str:
+    lines = []
+    seen = set()
+
+    def header(name: str) -> None:
+        if name in seen:
+            return
+        seen.add(name)
+        kind, text = _HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    with metrics._lock:
+        counters = sorted(metrics.counters.items())
+        summaries = sorted(metrics.summaries.items())
+    for (name, labels), (count, total) in summaries:
+        header(name)
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    for (name, labels), value in counters:
+        header(name)
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    ratio = metrics.cache_hit_ratio()
+    if ratio is not None:
+        header("uhf_fetch_cache_hit_ratio")
+        lines.append(f"uhf_fetch_cache_hit_ratio {ratio:.6f}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str | Path, metrics: Metrics = METRICS) -> Path:
+    """Write a node-exporter style textfile atomically."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(render_prometheus(metrics))
+    tmp_path.replace(path)
+    return path
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # noqa: A002 - signature from BaseHTTPRequestHandler
+        pass
+
+
+def serve_metrics(port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Expose `/metrics` from a daemon thread; returns the running server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
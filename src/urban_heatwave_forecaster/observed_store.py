@@ -0,0 +1,104 @@
+"""Rolling local store of recent observed (analysed) days per city.
+
+The forecast only starts today, so a heatwave that began two days ago looks
+shorter than it is. This store keeps the last `KEEP_DAYS` complete days per
+city in `data/observed/<city>.parquet`. They come from the forecast API's
+`past_days` hours, which are the model's analysis rather than a forecast.
+
+`update_store` only asks for the days after the newest stored one, so a daily
+run fetches a single past day and a rerun on the same day fetches nothing. A
+store that does not reach back `keep_days` (e.g. after raising it) is refilled
+whole.
+`detect_heatwaves.detect_heatwaves_stitched` joins the store to the forecast
+before run-length detection.
+"""
+import logging
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from . import data_fetcher, recorder
+from .instrumentation import stage
+
+STORE_DIR = data_fetcher.PROJECT_ROOT / "data" / "observed"
+KEEP_DAYS = 30
+MAX_PAST_DAYS = 92  # Open-Meteo forecast API limit for past_days
+COLUMNS = ["date", "tmin", "tmax", "city"]
+LOGGER = logging.getLogger(__name__)
+
+
+def store_path(city: str, store_dir: str | Path | None = None) -> Path:
+    return Path(store_dir or STORE_DIR) / f"{city.lower()}.parquet"
+
+
+def load_store(city: str, store_dir: str | Path | None = None) -> pd.DataFrame:
+    """Stored observed days for `city`, oldest first (empty if none yet)."""
+    path = store_path(city, store_dir)
+    if not path.exists():
+        return pd.DataFrame(columns=COLUMNS)
+    df = pd.read_parquet(path)
+    df["date"] = pd.to_datetime(df["date"]).dt.date
+    return df
+
+
+def days_to_fetch(stored: pd.DataFrame, keep_days: int = KEEP_DAYS, today: date | None = None) -> int:
+    """`past_days` needed to fill the store from `today - keep_days` to yesterday (0 when current)."""
+    today = today or recorder.today()
+    first_wanted = today - timedelta(days=keep_days)
+    if not stored.empty and min(stored["date"]) <= first_wanted:
+        first_wanted = max(first_wanted, max(stored["date"]) + timedelta(days=1))
+    return max((today - first_wanted).days, 0)
+
+
+def update_store(
+    city: str,
+    lat: float,
+    lon: float,
+    keep_days: int = KEEP_DAYS,
+    model: str = "ecmwf_ifs025",
+    store_dir: str | Path | None = None,
+    today: date | None = None,
+) -> pd.DataFrame:
+    """Append the days missing since the last update and trim to `keep_days`."""
+    if not 0 < keep_days <= MAX_PAST_DAYS:
+        raise ValueError(f"keep_days must be between 1 and {MAX_PAST_DAYS}")
+    today = today or recorder.today()
+    stored = load_store(city, store_dir)
+    past_days = days_to_fetch(stored, keep_days, today)
+    if not past_days:
+        return stored
+
+    params = data_fetcher._forecast_params(
+        lat, lon, model=model, forecast_days=1, past_days=past_days
+    )
+    with stage("fetch", city=city.lower(), model=f"{model}:past"):
+        payload = data_fetcher._fetch_forecast_payload(
+            data_fetcher.api_url("forecast"), params, model=model
+        )
+    hourly = payload["hourly"]
+    fresh = data_fetcher._daily_frame_from_hourly(
+        {"time": hourly["time"], "temperature_2m": hourly["temperature_2m"]},
+        city_name=city,
+        keep_past=True,
+    )
+    # only complete days; today is still partly forecast
+    fresh = fresh[fresh["date"] < today]
+
+    frames = [stored, fresh[COLUMNS]] if not stored.empty else [fresh[COLUMNS]]
+    combined = (
+        pd.concat(frames, ignore_index=True)
+        .drop_duplicates("date", keep="last")
+        .sort_values("date")
+    )
+    combined = combined[combined["date"] >= today - timedelta(days=keep_days)]
+    combined = combined.reset_index(drop=True)
+
+    path = store_path(city, store_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".parquet.tmp")
+    combined.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    LOGGER.info("Stored %d new observed days for %s", len(fresh), city)
+    return combined
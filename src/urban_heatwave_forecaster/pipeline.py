@@ -0,0 +1,263 @@
+"""Make-style incremental runs of the per-city pipeline stages.
+
+Stages form a small dependency graph over the files the single-stage commands
+already use::
+
+    history ──> climatology ──┐
+                              ├──> detect ──> assess
+    fetch ────────────────────┘
+
+For every (stage, city) output, `data/.pipeline/state.json` records a hash of
+the stage parameters and a content hash of each input file when it was built.
+An output is rebuilt only when it is missing, its parameters changed or an
+input's content changed. Content hashes (not mtimes) mean a refetch that returns
+the same forecast leaves detection and assessment untouched.
+
+`fetch` and `history` read from the API rather than from files. A forecast is
+keyed on the forecast day (`recorder.today()`), so it is refetched once per day.
+History is fetched once per span. Stages not selected in a run are treated as
+sources: their outputs must already exist and are only fingerprinted. A stage
+with no inputs left (e.g. a committed climatology without its history file)
+keeps its existing output.
+"""
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+from . import data_fetcher, recorder
+
+PROJECT_ROOT = data_fetcher.PROJECT_ROOT
+RAW_DIR = data_fetcher.DATA_DIR
+PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
+STATE_PATH = PROJECT_ROOT / "data" / ".pipeline" / "state.json"
+VULNERABILITY_PATH = RAW_DIR / "urban_vulnerability.csv"
+DEFAULT_STAGES = ("fetch", "climatology", "detect", "assess")
+LOGGER = logging.getLogger(__name__)
+
+
+class StageError(RuntimeError):
+    """A stage cannot run for a city (e.g. a missing input it cannot rebuild)."""
+
+
+@dataclass
+class Options:
+    min_run: int = 3
+    period: str | None = None
+    force: bool = False
+
+    def __post_init__(self):
+        if self.period:
+            from . import climate_normals
+
+            # "recent30" names the file by its years, as `uhf climatology` does
+            self.period = climate_normals.period_label(self.period)
+
+
+def _climatology_path(city: str, options: Options) -> Path:
+    if options.period:
+        return PROCESSED_DIR / f"{city}_climatology_{options.period}.csv"
+    return PROCESSED_DIR / f"{city}_climatology_95p.csv"
+
+
+def _history_path(city: str, options: Options) -> Path:
+    return RAW_DIR / f"{city}_historical.csv"
+
+
+def _forecast_path(city: str, options: Options) -> Path:
+    return RAW_DIR / f"{city}_forecast.csv"
+
+
+def _detected_path(city: str, options: Options) -> Path:
+    return PROCESSED_DIR / f"{city}_forecast_with_heatwaves.csv"
+
+
+def _risk_path(city: str, options: Options) -> Path:
+    return PROCESSED_DIR / f"{city}_heatwave_risk.csv"
+
+
+def _run_history(city, coords, options, output):
+    from . import climate_normals, fetch_historical
+
+    periods = (options.period,) if options.period else (climate_normals.DEFAULT_PERIOD,)
+    fetch_historical.fetch_historical_data(*coords, city, save_path=output, periods=periods)
+
+
+def _run_fetch(city, coords, options, output):
+    data_fetcher.fetch_ecmwf_forecast(*coords, city, save_path=output)
+
+
+def _run_climatology(city, coords, options, output):
+    from . import climate_normals
+
+    history = _history_path(city, options)
+    if options.period:
+        _, climatology = climate_normals.YearDoyArray.from_csv(history).climatology(options.period)
+        climatology.to_csv(output, index=False)
+    else:
+        climate_normals.build_percentile_climatology(city, input_path=history, output_path=output)
+
+
+def _run_detect(city, coords, options, output):
+    from . import detect_heatwaves
+
+    df = detect_heatwaves.detect_heatwaves(
+        _forecast_path(city, options), _climatology_path(city, options), min_run=options.min_run
+    )
+    df.to_csv(output, index=False)
+
+
+def _run_assess(city, coords, options, output):
+    from . import risk_model
+
+    detected = pd.read_csv(_detected_path(city, options))
+    detected["is_hot"] = detected["exceeds_95p"]
+    risk = risk_model.assess_heatwave_risk(detected, pd.read_csv(VULNERABILITY_PATH))
+    risk.to_csv(output, index=False)
+
+
+@dataclass
+class Stage:
+    name: str
+    output: Callable[[str, Options], Path]
+    run: Callable
+    deps: tuple[str, ...] = ()
+    # files read besides the dependencies' outputs
+    extra_inputs: Callable[[str, Options], list[Path]] = lambda city, options: []
+    params: Callable[[str, Options], dict] = lambda city, options: {}
+
+
+STAGES = {
+    stage.name: stage
+    for stage in (
+        Stage("history", _history_path, _run_history,
+              params=lambda city, o: {"period": o.period}),
+        Stage("fetch", _forecast_path, _run_fetch,
+              params=lambda city, o: {"day": recorder.today().isoformat()}),
+        Stage("climatology", _climatology_path, _run_climatology, deps=("history",),
+              params=lambda city, o: {"period": o.period}),
+        Stage("detect", _detected_path, _run_detect, deps=("fetch", "climatology"),
+              params=lambda city, o: {"min_run": o.min_run, "period": o.period}),
+        Stage("assess", _risk_path, _run_assess, deps=("detect",),
+              extra_inputs=lambda city, o: [VULNERABILITY_PATH]),
+    )
+}
+
+
+def parse_stages(stages) -> list[str]:
+    """Stage names from ``["fetch,detect", "assess"]``, in dependency order."""
+    names = [name.strip() for item in stages for name in str(item).split(",") if name.strip()]
+    unknown = [name for name in names if name not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stage(s) {unknown}; choose from {list(STAGES)}")
+    return [name for name in STAGES if name in names]
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def _params_hash(params: dict) -> str:
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def load_state(path: str | Path | None = None) -> dict:
+    path = Path(path or STATE_PATH)
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def save_state(state: dict, path: str | Path | None = None) -> None:
+    path = Path(path or STATE_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(state, indent=1, sort_keys=True) + "\n")
+    os.replace(tmp_path, path)
+
+
+@dataclass
+class Outcome:
+    city: str
+    stage: str
+    status: str  # "built", "up-to-date", "kept" or "failed"
+    reason: str = ""
+
+
+@dataclass
+class Pipeline:
+    coords: dict[str, tuple[float, float]]
+    options: Options = field(default_factory=Options)
+    state_path: str | Path | None = None
+
+    def inputs(self, stage: Stage, city: str) -> list[Path]:
+        paths = [STAGES[dep].output(city, self.options) for dep in stage.deps]
+        return paths + list(stage.extra_inputs(city, self.options))
+
+    def stale_reason(self, stage: Stage, city: str, record: dict | None) -> str | None:
+        """Why the output must be rebuilt, or None when it is up to date."""
+        if not stage.output(city, self.options).exists():
+            return "missing output"
+        if self.options.force:
+            return "forced"
+        if record is None:
+            return "no build record"
+        if record["params"] != _params_hash(stage.params(city, self.options)):
+            return "parameters changed"
+        for path in self.inputs(stage, city):
+            if record["inputs"].get(str(path)) != (file_hash(path) if path.exists() else None):
+                return f"{path.name} changed"
+        return None
+
+    def _build(self, stage: Stage, city: str, state: dict) -> Outcome:
+        output = stage.output(city, self.options)
+        key = f"{stage.name}:{city}"
+        reason = self.stale_reason(stage, city, state.get(key))
+        if reason is None:
+            return Outcome(city, stage.name, "up-to-date")
+
+        inputs = self.inputs(stage, city)
+        missing = [path for path in inputs if not path.exists()]
+        if missing and output.exists():
+            # nothing to rebuild from; keep what is there (e.g. a committed climatology)
+            return Outcome(city, stage.name, "kept", f"no {missing[0].name}")
+        if missing:
+            needed = [dep for dep in stage.deps if not STAGES[dep].output(city, self.options).exists()]
+            hint = f"; add {', '.join(needed)} to --stages" if needed else ""
+            raise StageError(f"missing {', '.join(p.name for p in missing)}{hint}")
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        stage.run(city, self.coords[city], self.options, output)
+        state[key] = {
+            "params": _params_hash(stage.params(city, self.options)),
+            "inputs": {str(path): file_hash(path) for path in inputs},
+            "output": file_hash(output),
+        }
+        return Outcome(city, stage.name, "built", reason)
+
+    def run(self, stages=DEFAULT_STAGES, cities=None) -> list[Outcome]:
+        """Bring the outputs of `stages` up to date for `cities`, in dependency order.
+
+        A failed stage skips the later stages of that city only; other cities go on.
+        """
+        names = parse_stages(stages)
+        state = load_state(self.state_path)
+        outcomes = []
+        for city in cities or sorted(self.coords):
+            for name in names:
+                try:
+                    outcome = self._build(STAGES[name], city, state)
+                except Exception as exc:
+                    LOGGER.warning("%s failed for %s: %s", name, city, exc)
+                    outcomes.append(Outcome(city, name, "failed", str(exc)))
+                    break
+                outcomes.append(outcome)
+            save_state(state, self.state_path)
+        return outcomes
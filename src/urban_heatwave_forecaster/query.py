@@ -0,0 +1,165 @@
+"""SQL over the pipeline outputs, in place, with DuckDB.
+
+`connect()` returns an in-memory DuckDB connection with one view per output
+family. Views read the CSV and Parquet files where they are, so nothing is
+loaded until a query runs. Filters on partition columns (`city`, `model`,
+`issue_month`) prune whole directories of the forecast archive, and other
+filters are pushed down into the Parquet readers.
+
+==================  ===========================================================
+``risk``            `data/processed/<city>_heatwave_risk.csv` (``uhf assess``)
+``risk_by_city``    days per risk level, worst level and first High+ day per city
+``events``          one row per heatwave event in ``risk``
+``forecast_runs``   every archived forecast run (`data/archive/forecasts/`)
+``bundle_risk``     enriched risk frame of the newest bundle per city
+``probabilities``   multi-model ensemble probabilities of the newest bundles
+                    (both views lead with the bundle's `city` and `bundle_version`)
+``district_risk``   `data/processed/<city>_district_risk.parquet`
+==================  ===========================================================
+
+Views whose files do not exist yet are skipped. DuckDB is optional:
+``pip install 'urban-heatwave-forecaster[query]'``.
+"""
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+DATA_DIR = PROJECT_ROOT / "data"
+# <city>/<version>/<frame>.parquet; skips `.<version>.tmp` directories still being written
+BUNDLE_FILE = r"/([^/]+)/(\d{8}T\d{6}Z)/[a-z_]+\.parquet$"
+
+VIEWS = {
+    "risk": "Per-day risk rows from `uhf assess` for every city",
+    "risk_by_city": "Days per risk level, worst level and first High+ day per city",
+    "events": "One row per heatwave event: city, start, end, days, peak Tmax, worst risk",
+    "forecast_runs": "Every archived forecast run, partitioned by city, model and issue month",
+    "bundle_risk": "Enriched risk frame of the newest bundle per city",
+    "probabilities": "Ensemble heatwave and risk probabilities of the newest bundle per city",
+    "district_risk": "Per-district risk rows from `uhf assess --districts`",
+}
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError as exc:
+        raise RuntimeError(
+            "SQL queries need DuckDB: pip install 'urban-heatwave-forecaster[query]'"
+        ) from exc
+    return duckdb
+
+
+def _sql_path(path: Path) -> str:
+    return str(path).replace("'", "''")
+
+
+def _latest_bundle_view(name: str, frame: str, bundle_dir: Path) -> str:
+    pattern = _sql_path(bundle_dir / "*" / "*" / f"{frame}.parquet")
+    return f"""
+        CREATE VIEW {name} AS
+        SELECT
+            bundle_city AS city,
+            bundle_version,
+            COLUMNS(c -> c NOT IN ('filename', 'bundle_city', 'bundle_version', 'city'))
+        FROM (
+            SELECT
+                *,
+                regexp_extract(filename, '{BUNDLE_FILE}', 1) AS bundle_city,
+                regexp_extract(filename, '{BUNDLE_FILE}', 2) AS bundle_version
+            FROM read_parquet('{pattern}', filename = true, union_by_name = true)
+            WHERE regexp_matches(filename, '{BUNDLE_FILE}')
+            QUALIFY bundle_version = max(bundle_version) OVER (PARTITION BY bundle_city)
+        )
+    """
+
+
+def view_statements(data_dir: str | Path | None = None) -> dict[str, str]:
+    """`CREATE VIEW` statements for every view whose input files exist."""
+    data_dir = Path(data_dir or DATA_DIR)
+    processed = data_dir / "processed"
+    archive = data_dir / "archive" / "forecasts"
+    bundles = data_dir / "bundles"
+    statements = {}
+
+    if any(processed.glob("*_heatwave_risk.csv")):
+        pattern = _sql_path(processed / "*_heatwave_risk.csv")
+        statements["risk"] = f"""
+            CREATE VIEW risk AS
+            SELECT * FROM read_csv('{pattern}', union_by_name = true, header = true)
+        """
+        statements["risk_by_city"] = """
+            CREATE VIEW risk_by_city AS
+            SELECT
+                city,
+                count(*) AS days,
+                count(*) FILTER (risk_level = 'None') AS none_days,
+                count(*) FILTER (risk_level = 'Mild') AS mild_days,
+                count(*) FILTER (risk_level = 'Moderate') AS moderate_days,
+                count(*) FILTER (risk_level = 'High') AS high_days,
+                count(*) FILTER (risk_level = 'Extreme') AS extreme_days,
+                ['None', 'Mild', 'Moderate', 'High', 'Extreme'][
+                    max(list_position(['None', 'Mild', 'Moderate', 'High', 'Extreme'], risk_level))
+                ] AS max_risk_level,
+                min(date) FILTER (risk_level IN ('High', 'Extreme')) AS first_high_day
+            FROM risk
+            GROUP BY city
+        """
+        statements["events"] = """
+            CREATE VIEW events AS
+            SELECT
+                city,
+                heatwave_id,
+                min(date) AS start_date,
+                max(date) AS end_date,
+                count(*) AS days,
+                max(tmax) AS peak_tmax,
+                ['None', 'Mild', 'Moderate', 'High', 'Extreme'][
+                    max(list_position(['None', 'Mild', 'Moderate', 'High', 'Extreme'], risk_level))
+                ] AS max_risk_level
+            FROM risk
+            WHERE heatwave_id IS NOT NULL
+            GROUP BY city, heatwave_id
+        """
+
+    if any(archive.glob("city=*/model=*/issue_month=*/*.parquet")):
+        pattern = _sql_path(archive / "*" / "*" / "*" / "*.parquet")
+        # city and model are stored in the files too; the partition columns win
+        statements["forecast_runs"] = f"""
+            CREATE VIEW forecast_runs AS
+            SELECT * FROM read_parquet(
+                '{pattern}', hive_partitioning = true, union_by_name = true
+            )
+        """
+
+    if any(bundles.glob("*/*/risk.parquet")):
+        statements["bundle_risk"] = _latest_bundle_view("bundle_risk", "risk", bundles)
+    if any(bundles.glob("*/*/probabilities.parquet")):
+        statements["probabilities"] = _latest_bundle_view("probabilities", "probabilities", bundles)
+
+    if any(processed.glob("*_district_risk.parquet")):
+        pattern = _sql_path(processed / "*_district_risk.parquet")
+        statements["district_risk"] = f"""
+            CREATE VIEW district_risk AS SELECT * FROM read_parquet('{pattern}', union_by_name = true)
+        """
+    return statements
+
+
+def connect(data_dir: str | Path | None = None):
+    """In-memory DuckDB connection with the output views registered."""
+    con = _duckdb().connect(":memory:")
+    for statement in view_statements(data_dir).values():
+        con.execute(statement)
+    return con
+
+
+def available_views(con) -> list[str]:
+    names = {row[0] for row in con.execute("SELECT view_name FROM duckdb_views() WHERE NOT internal").fetchall()}
+    return [name for name in VIEWS if name in names]
+
+
+def query(sql: str, data_dir: str | Path | None = None):
+    """Run `sql` against the output views and return a DataFrame."""
+    con = connect(data_dir)
+    try:
+        return con.execute(sql).df()
+    finally:
+        con.close()
@@ -0,0 +1,222 @@
+"""Record raw Open-Meteo responses and replay them without the network.
+
+A recording is a directory::
+
+    data/recordings/2025-07-14/
+        manifest.json
+        payloads/<sha256>.zst
+
+Every successful response body is stored once, zstd-compressed and named after
+its SHA-256, so identical payloads within a run share one file. The manifest
+maps each request (endpoint path plus sorted query, so the host does not
+matter) to its payload and records the date the run was made.
+
+In replay mode `replay_session()` returns a session that answers each request
+from the recording and raises `ReplayMissError` for anything that was not
+recorded, so nothing ever reaches the network. `today()` returns the recorded
+date, so day filtering (and therefore every output frame) matches the original
+run. Replayed forecasts are not appended to the forecast archive again.
+
+Recording is switched on with `start(run_dir, "record")`, the `--record` /
+`--replay` CLI options or the `UHF_RECORD_DIR` / `UHF_REPLAY_DIR` environment
+variables.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+MANIFEST_FORMAT = 1
+RECORDINGS_DIR = Path("data/recordings")
+LOGGER = logging.getLogger(__name__)
+
+_active = None
+_env_checked = False
+
+
+class ReplayMissError(RuntimeError):
+    """A request was made in replay mode that the recording does not contain."""
+
+
+def request_key(url: str, params=None) -> str:
+    """Endpoint path plus sorted query string, e.g. ``/v1/forecast?hourly=...``."""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    for name, value in (params or {}).items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        query.extend((name, str(v)) for v in values)
+    return f"{parts.path}?{urlencode(sorted(query))}"
+
+
+def _codec():
+    import pyarrow as pa
+
+    return pa.Codec("zstd")
+
+
+class Recording:
+    def __init__(self, run_dir: str | Path, mode: str):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Recording mode must be 'record' or 'replay', got {mode!r}")
+        self.run_dir = Path(run_dir)
+        self.mode = mode
+        self.manifest_path = self.run_dir / "manifest.json"
+        self._lock = threading.Lock()
+        if self.manifest_path.exists():
+            self.manifest = json.loads(self.manifest_path.read_text())
+        elif mode == "replay":
+            raise FileNotFoundError(f"No recording at {self.run_dir} (missing manifest.json)")
+        else:
+            self.manifest = {
+                "format": MANIFEST_FORMAT,
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "recorded_on": date.today().isoformat(),
+                "entries": {},
+            }
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @property
+    def recorded_on(self) -> date:
+        return date.fromisoformat(self.manifest["recorded_on"])
+
+    def save(self, url: str, content: bytes, content_type: str = "") -> str:
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.run_dir / "payloads" / f"{digest}.zst"
+        with self._lock:
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(".tmp")
+                tmp_path.write_bytes(_codec().compress(content, asbytes=True))
+                os.replace(tmp_path, path)
+            self.manifest["entries"][request_key(url)] = {
+                "sha256": digest,
+                "size": len(content),
+                "content_type": content_type,
+            }
+            self._write_manifest()
+        return digest
+
+    def load(self, url: str, params=None) -> tuple[bytes, str]:
+        key = request_key(url, params)
+        entry = self.manifest["entries"].get(key)
+        if entry is None:
+            raise ReplayMissError(f"Request not in recording {self.run_dir}: {key}")
+        compressed = (self.run_dir / "payloads" / f"{entry['sha256']}.zst").read_bytes()
+        content = _codec().decompress(compressed, decompressed_size=entry["size"], asbytes=True)
+        if hashlib.sha256(content).hexdigest() != entry["sha256"]:
+            raise ReplayMissError(f"Recorded payload for {key} is corrupt")
+        return content, entry["content_type"]
+
+    def _write_manifest(self) -> None:
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.manifest, indent=2, sort_keys=True) + "\n")
+        os.replace(tmp_path, self.manifest_path)
+
+    def response_hook(self, response, *args, **kwargs):
+        """`requests` response hook that records successful responses."""
+        if self.mode == "record" and response.status_code == 200:
+            self.save(response.url, response.content, response.headers.get("Content-Type", ""))
+        return response
+
+
+class ReplayResponse:
+    """Just enough of `requests.Response` for the fetch paths."""
+
+    status_code = 200
+    from_cache = True
+    elapsed = timedelta(0)
+
+    def __init__(self, url: str, content: bytes, content_type: str):
+        self.url = url
+        self.content = content
+        self.headers = {"Content-Type": content_type}
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        return None
+
+
+class ReplaySession:
+    def __init__(self, recording: Recording):
+        self.recording = recording
+        self.hooks = {"response": []}
+
+    def get(self, url, params=None, **kwargs) -> ReplayResponse:
+        content, content_type = self.recording.load(url, params)
+        return ReplayResponse(url, content, content_type)
+
+    def close(self) -> None:
+        return None
+
+
+def start(run_dir: str | Path, mode: str) -> Recording:
+    global _active
+    _active = Recording(run_dir, mode)
+    LOGGER.info("%s Open-Meteo payloads in %s", mode.title(), _active.run_dir)
+    return _active
+
+
+def stop() -> None:
+    global _active
+    _active = None
+
+
+@contextmanager
+def recording(run_dir: str | Path, mode: str):
+    previous = _active
+    try:
+        yield start(run_dir, mode)
+    finally:
+        globals()["_active"] = previous
+
+
+def active() -> Recording | None:
+    """The current recording, starting one from the environment on first use."""
+    global _env_checked
+    if _active is None and not _env_checked:
+        _env_checked = True
+        if os.environ.get("UHF_REPLAY_DIR"):
+            start(os.environ["UHF_REPLAY_DIR"], "replay")
+        elif os.environ.get("UHF_RECORD_DIR"):
+            start(os.environ["UHF_RECORD_DIR"], "record")
+    return _active
+
+
+def replaying() -> bool:
+    rec = active()
+    return rec is not None and rec.replaying
+
+
+def replay_session() -> ReplaySession | None:
+    """A network-free session when replaying, else None."""
+    rec = active()
+    return ReplaySession(rec) if rec is not None and rec.replaying else None
+
+
+def attach(session):
+    """Record `session`'s responses when a recording is active."""
+    rec = active()
+    if rec is not None and not rec.replaying:
+        session.hooks["response"].append(rec.response_hook)
+    return session
+
+
+def today() -> date:
+    """Today, or the recording date while replaying."""
+    rec = active()
+    return rec.recorded_on if rec is not None and rec.replaying else date.today()
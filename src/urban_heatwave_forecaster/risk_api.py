@@ -0,0 +1,341 @@
+"""Local HTTP/JSON API over the precomputed result bundles.
+
+Endpoints (GET or HEAD):
+
+    /risk?city=athens            daily forecast, thresholds and risk levels
+    /probabilities?city=athens   multi-model risk probabilities per day
+    /events?from=2025-07-01&to=2025-07-31
+                                 heatwave events (all cities) overlapping the range
+    /cities                      cities served and their bundle versions
+    /healthz                     snapshot version and age
+
+Responses are rendered once per snapshot from the latest `uhf bundle` output
+and held in memory as encoded bytes with a strong ETag. Requests carrying a
+matching ``If-None-Match`` get ``304 Not Modified``. The pipeline never runs
+per request. A background task polls the bundle directory and swaps in a new
+snapshot when a newer bundle version appears.
+
+The server is a small HTTP/1.1 keep-alive implementation on asyncio streams
+(standard library only). Start it with ``uhf serve``.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from . import bundles
+
+LOGGER = logging.getLogger(__name__)
+MAX_HEADER_BYTES = 16 * 1024
+EVENTS_CACHE_SIZE = 1024
+RISK_COLUMNS = [
+    "date", "tmin", "tmax", "tmin_95p", "tmax_95p", "exceeds_95p", "heatwave_id",
+    "base_risk_level", "risk_level", "risk_escalated",
+]
+_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass(frozen=True)
+class Resource:
+    body: bytes
+    etag: str
+
+    @classmethod
+    def from_payload(cls, payload) -> "Resource":
+        body = json.dumps(payload, separators=(",", ":"), default=str).encode()
+        return cls(body=body, etag='"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"')
+
+
+def _records(df) -> list[dict]:
+    out = df.copy()
+    for column in out.columns:
+        if str(out[column].dtype).startswith("datetime"):
+            out[column] = out[column].dt.strftime("%Y-%m-%d")
+    out = out.astype(object).where(out.notna(), None)
+    return out.to_dict("records")
+
+
+def _events_from_bundle(bundle: bundles.Bundle) -> list[dict]:
+    risk = bundle.risk
+    events = []
+    for heatwave_id, group in risk[risk["heatwave_id"].notna()].groupby("heatwave_id"):
+        events.append({
+            "city": bundle.city,
+            "heatwave_id": int(heatwave_id),
+            "start": group["date"].min().date().isoformat(),
+            "end": group["date"].max().date().isoformat(),
+            "days": len(group),
+            "peak_tmax": float(group["tmax"].max()),
+            "max_risk_level": bundles.RISK_ORDER[int(group["adjusted_risk_score"].max())],
+            "bundle_version": bundle.version,
+        })
+    return events
+
+
+@dataclass
+class Snapshot:
+    """Pre-rendered responses for one set of bundle versions."""
+
+    versions: dict[str, str]
+    created: float = field(default_factory=time.time)
+    risk: dict[str, Resource] = field(default_factory=dict)
+    probabilities: dict[str, Resource] = field(default_factory=dict)
+    events: list[dict] = field(default_factory=list)
+    cities: Resource | None = None
+    _events_cache: dict[tuple, Resource] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, city_bundles: dict[str, bundles.Bundle]) -> "Snapshot":
+        snapshot = cls(versions={city: b.version for city, b in city_bundles.items()})
+        for city, bundle in city_bundles.items():
+            meta = {
+                "city": city,
+                "bundle_version": bundle.version,
+                "created_at": bundle.manifest["created_at"],
+            }
+            columns = [column for column in RISK_COLUMNS if column in bundle.risk.columns]
+            snapshot.risk[city] = Resource.from_payload(
+                {**meta, "days": _records(bundle.risk[columns])}
+            )
+            probabilities = bundle.probabilities.join(bundle.risk_probs, how="left")
+            snapshot.probabilities[city] = Resource.from_payload(
+                {**meta, "models": bundle.models, "days": _records(probabilities.reset_index())}
+            )
+            snapshot.events.extend(_events_from_bundle(bundle))
+        snapshot.events.sort(key=lambda event: (event["start"], event["city"]))
+        snapshot.cities = Resource.from_payload({
+            "cities": [
+                {"city": city, "bundle_version": b.version, "created_at": b.manifest["created_at"]}
+                for city, b in sorted(city_bundles.items())
+            ]
+        })
+        return snapshot
+
+    def events_between(self, start: date | None, end: date | None) -> Resource:
+        key = (start, end)
+        resource = self._events_cache.get(key)
+        if resource is None:
+            lo = start.isoformat() if start else ""
+            hi = end.isoformat() if end else "9999-12-31"
+            matching = [e for e in self.events if e["start"] <= hi and e["end"] >= lo]
+            resource = Resource.from_payload({
+                "from": lo or None,
+                "to": end.isoformat() if end else None,
+                "events": matching,
+            })
+            if len(self._events_cache) >= EVENTS_CACHE_SIZE:
+                self._events_cache.clear()
+            self._events_cache[key] = resource
+        return resource
+
+
+class RiskService:
+    """Holds the current snapshot and rebuilds it when bundles change."""
+
+    def __init__(self, cities: list[str] | None = None, bundle_dir: str | Path | None = None):
+        self.bundle_dir = Path(bundle_dir or bundles.BUNDLE_DIR)
+        self.cities = [city.strip().lower() for city in cities] if cities else None
+        self.snapshot: Snapshot | None = None
+
+    def _city_names(self) -> list[str]:
+        if self.cities is not None:
+            return self.cities
+        if not self.bundle_dir.exists():
+            return []
+        return sorted(path.name for path in self.bundle_dir.iterdir() if path.is_dir())
+
+    def latest_versions(self) -> dict[str, str]:
+        versions = {}
+        for city in self._city_names():
+            paths = bundles.list_versions(city, self.bundle_dir)
+            if paths:
+                versions[city] = paths[-1].name
+        return versions
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rebuild the snapshot if any city has a newer bundle; returns True on swap."""
+        versions = self.latest_versions()
+        if not force and self.snapshot is not None and versions == self.snapshot.versions:
+            return False
+        loaded = {}
+        for city in versions:
+            bundle = bundles.load_latest_bundle(city, self.bundle_dir)
+            if bundle is not None:
+                loaded[city] = bundle
+        # A single reference swap: in-flight requests keep the snapshot they started with
+        self.snapshot = Snapshot.build(loaded)
+        LOGGER.info("Loaded risk API snapshot %s", self.snapshot.versions)
+        return True
+
+    async def refresh_forever(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception:  # keep serving the previous snapshot
+                LOGGER.exception("Risk API snapshot refresh failed")
+
+    def _city_resource(self, table: dict[str, Resource], query: dict) -> Resource:
+        city = (query.get("city") or [""])[0].strip().lower()
+        if not city:
+            raise ApiError(400, "Missing required query parameter: city")
+        if city not in table:
+            raise ApiError(404, f"No precomputed results for city: {city}")
+        return table[city]
+
+    def resolve(self, path: str, query: dict) -> Resource:
+        snapshot = self.snapshot
+        if path == "/healthz":
+            return Resource.from_payload({
+                "status": "ok" if snapshot else "loading",
+                "versions": snapshot.versions if snapshot else {},
+                "snapshot_age_seconds": round(time.time() - snapshot.created, 1) if snapshot else None,
+            })
+        if snapshot is None:
+            raise ApiError(503, "No snapshot loaded yet")
+        if path == "/risk":
+            return self._city_resource(snapshot.risk, query)
+        if path == "/probabilities":
+            return self._city_resource(snapshot.probabilities, query)
+        if path == "/events":
+            return snapshot.events_between(_parse_date(query, "from"), _parse_date(query, "to"))
+        if path == "/cities":
+            return snapshot.cities
+        raise ApiError(404, f"Unknown endpoint: {path}")
+
+
+def _parse_date(query: dict, name: str) -> date | None:
+    value = (query.get(name) or [""])[0]
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ApiError(400, f"Invalid '{name}' date (expected YYYY-MM-DD): {value}") from None
+
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _response(status: int, body: bytes = b"", etag: str | None = None,
+              keep_alive: bool = True, head: bool = False) -> bytes:
+    lines = [
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(body) if status != 304 else 0}",
+        "Cache-Control: no-cache",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if etag:
+        lines.append(f"ETag: {etag}")
+    head_bytes = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+    if status == 304 or head:
+        return head_bytes
+    return head_bytes + body
+
+
+async def _handle_connection(service: RiskService, reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            try:
+                raw = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            except asyncio.LimitOverrunError:
+                writer.write(_response(400, b'{"error":"Headers too large"}', keep_alive=False))
+                return
+
+            request_line, *header_lines = raw.decode("latin-1").split("\r\n")
+            try:
+                method, target, version = request_line.split(" ", 2)
+            except ValueError:
+                writer.write(_response(400, b'{"error":"Malformed request line"}', keep_alive=False))
+                return
+            headers = {}
+            for line in header_lines:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+            try:
+                length = int(headers.get("content-length", "0") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                writer.write(_response(400, b'{"error":"Invalid Content-Length"}', keep_alive=False))
+                return
+            if length:
+                await reader.readexactly(length)
+
+            if method not in ("GET", "HEAD"):
+                writer.write(_response(405, b'{"error":"Only GET and HEAD are supported"}',
+                                       keep_alive=keep_alive))
+            else:
+                parts = urlsplit(target)
+                try:
+                    resource = service.resolve(parts.path, parse_qs(parts.query))
+                except ApiError as exc:
+                    body = json.dumps({"error": str(exc)}).encode()
+                    writer.write(_response(exc.status, body, keep_alive=keep_alive,
+                                           head=method == "HEAD"))
+                else:
+                    status = 304 if _etag_matches(headers.get("if-none-match"), resource.etag) else 200
+                    writer.write(_response(status, resource.body, resource.etag,
+                                           keep_alive=keep_alive, head=method == "HEAD"))
+            await writer.drain()
+            if not keep_alive:
+                return
+    finally:
+        writer.close()
+
+
+async def serve_async(service: RiskService, host: str = "127.0.0.1", port: int = 8000,
+                      refresh_interval: float = 60.0, ready: asyncio.Event | None = None) -> None:
+    """Serve `service` until cancelled, refreshing its snapshot every `refresh_interval` s."""
+    if service.snapshot is None:
+        await asyncio.to_thread(service.refresh)
+    server = await asyncio.start_server(
+        lambda r, w: _handle_connection(service, r, w), host, port,
+        limit=MAX_HEADER_BYTES, backlog=1024,
+    )
+    refresher = asyncio.create_task(service.refresh_forever(refresh_interval))
+    LOGGER.info("Risk API listening on %s", ", ".join(str(s.getsockname()) for s in server.sockets))
+    if ready is not None:
+        ready.set()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        refresher.cancel()
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, cities: list[str] | None = None,
+          refresh_interval: float = 60.0, bundle_dir: str | Path | None = None) -> None:
+    service = RiskService(cities=cities, bundle_dir=bundle_dir)
+    service.refresh(force=True)
+    loaded = ", ".join(f"{city}@{v}" for city, v in service.snapshot.versions.items()) or "none"
+    print(f"✅ Risk API on http://{host}:{port} (bundles: {loaded}) "
+          f"at {datetime.now(timezone.utc):%Y-%m-%d %H:%M}Z")
+    try:
+        asyncio.run(serve_async(service, host, port, refresh_interval))
+    except KeyboardInterrupt:
+        pass
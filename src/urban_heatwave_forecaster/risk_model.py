@@ -1,7 +1,29 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
-def assess_heatwave_risk(df: pd.DataFrame, vulnerability_df: pd.DataFrame) -> pd.DataFrame:
+from .instrumentation import stage
+
+# Lower bounds (°C) of the Mild, Moderate, High and Extreme bands, used by every
+# city, district and roll-up risk score
+RISK_BANDS = (30, 32, 35, 38)
+
+
+def risk_scores(temperature) -> np.ndarray:
+    """Index into `RISK_ORDER` for each temperature; missing values score "None"."""
+    t = np.asarray(temperature, dtype=float)
+    scores = np.searchsorted(np.asarray(RISK_BANDS), t, side="right")
+    return np.where(np.isnan(t), 0, scores).astype(np.int8)
+
+
+def high_vulnerability(elderly_percent, density_per_km2, green_cover_percent):
+    """Vulnerability flag that escalates risk by one level (Series or arrays)."""
+    return (elderly_percent > 20) | (density_per_km2 > 2000) | (green_cover_percent < 25)
+
+
+def assess_heatwave_risk(
+    df: pd.DataFrame, vulnerability_df: pd.DataFrame, temperature_column: str = "tmax"
+) -> pd.DataFrame:
     """
     Assigns a risk level based on tmax (daily max temperature) and modifies it using vulnerability data.
 
@@ -9,48 +31,40 @@ def assess_heatwave_risk(df: pd.DataFrame, vulnerability_df: pd.DataFrame) -> pd
         df (pd.DataFrame): DataFrame with columns ['date', 'tmin', 'tmax', 'city', 'is_hot'].
         vulnerability_df (pd.DataFrame): DataFrame with columns ['city', 'elderly_percent',
         'green_cover_percent', 'density_per_km2'].
+        temperature_column (str): Daily column the risk bands apply to, e.g.
+        'heat_index_max' or 'apparent_temperature_max' instead of 'tmax'.
 
     Returns:
         pd.DataFrame: DataFrame with an additional 'risk_level' column.
     """
-
-    def categorize(temp):
-        if temp >= 38:
-            return "Extreme"
-        elif temp >= 35:
-            return "High"
-        elif temp >= 32:
-            return "Moderate"
-        elif temp >= 30:
-            return "Mild"
-        else:
-            return "None"
-
-    df["risk_level"] = df["tmax"].apply(categorize)
-    # Normalize city names
-    df["city"] = df["city"].str.strip().str.lower()
-    vulnerability_df["city"] = vulnerability_df["city"].str.strip().str.lower()
-
-    # Merge vulnerability data
-    df = df.merge(vulnerability_df, on="city", how="left")
-
-    # Optional: Flag if vulnerability is high
-    df["high_vulnerability"] = (
-        (df["elderly_percent"] > 20) |
-        (df["density_per_km2"] > 2000) |
-        (df["green_cover_percent"] < 25)
-    )
-
-    # Optional: Escalate risk level if vulnerability is high
-    escalation_map = {
-        "None": "Mild",
-        "Mild": "Moderate",
-        "Moderate": "High",
-        "High": "Extreme",
-        "Extreme": "Extreme"  # Cap
-    }
-
-    df.loc[df["high_vulnerability"], "risk_level"] = df.loc[df["high_vulnerability"], "risk_level"].map(escalation_map)
+    from .ensemble import RISK_ORDER  # ensemble imports this module
+
+    with stage("assess") as info:
+        info["rows"] = len(df)
+
+        df["risk_level"] = np.asarray(RISK_ORDER, dtype=object)[risk_scores(df[temperature_column])]
+        # Normalize city names
+        df["city"] = df["city"].str.strip().str.lower()
+        vulnerability_df["city"] = vulnerability_df["city"].str.strip().str.lower()
+
+        # Merge vulnerability data
+        df = df.merge(vulnerability_df, on="city", how="left")
+
+        # Optional: Flag if vulnerability is high
+        df["high_vulnerability"] = high_vulnerability(
+            df["elderly_percent"], df["density_per_km2"], df["green_cover_percent"]
+        )
+
+        # Optional: Escalate risk level if vulnerability is high
+        escalation_map = {
+            "None": "Mild",
+            "Mild": "Moderate",
+            "Moderate": "High",
+            "High": "Extreme",
+            "Extreme": "Extreme"  # Cap
+        }
+
+        df.loc[df["high_vulnerability"], "risk_level"] = df.loc[df["high_vulnerability"], "risk_level"].map(escalation_map)
 
     return df
 
@@ -0,0 +1,335 @@
+"""Population-weighted risk and heatwave exposure rolled up a hierarchy.
+
+Leaves are districts (from `district_vulnerability.csv`) or, for cities
+without districts, whole cities. Each leaf has a population weight and a parent
+city. Cities sit under optional `region` and `country` columns of
+`urban_vulnerability.csv`, and everything sits under one `total` unit::
+
+    total ─> country ─> region ─> city ─> district
+
+`Hierarchy` precomputes one group code per (level, leaf), numbered
+consecutively across levels. A leaf's risk on a day is the band of its city's
+temperature plus its own vulnerability escalation, as in
+`districts.assess_district_risk`. So every level, unit, day and risk level is one
+`np.bincount` over (level × leaf × day) keys, weighted by population.
+
+`Rollup` keeps the per-leaf scores and the summed arrays, so
+`Rollup.update` with the forecasts of a few cities subtracts those cities'
+old contributions and adds the new ones. The cost depends on the leaves that
+changed, not on the whole hierarchy. Its state is saved as `.npz` with a
+content hash per city input, and `uhf rollup` only re-reads the cities whose
+risk files changed.
+
+Population is the `population` column, else `density_per_km2 × area_km2`. When
+neither is there, `density_per_km2` is used as a relative weight: shares and
+mean scores still make sense, but the people counts do not.
+"""
+import hashlib
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .districts import EXTREME, DistrictIndex, risk_scores
+from .ensemble import RISK_ORDER
+from .instrumentation import stage
+from .risk_model import high_vulnerability
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+ROLLUP_DIR = PROJECT_ROOT / "data" / "rollups"
+STATE_PATH = ROLLUP_DIR / "state.npz"
+OUTPUT_PATH = ROLLUP_DIR / "rollups.csv"
+LEVELS = ("total", "country", "region", "city", "district")
+MISSING = -1  # score of a leaf on a day its city has no forecast for
+LOGGER = logging.getLogger(__name__)
+
+
+def population_weights(df: pd.DataFrame) -> tuple[np.ndarray, bool]:
+    """Population per row and whether it is a head count (False: density as a relative weight)."""
+    if "population" in df:
+        return df["population"].to_numpy(dtype=float), True
+    if "area_km2" in df:
+        return (df["density_per_km2"] * df["area_km2"]).to_numpy(dtype=float), True
+    return df["density_per_km2"].to_numpy(dtype=float), False
+
+
+@dataclass
+class Hierarchy:
+    cities: np.ndarray
+    leaf_city: np.ndarray
+    weights: np.ndarray
+    escalate: np.ndarray
+    levels: tuple[str, ...]
+    # (level, leaf) -> group number across all levels; -1 where a leaf has no unit at that level
+    codes: np.ndarray
+    group_level: np.ndarray
+    group_unit: np.ndarray
+    head_count: bool = True
+
+    @classmethod
+    def from_frames(cls, city_df: pd.DataFrame, district_df: pd.DataFrame | None = None) -> "Hierarchy":
+        """Hierarchy from an `urban_vulnerability.csv`-like table and optional districts."""
+        city_df = city_df.assign(city=city_df["city"].astype(str).str.strip().str.lower())
+        city_df = city_df.drop_duplicates("city", keep="last").sort_values("city").reset_index(drop=True)
+        cities = city_df["city"].to_numpy()
+        city_weights, head_count = population_weights(city_df)
+        city_escalate = high_vulnerability(
+            city_df["elderly_percent"].to_numpy(),
+            city_df["density_per_km2"].to_numpy(),
+            city_df["green_cover_percent"].to_numpy(),
+        ).astype(np.int8)
+
+        leaf_city = np.arange(len(cities), dtype=np.int32)
+        weights, escalate = city_weights, city_escalate
+        district_labels = np.full(len(cities), None, dtype=object)
+        if district_df is not None:
+            index = DistrictIndex.from_frame(district_df)
+            parent = pd.Index(cities).get_indexer(index.cities[index.parent]).astype(np.int32)
+            unknown = sorted(set(index.cities[index.parent][parent < 0]))
+            if unknown:
+                raise ValueError(f"Districts of cities missing from the city table: {unknown}")
+            district_weights, district_head_count = population_weights(district_df)
+            head_count = head_count and district_head_count
+            # cities without districts stay whole leaves
+            whole = ~np.isin(np.arange(len(cities)), parent)
+            leaf_city = np.concatenate([parent, leaf_city[whole]])
+            weights = np.concatenate([district_weights, city_weights[whole]])
+            escalate = np.concatenate([index.escalate, city_escalate[whole]])
+            district_labels = np.concatenate([
+                cities[parent].astype(object) + "/" + index.districts.astype(object),
+                district_labels[whole],
+            ])
+
+        labels = {
+            "total": np.full(len(leaf_city), "all", dtype=object),
+            "city": cities[leaf_city].astype(object),
+        }
+        for level in ("country", "region"):
+            if level in city_df:
+                labels[level] = city_df[level].astype(str).str.strip().to_numpy(dtype=object)[leaf_city]
+        if district_df is not None:
+            labels["district"] = district_labels
+        levels = tuple(level for level in LEVELS if level in labels)
+
+        codes = np.full((len(levels), len(leaf_city)), -1, dtype=np.int64)
+        group_level, group_unit = [], []
+        for i, level in enumerate(levels):
+            present = pd.notna(labels[level])
+            code, units = pd.factorize(labels[level][present], sort=True)
+            codes[i, present] = code + len(group_unit)
+            group_level += [level] * len(units)
+            group_unit += list(units)
+
+        if not head_count:
+            LOGGER.warning("No population or area_km2 column; weighting by density_per_km2.")
+        return cls(
+            cities=cities,
+            leaf_city=leaf_city,
+            weights=weights,
+            escalate=escalate,
+            levels=levels,
+            codes=codes,
+            group_level=np.asarray(group_level, dtype=object),
+            group_unit=np.asarray(group_unit, dtype=object),
+            head_count=head_count,
+        )
+
+    @classmethod
+    def from_csv(cls, city_path, district_path=None) -> "Hierarchy":
+        city_df = pd.read_csv(city_path, encoding="utf-8-sig")
+        district_df = None if district_path is None else pd.read_csv(district_path, encoding="utf-8-sig")
+        return cls.from_frames(city_df, district_df)
+
+    @property
+    def n_groups(self) -> int:
+        return len(self.group_unit)
+
+    def fingerprint(self) -> str:
+        digest = hashlib.sha1()
+        for array in (self.leaf_city, self.weights, self.escalate, self.codes):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        digest.update("\0".join(map(str, self.group_unit)).encode())
+        return digest.hexdigest()
+
+
+@dataclass
+class Rollup:
+    hierarchy: Hierarchy
+    dates: np.ndarray
+    scores: np.ndarray     # (leaf, day) index into RISK_ORDER, MISSING without a forecast
+    hot: np.ndarray        # (leaf, day) heatwave day
+    people: np.ndarray     # (group, day, risk level) summed weights
+    exposed: np.ndarray    # (group, day) summed weights on heatwave days
+    sources: dict
+
+    @classmethod
+    def empty(cls, hierarchy: Hierarchy) -> "Rollup":
+        n_leaves, n_groups = len(hierarchy.leaf_city), hierarchy.n_groups
+        return cls(
+            hierarchy=hierarchy,
+            dates=np.array([], dtype="datetime64[ns]"),
+            scores=np.empty((n_leaves, 0), dtype=np.int8),
+            hot=np.empty((n_leaves, 0), dtype=bool),
+            people=np.zeros((n_groups, 0, len(RISK_ORDER))),
+            exposed=np.zeros((n_groups, 0)),
+            sources={},
+        )
+
+    def _reindex_days(self, dates: np.ndarray) -> None:
+        """Move every array onto the date axis `dates` (a superset of the used days)."""
+        if np.array_equal(dates, self.dates):
+            return
+        position = pd.DatetimeIndex(dates).get_indexer(self.dates)
+        keep = position >= 0
+        scores = np.full((self.scores.shape[0], len(dates)), MISSING, dtype=np.int8)
+        hot = np.zeros((self.hot.shape[0], len(dates)), dtype=bool)
+        people = np.zeros((self.people.shape[0], len(dates), len(RISK_ORDER)))
+        exposed = np.zeros((self.exposed.shape[0], len(dates)))
+        scores[:, position[keep]] = self.scores[:, keep]
+        hot[:, position[keep]] = self.hot[:, keep]
+        people[:, position[keep]] = self.people[:, keep]
+        exposed[:, position[keep]] = self.exposed[:, keep]
+        self.dates, self.scores, self.hot, self.people, self.exposed = dates, scores, hot, people, exposed
+
+    def _accumulate(self, leaves: np.ndarray, sign: float) -> None:
+        """Add (sign=1) or remove (sign=-1) the contribution of `leaves` on every level."""
+        n_days, n_levels = len(self.dates), len(RISK_ORDER)
+        shape = (len(self.hierarchy.levels), len(leaves), n_days)
+        codes = self.hierarchy.codes[:, leaves]
+        # only the groups above `leaves` are touched; number them locally
+        groups, local = np.unique(codes, return_inverse=True)
+        local = np.broadcast_to(local.reshape(codes.shape)[:, :, None], shape)
+        scores = np.broadcast_to(self.scores[leaves][None], shape)
+        weights = np.broadcast_to(sign * self.hierarchy.weights[leaves, None], shape)
+        cell = local * n_days + np.arange(n_days)
+        valid = np.broadcast_to(codes[:, :, None] >= 0, shape) & (scores != MISSING)
+        hot = valid & self.hot[leaves][None]
+        size = len(groups) * n_days
+        people = np.bincount(
+            cell[valid] * n_levels + scores[valid], weights=weights[valid], minlength=size * n_levels
+        ).reshape(len(groups), n_days, n_levels)
+        exposed = np.bincount(cell[hot], weights=weights[hot], minlength=size).reshape(len(groups), n_days)
+        known = groups >= 0
+        people = self.people[groups[known]] + people[known]
+        exposed = self.exposed[groups[known]] + exposed[known]
+        # removing and re-adding weights leaves rounding residue where a cell empties
+        people[np.abs(people) < 1e-6] = 0
+        exposed[np.abs(exposed) < 1e-6] = 0
+        self.people[groups[known]] = people
+        self.exposed[groups[known]] = exposed
+
+    def update(self, forecast_df: pd.DataFrame, temperature_column: str = "tmax", sources=None) -> "Rollup":
+        """Replace the cities in `forecast_df` and update every level in place.
+
+        `forecast_df` has one row per city and day with `city`, `date`,
+        `temperature_column` and optionally `heatwave_id`, as in the
+        `*_heatwave_risk.csv` outputs. Cities not in it keep their contribution.
+        Cities missing from the hierarchy are ignored. `sources` (city -> input
+        hash) is stored with the state.
+        """
+        with stage("rollup_update") as info:
+            h = self.hierarchy
+            city = forecast_df["city"].astype(str).str.strip().str.lower().to_numpy()
+            city_pos = pd.Index(h.cities).get_indexer(city)
+            known = city_pos >= 0
+            if not known.all():
+                LOGGER.warning("Skipping cities outside the hierarchy: %s", sorted(set(city[~known])))
+            dates = pd.to_datetime(forecast_df["date"]).to_numpy()[known]
+            city_pos = city_pos[known]
+
+            changed = np.isin(h.leaf_city, city_pos)
+            leaves = np.flatnonzero(changed)
+            self._accumulate(leaves, -1.0)
+            self.scores[leaves] = MISSING
+            self.hot[leaves] = False
+
+            # drop days nobody covers any more, add the new ones
+            used = (self.scores != MISSING).any(axis=0)
+            self._reindex_days(np.union1d(self.dates[used], dates))
+
+            n_days = len(self.dates)
+            date_pos = pd.DatetimeIndex(self.dates).get_indexer(dates)
+            temperature = np.full((len(h.cities), n_days), np.nan)
+            temperature[city_pos, date_pos] = forecast_df[temperature_column].to_numpy(dtype=float)[known]
+            heatwave = np.zeros((len(h.cities), n_days), dtype=bool)
+            if "heatwave_id" in forecast_df:
+                heatwave[city_pos, date_pos] = forecast_df["heatwave_id"].notna().to_numpy()[known]
+            covered = ~np.isnan(temperature)
+
+            parent = h.leaf_city[leaves]
+            scores = risk_scores(temperature)[parent] + h.escalate[leaves, None]
+            np.minimum(scores, EXTREME, out=scores)
+            self.scores[leaves] = np.where(covered[parent], scores, MISSING)
+            self.hot[leaves] = heatwave[parent]
+            self._accumulate(leaves, 1.0)
+            self.sources.update(sources or {})
+            info["rows"] = len(leaves) * n_days * len(h.levels)
+        return self
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per (level, unit, date) with people per risk level and in heatwaves."""
+        h = self.hierarchy
+        n_groups, n_days = h.n_groups, len(self.dates)
+        people = self.people.reshape(n_groups * n_days, len(RISK_ORDER)).clip(min=0)
+        total = people.sum(axis=1)
+        frame = pd.DataFrame({
+            "level": pd.Categorical(np.repeat(h.group_level, n_days), categories=h.levels, ordered=True),
+            "unit": np.repeat(h.group_unit, n_days),
+            "date": np.tile(self.dates, n_groups),
+            "population": total.round(1),
+        })
+        for level, column in zip(RISK_ORDER, people.T):
+            frame[f"population_{level.lower()}"] = column.round(1)
+        frame["population_in_heatwave"] = self.exposed.ravel().clip(min=0).round(1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frame["mean_risk_score"] = (people @ np.arange(len(RISK_ORDER)) / total).round(3)
+            frame["extreme_share"] = (people[:, EXTREME] / total).round(4)
+            frame["heatwave_share"] = (frame["population_in_heatwave"].to_numpy() / total).round(4)
+        frame = frame[total > 0]
+        return frame.sort_values(["level", "unit", "date"], kind="stable").reset_index(drop=True)
+
+    def save(self, path: str | Path | None = None) -> Path:
+        path = Path(path or STATE_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as fh:
+            np.savez_compressed(
+                fh,
+                fingerprint=np.array(self.hierarchy.fingerprint()),
+                dates=self.dates.astype("datetime64[ns]"),
+                scores=self.scores,
+                hot=self.hot,
+                people=self.people,
+                exposed=self.exposed,
+                source_cities=np.array(list(self.sources), dtype=str),
+                source_hashes=np.array(list(self.sources.values()), dtype=str),
+            )
+        tmp_path.replace(path)
+        return path
+
+    @classmethod
+    def load(cls, hierarchy: Hierarchy, path: str | Path | None = None) -> "Rollup":
+        """Saved state for `hierarchy`, or an empty one if there is none or the hierarchy changed."""
+        path = Path(path or STATE_PATH)
+        if not path.exists():
+            return cls.empty(hierarchy)
+        with np.load(path) as saved:
+            if str(saved["fingerprint"]) != hierarchy.fingerprint():
+                LOGGER.info("Hierarchy changed since %s; rebuilding.", path)
+                return cls.empty(hierarchy)
+            return cls(
+                hierarchy=hierarchy,
+                dates=saved["dates"],
+                scores=saved["scores"],
+                hot=saved["hot"],
+                people=saved["people"],
+                exposed=saved["exposed"],
+                sources=dict(zip(saved["source_cities"].tolist(), saved["source_hashes"].tolist())),
+            )
+
+
+def build_rollup(hierarchy: Hierarchy, forecast_df: pd.DataFrame, temperature_column: str = "tmax") -> Rollup:
+    """All levels from scratch, in one pass over every leaf."""
+    return Rollup.empty(hierarchy).update(forecast_df, temperature_column)
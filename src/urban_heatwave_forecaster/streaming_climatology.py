@@ -0,0 +1,370 @@
+"""Percentile climatologies from history streamed in chunks.
+
+`climate_normals` loads the whole historical file before grouping it. Here the
+file is read `chunksize` rows at a time and every chunk is folded into a
+per-day-of-year accumulator, so memory depends on the accumulator and not on
+the length of the input:
+
+``ExactDoyBuffer``   keeps every value, one row of a (365 × years) buffer per
+                     day of year. Quantiles are exact and identical to
+                     `build_percentile_climatology`. Memory grows with the number
+                     of years (30 years of tmin/tmax is under 0.5 MB).
+``HistogramSketch``  counts values in fixed bins (default 0.05 °C over
+                     -90…70 °C), about 4.7 MB per column whatever the input
+                     size. Each order statistic is recovered to within half a
+                     bin, so every quantile is within ``resolution / 2`` of the
+                     exact one (plus 0.005 from rounding the output to two
+                     decimals). Values outside the range are clamped to the
+                     edge bins.
+
+Both are mergeable: `merge` folds in an accumulator built from another part
+of the history (another file, process or machine) and gives the same result
+as one pass over everything. `save` / `load_accumulator` move them between
+processes as ``.npz`` files. Each also records the years it has seen, so a
+period the history only partly covers is reported as in `climate_normals`.
+
+Hourly input (``time`` plus one temperature column, in time order) is reduced
+to daily minima/maxima on the fly. Only the day cut by a chunk boundary is
+carried over to the next chunk.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .climate_normals import PROCESSED_DIR, percentile_column, resolve_periods
+from .instrumentation import stage
+
+DAYS = 365
+CHUNK_ROWS = 250_000
+SKETCHES = ("exact", "histogram")
+LOGGER = logging.getLogger(__name__)
+
+
+def _climatology_frame(values: dict[str, np.ndarray], percentiles) -> pd.DataFrame:
+    out = {"day_of_year": np.arange(1, DAYS + 1)}
+    for column, thresholds in values.items():
+        for p, row in zip(percentiles, thresholds.round(2)):
+            out[percentile_column(column, p)] = row
+    climatology = pd.DataFrame(out).dropna(how="all", subset=list(out)[1:])
+    return climatology.reset_index(drop=True)
+
+
+class ExactDoyBuffer:
+    """Every value per (column, day of year), for exact quantiles."""
+
+    kind = "exact"
+
+    def __init__(self, columns, capacity: int = 32):
+        self.columns = list(columns)
+        self.years = np.array([], dtype=np.int64)
+        self.counts = {column: np.zeros(DAYS, dtype=np.int64) for column in self.columns}
+        self.values = {column: np.full((DAYS, capacity), np.nan) for column in self.columns}
+
+    def _append(self, column: str, doy: np.ndarray, values: np.ndarray) -> None:
+        order = np.argsort(doy, kind="stable")
+        row = doy[order] - 1
+        # position inside each day's group, after what the buffer already holds
+        rank = np.arange(len(row)) - np.searchsorted(row, row, side="left")
+        slot = self.counts[column][row] + rank
+        grid = self.values[column]
+        if len(slot) and slot.max() >= grid.shape[1]:
+            grown = np.full((DAYS, max(2 * grid.shape[1], int(slot.max()) + 1)), np.nan)
+            grown[:, :grid.shape[1]] = grid
+            grid = self.values[column] = grown
+        grid[row, slot] = values[order]
+        self.counts[column] += np.bincount(row, minlength=DAYS)
+
+    def add(self, doy: np.ndarray, data: dict[str, np.ndarray], years=()) -> None:
+        """Fold in values for days of year 1–365; NaNs are skipped."""
+        self.years = np.union1d(self.years, np.asarray(years, dtype=np.int64))
+        for column in self.columns:
+            values = np.asarray(data[column], dtype=float)
+            present = ~np.isnan(values)
+            self._append(column, doy[present], values[present])
+
+    def merge(self, other: "ExactDoyBuffer") -> "ExactDoyBuffer":
+        self.years = np.union1d(self.years, other.years)
+        for column in self.columns:
+            held = np.arange(other.values[column].shape[1])[None, :] < other.counts[column][:, None]
+            rows, _ = np.nonzero(held)
+            self._append(column, rows + 1, other.values[column][held])
+        return self
+
+    def quantiles(self, percentiles=(95,)) -> pd.DataFrame:
+        q = np.asarray(percentiles, dtype=float) / 100
+        values = {}
+        for column in self.columns:
+            grid = self.values[column][:, : max(int(self.counts[column].max()), 1)]
+            thresholds = np.full((len(q), DAYS), np.nan)
+            filled = self.counts[column] > 0
+            thresholds[:, filled] = np.nanquantile(grid[filled], q, axis=1)
+            values[column] = thresholds
+        return _climatology_frame(values, percentiles)
+
+    def _arrays(self) -> dict:
+        arrays = {}
+        for column in self.columns:
+            width = max(int(self.counts[column].max()), 1)
+            arrays[f"counts_{column}"] = self.counts[column]
+            arrays[f"values_{column}"] = self.values[column][:, :width]
+        return arrays
+
+    @classmethod
+    def _from_arrays(cls, columns, arrays) -> "ExactDoyBuffer":
+        buffer = cls(columns, capacity=1)
+        buffer.years = arrays.get("years", buffer.years)
+        for column in columns:
+            buffer.counts[column] = arrays[f"counts_{column}"].astype(np.int64)
+            buffer.values[column] = arrays[f"values_{column}"].astype(float)
+        return buffer
+
+    def save(self, path: str | Path) -> Path:
+        return _save(self, path, {})
+
+
+class HistogramSketch:
+    """Fixed-bin counts per (column, day of year); quantiles within `resolution / 2`."""
+
+    kind = "histogram"
+
+    def __init__(self, columns, resolution: float = 0.05, low: float = -90.0, high: float = 70.0):
+        if resolution <= 0 or high <= low:
+            raise ValueError("Histogram needs resolution > 0 and high > low")
+        self.columns = list(columns)
+        self.resolution = float(resolution)
+        self.low = float(low)
+        self.high = float(high)
+        self.bins = int(np.ceil((self.high - self.low) / self.resolution))
+        self.years = np.array([], dtype=np.int64)
+        self.counts = {column: np.zeros((DAYS, self.bins), dtype=np.int32) for column in self.columns}
+
+    @property
+    def error_bound(self) -> float:
+        """Largest difference from the exact quantile (before rounding), for values in [low, high)."""
+        return self.resolution / 2
+
+    def add(self, doy: np.ndarray, data: dict[str, np.ndarray], years=()) -> None:
+        self.years = np.union1d(self.years, np.asarray(years, dtype=np.int64))
+        for column in self.columns:
+            values = np.asarray(data[column], dtype=float)
+            present = ~np.isnan(values)
+            bin_no = np.floor((values[present] - self.low) / self.resolution).astype(np.int64)
+            np.clip(bin_no, 0, self.bins - 1, out=bin_no)
+            cell = (doy[present] - 1) * self.bins + bin_no
+            self.counts[column] += np.bincount(cell, minlength=DAYS * self.bins).reshape(
+                DAYS, self.bins
+            ).astype(np.int32)
+
+    def merge(self, other: "HistogramSketch") -> "HistogramSketch":
+        if (other.resolution, other.low, other.high) != (self.resolution, self.low, self.high):
+            raise ValueError("Only histograms with the same bins can be merged")
+        self.years = np.union1d(self.years, other.years)
+        for column in self.columns:
+            self.counts[column] += other.counts[column]
+        return self
+
+    def quantiles(self, percentiles=(95,)) -> pd.DataFrame:
+        """Linear interpolation between order statistics, as `np.quantile` does."""
+        q = np.asarray(percentiles, dtype=float) / 100
+        centers = self.low + (np.arange(self.bins) + 0.5) * self.resolution
+        values = {}
+        for column in self.columns:
+            cumulative = np.cumsum(self.counts[column], axis=1)
+            n = cumulative[:, -1]
+            thresholds = np.full((len(q), DAYS), np.nan)
+            filled = n > 0
+            for i, fraction in enumerate(q):
+                h = (n[filled] - 1) * fraction
+                below, above = np.floor(h), np.ceil(h)
+                rows = cumulative[filled]
+                lower = centers[(rows > below[:, None]).argmax(axis=1)]
+                upper = centers[(rows > above[:, None]).argmax(axis=1)]
+                thresholds[i, filled] = lower + (h - below) * (upper - lower)
+            values[column] = thresholds
+        return _climatology_frame(values, percentiles)
+
+    def _arrays(self) -> dict:
+        return {f"counts_{column}": self.counts[column] for column in self.columns}
+
+    @classmethod
+    def _from_arrays(cls, columns, arrays, resolution, low, high) -> "HistogramSketch":
+        sketch = cls(columns, resolution=resolution, low=low, high=high)
+        sketch.years = arrays.get("years", sketch.years)
+        for column in columns:
+            sketch.counts[column] = arrays[f"counts_{column}"].astype(np.int32)
+        return sketch
+
+    def save(self, path: str | Path) -> Path:
+        return _save(self, path, {"resolution": self.resolution, "low": self.low, "high": self.high})
+
+
+def new_accumulator(sketch: str, columns, **options):
+    if sketch == "exact":
+        return ExactDoyBuffer(columns)
+    if sketch == "histogram":
+        return HistogramSketch(columns, **options)
+    raise ValueError(f"Unknown sketch {sketch!r}; choose from {SKETCHES}")
+
+
+def _save(accumulator, path: str | Path, options: dict) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        path,
+        kind=accumulator.kind,
+        columns=np.asarray(accumulator.columns),
+        options=np.asarray([options.get(k, np.nan) for k in ("resolution", "low", "high")]),
+        years=accumulator.years.astype(np.int64),
+        **accumulator._arrays(),
+    )
+    return path
+
+
+def load_accumulator(path: str | Path):
+    """An accumulator written by `save`."""
+    with np.load(path, allow_pickle=False) as data:
+        kind = str(data["kind"])
+        columns = [str(column) for column in data["columns"]]
+        arrays = {name: data[name] for name in data.files}
+    if kind == "exact":
+        return ExactDoyBuffer._from_arrays(columns, arrays)
+    resolution, low, high = arrays["options"]
+    return HistogramSketch._from_arrays(columns, arrays, resolution, low, high)
+
+
+def read_daily_chunks(input_path, columns=("tmin", "tmax"), chunksize: int = CHUNK_ROWS,
+                      hourly_column: str | None = None):
+    """Yield daily frames with `date` and `columns` from a CSV, `chunksize` rows at a time.
+
+    With `hourly_column` the file holds hourly `time` rows; each chunk is
+    reduced to daily `tmin` / `tmax` of that column and the last (possibly
+    partial) day is held back until the next chunk or the end of the file.
+    """
+    if hourly_column is None:
+        for chunk in pd.read_csv(input_path, usecols=["date", *columns], chunksize=chunksize):
+            yield chunk
+        return
+
+    carry = None
+    for chunk in pd.read_csv(input_path, usecols=["time", hourly_column], chunksize=chunksize):
+        day = chunk["time"].str.slice(0, 10)
+        daily = chunk[hourly_column].groupby(day, sort=False).agg(["min", "max"])
+        daily.columns = ["tmin", "tmax"]
+        if carry is not None:
+            daily = pd.concat([carry, daily]).groupby(level=0, sort=False).agg(
+                {"tmin": "min", "tmax": "max"}
+            )
+        carry = daily.iloc[-1:]
+        done = daily.iloc[:-1]
+        if len(done):
+            yield done.rename_axis("date").reset_index()
+    if carry is not None:
+        yield carry.rename_axis("date").reset_index()
+
+
+def accumulate(
+    input_path,
+    periods=("1991-2020",),
+    columns=("tmin", "tmax"),
+    sketch: str = "exact",
+    chunksize: int = CHUNK_ROWS,
+    hourly_column: str | None = None,
+    **options,
+) -> dict[str, object]:
+    """One pass over `input_path`, folding each chunk into one accumulator per period.
+
+    Returns `{label: accumulator}`, labelled as `build_period_climatologies`
+    labels the same periods.
+    """
+    if hourly_column is not None:
+        columns = ("tmin", "tmax")
+    spans = resolve_periods(periods)
+    accumulators = {label: new_accumulator(sketch, columns, **options) for label in spans}
+    with stage("climatology_stream") as info:
+        rows = 0
+        for chunk in read_daily_chunks(input_path, columns, chunksize, hourly_column):
+            dates = pd.to_datetime(chunk["date"])
+            doy = dates.dt.dayofyear.to_numpy()
+            year = dates.dt.year.to_numpy()
+            keep = doy != 366
+            for label, (first, last) in spans.items():
+                rows_in = keep & (year >= first) & (year <= last)
+                if rows_in.any():
+                    accumulators[label].add(
+                        doy[rows_in], {c: chunk[c].to_numpy()[rows_in] for c in columns},
+                        years=np.unique(year[rows_in]),
+                    )
+            rows += len(chunk)
+        info["rows"] = rows
+    return accumulators
+
+
+def _accumulate_task(task):
+    input_path, kwargs = task
+    return accumulate(input_path, **kwargs)
+
+
+def merge_accumulators(parts) -> dict[str, object]:
+    """Merge `{label: accumulator}` results from several partitions of the history."""
+    merged = {}
+    for part in parts:
+        for label, accumulator in part.items():
+            if label in merged:
+                merged[label].merge(accumulator)
+            else:
+                merged[label] = accumulator
+    return merged
+
+
+def build_streaming_climatology(
+    city_name,
+    input_paths,
+    periods=("1991-2020",),
+    percentiles=(95,),
+    columns=("tmin", "tmax"),
+    sketch: str = "exact",
+    chunksize: int = CHUNK_ROWS,
+    hourly_column: str | None = None,
+    output_dir=None,
+    max_workers: int | None = None,
+    **options,
+) -> dict[str, pd.DataFrame]:
+    """Streamed thresholds per period from one or more partitions of the history.
+
+    Each path in `input_paths` (e.g. one file per decade) is accumulated
+    separately, in a process pool when there are several, and the results are
+    merged. Output files and columns match `build_period_climatologies`.
+    """
+    city_name = city_name.lower()
+    spans = resolve_periods(periods)
+    paths = [input_paths] if isinstance(input_paths, (str, Path)) else list(input_paths)
+    kwargs = dict(periods=periods, columns=columns, sketch=sketch, chunksize=chunksize,
+                  hourly_column=hourly_column, **options)
+    tasks = [(path, kwargs) for path in paths]
+    if max_workers == 1 or len(tasks) <= 1:
+        parts = [_accumulate_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            parts = list(pool.map(_accumulate_task, tasks))
+
+    climatologies = {}
+    for label, accumulator in merge_accumulators(parts).items():
+        first, last = spans[label]
+        climatology = accumulator.quantiles(percentiles)
+        if climatology.empty:
+            raise ValueError(f"Historical data has no years in {label}")
+        if len(accumulator.years) < last - first + 1:
+            LOGGER.warning("Period %s covers only %d of %d years", label, len(accumulator.years),
+                           last - first + 1)
+        climatologies[label] = climatology
+
+    output_dir = Path(output_dir or PROCESSED_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for label, climatology in climatologies.items():
+        output_path = output_dir / f"{city_name}_climatology_{label}.csv"
+        climatology.to_csv(output_path, index=False)
+        print(f"✅ Saved {label} climatology to: {output_path}")
+    return climatologies
@@ -0,0 +1,431 @@
+"""Offline Open-Meteo stub for integration and load testing.
+
+Implements the subset of the forecast (`/v1/forecast`), archive
+(`/v1/archive`) and ensemble (`/v1/ensemble`) endpoints that the pipeline uses,
+answering in JSON or, with `format=flatbuffers`, in the size-prefixed
+FlatBuffers encoding read by `openmeteo_requests`.
+
+Data are synthetic but deterministic: every value is a pure function of the
+coordinates, model, date and hour, so the same request always returns the same
+payload and the archive and forecast endpoints agree on overlapping days.
+Latency, random 5xx errors and a token-bucket rate limit (429 + Retry-After)
+are configurable to exercise the retry and throttling paths.
+
+Run it with ``uhf stub-server --port 8080`` and point the pipeline at it with
+``UHF_OPEN_METEO_BASE_URL=http://127.0.0.1:8080``.
+"""
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+ENSEMBLE_MEMBERS = {"ecmwf_ifs025": 51, "gfs_seamless": 31, "icon_seamless": 40}
+DEFAULT_ENSEMBLE_MEMBERS = 20
+
+# FlatBuffers enum values from the openmeteo_sdk schema
+_FB_VARIABLE = {"temperature": 47, "relative_humidity": 71, "wind_speed": 94,
+                "shortwave_radiation": 83, "dew_point": 8, "apparent_temperature": 1}
+_FB_UNIT = {"celsius": 1, "percentage": 21, "kilometres_per_hour": 13, "watt_per_square_metre": 34}
+_FB_AGGREGATION = {"none": 0, "minimum": 1, "maximum": 2, "mean": 3}
+_FB_MODEL = {"ecmwf_ifs025": 60, "gfs_seamless": 2, "icon_seamless": 20}
+
+
+class StubError(Exception):
+    def __init__(self, reason: str, status: int = 400):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+
+
+def _seed(*parts) -> int:
+    return zlib.crc32(repr(parts).encode())
+
+
+def _hash_noise(x: np.ndarray, seed: int) -> np.ndarray:
+    """Deterministic pseudo-random values in [-1, 1] for integer inputs."""
+    v = np.sin(x.astype(np.float64) * 12.9898 + (seed % 100_000) * 78.233) * 43758.5453
+    return 2 * (v - np.floor(v)) - 1
+
+
+class SyntheticWeather:
+    """Deterministic weather for one location and model."""
+
+    def __init__(self, lat: float, lon: float, model: str = "best_match", member: int = 0):
+        self.lat = lat
+        self.lon = lon
+        self.seed = _seed(round(lat, 2), round(lon, 2), model, member)
+        self.climate_seed = _seed(round(lat, 2), round(lon, 2))
+        # Colder and more seasonal towards the poles
+        self.mean = 27 - 0.45 * abs(lat)
+        self.amplitude = 4 + 0.2 * abs(lat)
+        self.utc_offset_seconds = int(round(lon / 15)) * 3600
+
+    def _daily_anomaly(self, ordinals: np.ndarray) -> np.ndarray:
+        # Multi-day warm and cool spells shared by all models, plus model noise
+        spells = (
+            3.5 * np.sin(2 * np.pi * ordinals / 9.3 + self.climate_seed % 7)
+            + 2.5 * np.sin(2 * np.pi * ordinals / 23.7 + self.climate_seed % 11)
+        )
+        return spells + 1.5 * _hash_noise(ordinals, self.climate_seed) + 0.8 * _hash_noise(ordinals, self.seed)
+
+    def hourly(self, variable: str, times: list[datetime]) -> np.ndarray:
+        ordinals = np.array([t.toordinal() for t in times])
+        hours = np.array([t.hour for t in times])
+        doy = np.array([t.timetuple().tm_yday for t in times])
+        seasonal = self.mean + self.amplitude * np.sin(2 * np.pi * (doy - 110) / 365.25)
+        diurnal = np.sin(2 * np.pi * (hours - 9) / 24)
+        temperature = seasonal + self._daily_anomaly(ordinals) + 5.5 * diurnal
+
+        if variable == "temperature_2m":
+            return temperature.round(1)
+        if variable == "relative_humidity_2m":
+            return np.clip(60 - 20 * diurnal + 10 * _hash_noise(ordinals, self.seed + 1), 5, 100).round()
+        if variable == "dew_point_2m":
+            return (temperature - 8 - 3 * diurnal).round(1)
+        if variable == "wind_speed_10m":
+            return np.clip(12 + 6 * _hash_noise(ordinals * 24 + hours, self.seed + 2), 0, None).round(1)
+        if variable == "shortwave_radiation":
+            return np.clip(900 * np.sin(np.pi * (hours - 6) / 14), 0, None).round()
+        if variable == "apparent_temperature":
+            return (temperature + 1.5).round(1)
+        raise StubError(f"Cannot initialize WeatherVariable from invalid String value {variable}")
+
+
+def _local_hours(start: date, days: int) -> list[datetime]:
+    first = datetime(start.year, start.month, start.day)
+    return [first + timedelta(hours=h) for h in range(days * 24)]
+
+
+def _split(values) -> list[str]:
+    out = []
+    for value in values or []:
+        out.extend(item for item in value.split(",") if item)
+    return out
+
+
+def _one(query: dict, key: str, default=None):
+    values = query.get(key)
+    return values[0] if values else default
+
+
+def _location(query: dict) -> tuple[float, float]:
+    try:
+        return float(_one(query, "latitude")), float(_one(query, "longitude"))
+    except (TypeError, ValueError):
+        raise StubError("Parameter 'latitude' and 'longitude' must be numbers")
+
+
+def _base_payload(lat: float, lon: float, weather: SyntheticWeather) -> dict:
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "generationtime_ms": 0.1,
+        "utc_offset_seconds": weather.utc_offset_seconds,
+        "timezone": "GMT" if weather.utc_offset_seconds == 0 else "Etc/Stub",
+        "timezone_abbreviation": "GMT",
+        "elevation": 50.0,
+    }
+
+
+def forecast_payload(query: dict, today: date | None = None) -> dict:
+    lat, lon = _location(query)
+    model = _one(query, "models", "best_match")
+    variables = _split(query.get("hourly")) or ["temperature_2m"]
+    forecast_days = int(_one(query, "forecast_days", 7))
+    past_days = int(_one(query, "past_days", 0))
+    if not 0 <= forecast_days <= 16:
+        raise StubError("Forecast days is invalid. Allowed range 0 to 16.")
+
+    weather = SyntheticWeather(lat, lon, model)
+    start = (today or date.today()) - timedelta(days=past_days)
+    times = _local_hours(start, past_days + forecast_days)
+    payload = _base_payload(lat, lon, weather)
+    payload["hourly"] = {"time": [t.strftime("%Y-%m-%dT%H:%M") for t in times]}
+    for variable in variables:
+        payload["hourly"][variable] = weather.hourly(variable, times).tolist()
+    return payload
+
+
+def ensemble_payload(query: dict, today: date | None = None) -> dict:
+    lat, lon = _location(query)
+    model = _one(query, "models", "icon_seamless")
+    variables = _split(query.get("hourly")) or ["temperature_2m"]
+    forecast_days = int(_one(query, "forecast_days", 7))
+    members = ENSEMBLE_MEMBERS.get(model, DEFAULT_ENSEMBLE_MEMBERS)
+
+    times = _local_hours(today or date.today(), forecast_days)
+    payload = _base_payload(lat, lon, SyntheticWeather(lat, lon, model))
+    payload["hourly"] = {"time": [t.strftime("%Y-%m-%dT%H:%M") for t in times]}
+    for member in range(members + 1):
+        weather = SyntheticWeather(lat, lon, model, member=member)
+        suffix = "" if member == 0 else f"_member{member:02d}"
+        for variable in variables:
+            payload["hourly"][f"{variable}{suffix}"] = weather.hourly(variable, times).tolist()
+    return payload
+
+
+def archive_payload(query: dict) -> dict:
+    lat, lon = _location(query)
+    try:
+        start = date.fromisoformat(_one(query, "start_date"))
+        end = date.fromisoformat(_one(query, "end_date"))
+    except (TypeError, ValueError):
+        raise StubError("Parameter 'start_date' and 'end_date' must be ISO dates")
+    if end < start:
+        raise StubError("End-date must be larger or equals than start-date")
+
+    weather = SyntheticWeather(lat, lon, "era5")
+    days = (end - start).days + 1
+    hourly = weather.hourly("temperature_2m", _local_hours(start, days)).reshape(days, 24)
+    payload = _base_payload(lat, lon, weather)
+    payload["daily"] = {"time": [(start + timedelta(days=d)).isoformat() for d in range(days)]}
+    for variable in _split(query.get("daily")):
+        if variable == "temperature_2m_min":
+            payload["daily"][variable] = hourly.min(axis=1).tolist()
+        elif variable == "temperature_2m_max":
+            payload["daily"][variable] = hourly.max(axis=1).tolist()
+        elif variable == "temperature_2m_mean":
+            payload["daily"][variable] = hourly.mean(axis=1).round(1).tolist()
+        else:
+            raise StubError(f"Cannot initialize DailyVariable from invalid String value {variable}")
+    hourly_variables = _split(query.get("hourly"))
+    if hourly_variables:
+        times = _local_hours(start, days)
+        payload["hourly"] = {"time": [t.strftime("%Y-%m-%dT%H:%M") for t in times]}
+        for variable in hourly_variables:
+            payload["hourly"][variable] = weather.hourly(variable, times).tolist()
+    return payload
+
+
+def _fb_variable_meta(name: str) -> dict:
+    """Map an Open-Meteo variable name onto FlatBuffers enum fields."""
+    meta = {"aggregation": _FB_AGGREGATION["none"], "altitude": 0, "member": 0}
+    base = name
+    if "_member" in base:
+        base, member = base.rsplit("_member", 1)
+        meta["member"] = int(member)
+    for suffix, aggregation in (("_min", "minimum"), ("_max", "maximum"), ("_mean", "mean")):
+        if base.endswith(suffix):
+            base = base[: -len(suffix)]
+            meta["aggregation"] = _FB_AGGREGATION[aggregation]
+    for altitude in (2, 10):
+        if base.endswith(f"_{altitude}m"):
+            base = base[: -len(f"_{altitude}m")]
+            meta["altitude"] = altitude
+    meta["variable"] = _FB_VARIABLE.get(base, 0)
+    meta["unit"] = {
+        "relative_humidity": _FB_UNIT["percentage"],
+        "wind_speed": _FB_UNIT["kilometres_per_hour"],
+        "shortwave_radiation": _FB_UNIT["watt_per_square_metre"],
+    }.get(base, _FB_UNIT["celsius"])
+    return meta
+
+
+def to_flatbuffers(payload: dict, model: str | None = None) -> bytes:
+    """Encode a JSON payload as one size-prefixed `WeatherApiResponse` message."""
+    import flatbuffers
+
+    builder = flatbuffers.Builder(1024)
+
+    def variables_with_time(block: dict, interval: int) -> int:
+        times = block["time"]
+        offset = payload["utc_offset_seconds"]
+        epochs = [
+            int(datetime.fromisoformat(t).replace(tzinfo=timezone.utc).timestamp()) - offset
+            for t in times
+        ]
+        variable_offsets = []
+        for name, values in block.items():
+            if name == "time":
+                continue
+            meta = _fb_variable_meta(name)
+            arr = np.asarray(values, dtype="<f4")
+            builder.StartVector(4, len(arr), 4)
+            for value in arr[::-1]:
+                builder.PrependFloat32(float(value))
+            values_vec = builder.EndVector()
+            builder.StartObject(14)
+            builder.PrependUOffsetTRelativeSlot(3, values_vec, 0)
+            builder.PrependInt16Slot(5, meta["altitude"], 0)
+            builder.PrependInt16Slot(10, meta["member"], 0)
+            builder.PrependUint8Slot(0, meta["variable"], 0)
+            builder.PrependUint8Slot(1, meta["unit"], 0)
+            builder.PrependUint8Slot(6, meta["aggregation"], 0)
+            variable_offsets.append(builder.EndObject())
+
+        builder.StartVector(4, len(variable_offsets), 4)
+        for variable_offset in reversed(variable_offsets):
+            builder.PrependUOffsetTRelative(variable_offset)
+        variables_vec = builder.EndVector()
+        builder.StartObject(4)
+        builder.PrependInt64Slot(0, epochs[0] if epochs else 0, 0)
+        builder.PrependInt64Slot(1, (epochs[-1] + interval) if epochs else 0, 0)
+        builder.PrependInt32Slot(2, interval, 0)
+        builder.PrependUOffsetTRelativeSlot(3, variables_vec, 0)
+        return builder.EndObject()
+
+    daily = variables_with_time(payload["daily"], 86_400) if "daily" in payload else None
+    hourly = variables_with_time(payload["hourly"], 3_600) if "hourly" in payload else None
+    timezone_name = builder.CreateString(payload["timezone"])
+    timezone_abbreviation = builder.CreateString(payload["timezone_abbreviation"])
+
+    builder.StartObject(15)
+    builder.PrependFloat32Slot(0, payload["latitude"], 0)
+    builder.PrependFloat32Slot(1, payload["longitude"], 0)
+    builder.PrependFloat32Slot(2, payload["elevation"], 0)
+    builder.PrependFloat32Slot(3, payload["generationtime_ms"], 0)
+    builder.PrependUint8Slot(5, _FB_MODEL.get(model or "", 0), 0)
+    builder.PrependInt32Slot(6, payload["utc_offset_seconds"], 0)
+    builder.PrependUOffsetTRelativeSlot(7, timezone_name, 0)
+    builder.PrependUOffsetTRelativeSlot(8, timezone_abbreviation, 0)
+    if daily is not None:
+        builder.PrependUOffsetTRelativeSlot(10, daily, 0)
+    if hourly is not None:
+        builder.PrependUOffsetTRelativeSlot(11, hourly, 0)
+    builder.Finish(builder.EndObject())
+
+    message = bytes(builder.Output())
+    return len(message).to_bytes(4, "little") + message
+
+
+class _Limiter:
+    """Thread-safe token bucket for the server side of the rate limit."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Take a token; return 0 on success or the seconds until one is available."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: "StubServer"
+    routes = {"/v1/forecast": "forecast", "/v1/archive": "archive", "/v1/ensemble": "ensemble"}
+
+    def log_message(self, format, *args):  # noqa: A002 - signature from BaseHTTPRequestHandler
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict | None = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error_json(self, status: int, reason: str, headers: dict | None = None):
+        body = json.dumps({"error": True, "reason": reason}).encode()
+        self._send(status, body, "application/json", headers)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint = self.routes.get(url.path)
+        self.server.record(endpoint or url.path)
+        if endpoint is None:
+            self._send_error_json(404, f"Unknown endpoint {url.path}")
+            return
+
+        config = self.server
+        if config.latency:
+            time.sleep(config.latency * (1 + random.uniform(-config.jitter, config.jitter)))
+        if config.limiter is not None:
+            wait = config.limiter.try_acquire()
+            if wait > 0:
+                self._send_error_json(
+                    429,
+                    "Minutely API request limit exceeded. Please try again in one minute.",
+                    {"Retry-After": str(math.ceil(wait))},
+                )
+                return
+        if config.error_rate and random.random() < config.error_rate:
+            self._send_error_json(500, "Injected failure from stub server")
+            return
+
+        query = parse_qs(url.query)
+        try:
+            if endpoint == "forecast":
+                payload = forecast_payload(query)
+            elif endpoint == "ensemble":
+                payload = ensemble_payload(query)
+            else:
+                payload = archive_payload(query)
+        except StubError as exc:
+            self._send_error_json(exc.status, exc.reason)
+            return
+
+        if _one(query, "format") == "flatbuffers":
+            body = to_flatbuffers(payload, model=_one(query, "models"))
+            self._send(200, body, "application/octet-stream")
+        else:
+            self._send(200, json.dumps(payload).encode(), "application/json")
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded stub server; use as a context manager to run it in the background.
+
+    Args:
+        latency: Mean added latency per request in seconds (± `jitter` fraction).
+        error_rate: Probability of answering with a 500.
+        rate_limit_per_minute: Token-bucket limit; excess requests get a 429.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.2,
+        error_rate: float = 0.0,
+        rate_limit_per_minute: int | None = None,
+        verbose: bool = False,
+    ):
+        super().__init__((host, port), StubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.limiter = _Limiter(rate_limit_per_minute) if rate_limit_per_minute else None
+        self.verbose = verbose
+        self.request_counts: dict[str, int] = {}
+        self._counts_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, endpoint: str) -> None:
+        with self._counts_lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,248 @@
+"""Hindcast verification of heatwave detection against observations.
+
+Archived forecast runs (see `forecast_archive`) are run through the same
+95th-percentile / `min_run` detection as the live pipeline, aligned by lead
+time with observed daily Tmin/Tmax (from `fetch_historical`) and scored:
+
+* hit rate (probability of detection) and false-alarm ratio per model and lead
+* Brier score of the multi-model heatwave probability per lead
+
+Per-city work returns additive contingency counts, so cities can be scored in
+a process pool and combined afterwards without loss.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from . import forecast_archive
+
+COUNT_COLUMNS = ["hits", "misses", "false_alarms", "correct_negatives"]
+
+
+def _flag_heatwave_days(df: pd.DataFrame, by: list[str], min_run: int) -> pd.Series:
+    """Vectorized run-length detection over many independent series.
+
+    `df` must be sorted by `by` + date and carry an `exceeds` column. A day is a
+    heatwave day when it belongs to a run of ≥ `min_run` exceedances within its
+    own series.
+    """
+    exceeds = df["exceeds"].to_numpy(dtype=bool)
+    if by:
+        series_key = df[by].ne(df[by].shift()).any(axis=1).to_numpy()
+    else:
+        series_key = np.zeros(len(df), dtype=bool)
+        series_key[:1] = True
+    changed = np.r_[True, exceeds[1:] != exceeds[:-1]] | series_key
+    run_id = np.cumsum(changed)
+    run_len = np.bincount(run_id, weights=exceeds)[run_id]
+    return pd.Series(exceeds & (run_len >= min_run), index=df.index)
+
+
+def _local_dates(dates) -> pd.Series:
+    """Naive local dates; older history files carry a UTC offset (``+00:00``)."""
+    dates = pd.to_datetime(pd.Series(dates))
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates
+
+
+def _with_exceedance(df: pd.DataFrame, climatology_df: pd.DataFrame) -> pd.DataFrame:
+    out = df.copy()
+    out["date"] = _local_dates(out["date"]).to_numpy()
+    out["day_of_year"] = out["date"].dt.dayofyear
+    out = out.merge(climatology_df, on="day_of_year", how="left")
+    out["exceeds"] = (out["tmin"] > out["tmin_95p"]) & (out["tmax"] > out["tmax_95p"])
+    return out
+
+
+def observed_heatwave_days(
+    observed_df: pd.DataFrame, climatology_df: pd.DataFrame, min_run: int = 3
+) -> pd.DataFrame:
+    """Return observed dates with a boolean `observed` heatwave flag."""
+    obs = _with_exceedance(observed_df, climatology_df).sort_values("date")
+    obs["observed"] = _flag_heatwave_days(obs, by=[], min_run=min_run)
+    return obs[["date", "observed"]].reset_index(drop=True)
+
+
+def forecast_heatwave_days(
+    runs_df: pd.DataFrame, climatology_df: pd.DataFrame, min_run: int = 3
+) -> pd.DataFrame:
+    """Detect heatwaves inside every archived run at once.
+
+    Each (model, issue_time) run is treated as its own series, exactly as the
+    live pipeline sees it on the day the forecast is issued.
+    """
+    fc = _with_exceedance(runs_df, climatology_df)
+    fc = fc.sort_values(["model", "issue_time", "date"]).reset_index(drop=True)
+    fc["forecast"] = _flag_heatwave_days(fc, by=["model", "issue_time"], min_run=min_run)
+    # the local issue day, which `lead_day` already counts from
+    fc["issue_date"] = fc["date"] - pd.to_timedelta(fc["lead_day"], unit="D")
+    return fc[["model", "issue_time", "issue_date", "lead_day", "date", "forecast"]]
+
+
+def contingency_counts(forecast_days: pd.DataFrame, observed_days: pd.DataFrame) -> pd.DataFrame:
+    """Per (model, lead_day) contingency counts of forecast vs observed heatwave days."""
+    aligned = forecast_days.merge(observed_days, on="date", how="inner")
+    fc = aligned["forecast"].to_numpy()
+    ob = aligned["observed"].to_numpy()
+    aligned = aligned.assign(
+        hits=fc & ob,
+        misses=~fc & ob,
+        false_alarms=fc & ~ob,
+        correct_negatives=~fc & ~ob,
+    )
+    return (
+        aligned.groupby(["model", "lead_day"])[COUNT_COLUMNS]
+        .sum()
+        .astype(int)
+        .reset_index()
+    )
+
+
+def brier_components(forecast_days: pd.DataFrame, observed_days: pd.DataFrame) -> pd.DataFrame:
+    """Per lead_day sum of squared errors of the multi-model heatwave probability.
+
+    Models issued on the same day form one ensemble; the probability is the
+    fraction of members flagging a heatwave day.
+    """
+    probs = (
+        forecast_days.groupby(["issue_date", "date"])["forecast"]
+        .agg(probability="mean", members="size")
+        .reset_index()
+    )
+    probs["lead_day"] = (probs["date"] - probs["issue_date"]).dt.days
+    probs = probs.merge(observed_days, on="date", how="inner")
+    probs["squared_error"] = (probs["probability"] - probs["observed"].astype(float)) ** 2
+    return (
+        probs.groupby("lead_day")
+        .agg(squared_error=("squared_error", "sum"), n=("squared_error", "size"))
+        .reset_index()
+    )
+
+
+def verify_city(
+    city: str,
+    observed_df: pd.DataFrame,
+    climatology_df: pd.DataFrame,
+    runs_df: pd.DataFrame | None = None,
+    min_run: int = 3,
+    archive_dir: str | Path | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Return (contingency counts, Brier components) for one city."""
+    if runs_df is None:
+        obs_dates = _local_dates(observed_df["date"])
+        runs_df = forecast_archive.load_runs(
+            city,
+            start=obs_dates.min() - pd.Timedelta(days=16),
+            end=obs_dates.max(),
+            archive_dir=archive_dir,
+        )
+    if runs_df.empty:
+        return (
+            pd.DataFrame(columns=["model", "lead_day", *COUNT_COLUMNS]),
+            pd.DataFrame(columns=["lead_day", "squared_error", "n"]),
+        )
+
+    observed_days = observed_heatwave_days(observed_df, climatology_df, min_run=min_run)
+    forecast_days = forecast_heatwave_days(runs_df, climatology_df, min_run=min_run)
+    counts = contingency_counts(forecast_days, observed_days)
+    brier = brier_components(forecast_days, observed_days)
+    counts.insert(0, "city", city.lower())
+    brier.insert(0, "city", city.lower())
+    return counts, brier
+
+
+def skill_scores(counts: pd.DataFrame, brier: pd.DataFrame, by: list[str] | None = None) -> pd.DataFrame:
+    """Turn summed counts into hit rate, false-alarm ratio and Brier score per lead."""
+    by = by or ["model", "lead_day"]
+    totals = counts.groupby(by)[COUNT_COLUMNS].sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        totals["hit_rate"] = totals["hits"] / (totals["hits"] + totals["misses"])
+        totals["false_alarm_ratio"] = totals["false_alarms"] / (
+            totals["hits"] + totals["false_alarms"]
+        )
+    scores = totals.reset_index()
+
+    brier_by_lead = brier.groupby("lead_day")[["squared_error", "n"]].sum()
+    brier_by_lead["brier_score"] = brier_by_lead["squared_error"] / brier_by_lead["n"]
+    return scores.merge(
+        brier_by_lead[["brier_score"]].reset_index(), on="lead_day", how="left"
+    )
+
+
+def observed_path(city: str, observed_dir: str | Path = "data/raw") -> Path:
+    return Path(observed_dir) / f"{city.lower()}_observed.csv"
+
+
+def fetch_observed(
+    city: str,
+    lat: float,
+    lon: float,
+    observed_dir: str | Path = "data/raw",
+    archive_dir: str | Path | None = None,
+) -> Path:
+    """Fetch observed daily Tmin/Tmax over the days covered by `city`'s archived runs.
+
+    The span ends yesterday at the latest, since the archive API has no later days.
+    """
+    from .fetch_historical import fetch_historical_data
+
+    runs = forecast_archive.load_runs(city, archive_dir=archive_dir)
+    if runs.empty:
+        raise ValueError(f"No archived runs for {city}; fetch forecasts first.")
+    dates = _local_dates(runs["date"])
+    start = dates.min().date()
+    end = min(dates.max().date(), date.today() - timedelta(days=1))
+    if start > end:
+        raise ValueError(f"Archived runs for {city} cover no past days yet.")
+    path = observed_path(city, observed_dir)
+    fetch_historical_data(
+        lat, lon, city, save_path=path, start_date=start.isoformat(), end_date=end.isoformat()
+    )
+    return path
+
+
+def _verify_city_from_files(args) -> tuple[pd.DataFrame, pd.DataFrame]:
+    city, observed_path, climatology_path, min_run, archive_dir = args
+    observed_df = pd.read_csv(observed_path, parse_dates=["date"])
+    climatology_df = pd.read_csv(climatology_path)
+    return verify_city(
+        city, observed_df, climatology_df, min_run=min_run, archive_dir=archive_dir
+    )
+
+
+def run_backtest(
+    cities: list[str],
+    observed_dir: str | Path = "data/raw",
+    climatology_dir: str | Path = "data/processed",
+    min_run: int = 3,
+    max_workers: int | None = None,
+    archive_dir: str | Path | None = None,
+) -> pd.DataFrame:
+    """Verify many cities in a process pool and return lead-time skill curves.
+
+    Observed series are read from `{observed_dir}/{city}_observed.csv`, as
+    written by `fetch_observed` (``uhf verify --fetch-observed``).
+    """
+    tasks = [
+        (
+            city.lower(),
+            observed_path(city, observed_dir),
+            Path(climatology_dir) / f"{city.lower()}_climatology_95p.csv",
+            min_run,
+            archive_dir,
+        )
+        for city in cities
+    ]
+    if max_workers == 1 or len(tasks) <= 1:
+        results = [_verify_city_from_files(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_verify_city_from_files, tasks))
+
+    counts = pd.concat([c for c, _ in results], ignore_index=True)
+    brier = pd.concat([b for _, b in results], ignore_index=True)
+    return skill_scores(counts, brier)